@@ -1,7 +1,9 @@
 import os
 import sys
+import ast
 import platform
 import distutils.util
+from pathlib import Path
 from setuptools import setup, find_namespace_packages
 
 MACOSX_VERSIONS = {
@@ -34,22 +36,80 @@ def get_os_arch():
 
 OS_TYPE = get_os_type()
 
-if 'linux' in OS_TYPE:
-    LIB_GLOB = 'librtlsdr.so*'
-elif OS_TYPE == 'macos':
-    LIB_GLOB = '*.dylib'
-elif OS_TYPE == 'win32':
-    LIB_GLOB = 'librtlsdr_w32*.dll'
-elif OS_TYPE == 'win64':
-    LIB_GLOB = 'librtlsdr_w64*.dll'
-else:
-    LIB_GLOB = 'librtlsdr*'
+PROJECT_ROOT = Path(__file__).resolve().parent
 
-pkg_data = {
-    '*':['LICENSE*', 'README*'],
-    'pyrtlsdrlib.lib':['*.json', LIB_GLOB],
-    'pyrtlsdrlib.lib.custom_build':['*.json', LIB_GLOB],
+LIB_GLOBS = {
+    'linux': 'librtlsdr.so*',
+    'macos': '*.dylib',
+    'win32': 'librtlsdr_w32*.dll',
+    'win64': 'librtlsdr_w64*.dll',
 }
+"""Library filename patterns for each platform"""
+
+LIB_PACKAGES = ['pyrtlsdrlib.lib', 'pyrtlsdrlib.lib.custom_build']
+
+def get_lib_glob(os_type):
+    if 'linux' in os_type:
+        return LIB_GLOBS['linux']
+    return LIB_GLOBS.get(os_type, 'librtlsdr*')
+
+def get_cpu_variant_names(root=PROJECT_ROOT):
+    """Read the keys of ``pyrtlsdrlib.platform.CPU_VARIANTS``
+
+    The package can't be imported here, so the names are parsed from the
+    source.
+    """
+    fn = Path(root) / 'src' / 'pyrtlsdrlib' / 'platform.py'
+    for node in ast.parse(fn.read_text()).body:
+        if isinstance(node, ast.AnnAssign) and getattr(node.target, 'id', None) == 'CPU_VARIANTS':
+            return [ast.literal_eval(key) for key in node.value.keys]
+    raise ValueError(f'CPU_VARIANTS not found in {fn}')
+
+def get_lib_patterns(pkg_name, os_type, root=PROJECT_ROOT):
+    """Get the glob patterns (relative to the package) of the libraries
+    packaged for *os_type*
+
+    CPU-optimized builds are in subdirectories named for the variant and
+    custom builds with the UDP server are in ``udpsrv``. Patterns do not
+    match recursively, so each file is matched by a single pattern.
+    """
+    lib_glob = get_lib_glob(os_type)
+    patterns = [lib_glob]
+    if pkg_name == 'pyrtlsdrlib.lib.custom_build':
+        patterns.append(f'udpsrv/{lib_glob}')
+    patterns.extend(f'{name}/{lib_glob}' for name in get_cpu_variant_names(root))
+    return patterns
+
+def get_lib_files(pkg_name, patterns, root=PROJECT_ROOT):
+    """Get the library files in a package matching the glob patterns,
+    excluding symlinks
+
+    Wheels can't contain symlinks so each one would be a full copy of the
+    library it points to. The loader reads the real filenames (and their
+    aliases) from lib-manifest.json instead.
+    """
+    pkg_dir = Path(root).joinpath('src', *pkg_name.split('.'))
+    files = set()
+    for pattern in patterns:
+        for p in pkg_dir.glob(pattern):
+            if p.is_file() and not p.is_symlink():
+                files.add(p.relative_to(pkg_dir).as_posix())
+    return sorted(files)
+
+def get_package_lib_files(os_type, root=PROJECT_ROOT):
+    """Get the library files packaged in the wheel for *os_type*, keyed by
+    package name
+
+    ``tools/build_wheels.py`` uses this to find the files in a staged tree.
+    """
+    return {
+        pkg_name: get_lib_files(pkg_name, get_lib_patterns(pkg_name, os_type, root), root)
+        for pkg_name in LIB_PACKAGES
+    }
+
+pkg_data = {'*':['LICENSE*', 'README*']}
+for pkg_name, lib_files in get_package_lib_files(OS_TYPE).items():
+    pkg_data[pkg_name] = ['*.json', *lib_files]
 
 try:
     from wheel.bdist_wheel import bdist_wheel
@@ -87,12 +147,15 @@ else:
 
     cmdclass = {'bdist_wheel': bdist_wheel_half_pure}
 
-setup(
-    cmdclass=cmdclass,
-    packages=find_namespace_packages(
-        where='src',
-    ),
-    package_dir={"": "src"},
-    package_data=pkg_data,
-    include_package_data=True,
-)
+# Only build when run by setuptools (or directly), since
+# tools/build_wheels.py imports this file for get_package_lib_files
+if __name__ == '__main__':
+    setup(
+        cmdclass=cmdclass,
+        packages=find_namespace_packages(
+            where='src',
+        ),
+        package_dir={"": "src"},
+        package_data=pkg_data,
+        include_package_data=True,
+    )
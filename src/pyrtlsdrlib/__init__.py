@@ -1,17 +1,59 @@
-from __future__ import annotations
 import warnings
-import importlib.metadata
 
-from .common import *
-from .lib import get_library_files, load_librtlsdr
+# `typing` is avoided here to keep the import cheap
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .common import BuildType, FileType, BuildFile
+    from .lib import get_library_files, load_librtlsdr
 
 PYRTLSDR_MIN_VERSION = '0.3.0'
 
+# Names resolved on first access by ``__getattr__`` to keep ``import pyrtlsdrlib``
+# cheap. Maps the attribute name to the submodule it lives in.
+_LAZY_ATTRS = {
+    'BuildType': 'common',
+    'FileType': 'common',
+    'BuildFile': 'common',
+    'get_library_files': 'lib',
+    'load_librtlsdr': 'lib',
+}
+
+# Submodules which were imported by ``import pyrtlsdrlib`` before it was made
+# lazy. These are imported on first attribute access for compatibility.
+_LAZY_SUBMODULES = ('common', 'lib', 'platform')
+
+__all__ = (
+    'PYRTLSDR_MIN_VERSION', 'VersionWarning', 'check_pyrtlsdr_version',
+) + tuple(_LAZY_ATTRS)
+
+_version_checked = False
+
+
+def __getattr__(name: str) -> object:
+    import importlib
+    if name in _LAZY_SUBMODULES:
+        # Importing sets the attribute on the package
+        return importlib.import_module(f'.{name}', __name__)
+    modname = _LAZY_ATTRS.get(name)
+    if modname is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    mod = importlib.import_module(f'.{modname}', __name__)
+    obj = getattr(mod, name)
+    globals()[name] = obj
+    return obj
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | set(_LAZY_SUBMODULES))
+
+
 class VersionWarning(UserWarning):
     pass
 
 
 def check_pyrtlsdr_version():
+    import importlib.metadata
+
     def parse_version(version: str) -> list[int]:
         return [int(v) for v in version.split('.')]
     def normalize_version(a: list[int], b: list[int]) -> tuple[list[int], list[int]]:
@@ -51,4 +93,15 @@ def check_pyrtlsdr_version():
     finally:
         warnings.formatwarning = orig_fmt
 
-check_pyrtlsdr_version()
+
+def _check_pyrtlsdr_version_once():
+    """Run :func:`check_pyrtlsdr_version` the first time it is called
+
+    This is deferred from import time to the first library load since the
+    version lookup scans every distribution on :data:`sys.path`.
+    """
+    global _version_checked
+    if _version_checked:
+        return
+    _version_checked = True
+    check_pyrtlsdr_version()
@@ -0,0 +1,199 @@
+"""asyncio interface for streaming samples
+
+:class:`AsyncStream` runs the blocking ``rtlsdr_read_async`` loop of an
+:class:`~.stream.AsyncReader` on a dedicated thread and hands blocks to the
+event loop through a bounded queue::
+
+    async with AsyncStream(dev) as stream:
+        async for block in stream:
+            process(block.view)
+
+When the queue is full, the *policy* decides what happens to new blocks:
+
+``'drop-oldest'``
+    The oldest queued block is discarded
+``'drop-newest'``
+    The new block is discarded (without being copied)
+``'block'``
+    The driver thread waits for the consumer. Note that librtlsdr will drop
+    samples at the USB level if this happens for too long.
+
+If the task iterating the stream is cancelled while waiting for a block,
+the stream is closed (see :meth:`AsyncStream.aclose`). Otherwise use
+``async with`` or call :meth:`~AsyncStream.aclose` to stop reading.
+
+Blocks yielded by the stream are retained copies (see
+:meth:`.stream.SampleBlock.retain`) since they outlive the driver callback.
+"""
+from __future__ import annotations
+import typing as tp
+import asyncio
+import threading
+import collections
+from ctypes import CDLL, c_void_p
+
+from .stream import AsyncReader, SampleBlock
+
+__all__ = ('POLICIES', 'AsyncStream')
+
+POLICIES = ('drop-oldest', 'drop-newest', 'block')
+
+
+def _set_waiter(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class AsyncStream:
+    """Async iterator of :class:`~.stream.SampleBlock` objects
+
+    Arguments:
+        dev: The ``rtlsdr_dev_t*`` handle of an open device. Ignored if
+            *reader* is given
+        dll: The librtlsdr library (see :class:`~.stream.AsyncReader`)
+        maxsize: Maximum number of blocks to queue
+        policy: What to do when the queue is full (one of :data:`POLICIES`)
+        buf_num: Passed to :class:`~.stream.AsyncReader`
+        buf_len: Passed to :class:`~.stream.AsyncReader`
+        reader: An existing :class:`~.stream.AsyncReader` to use
+
+    Attributes:
+        dropped: Number of blocks discarded because the queue was full
+
+    """
+    def __init__(
+        self,
+        dev: c_void_p|int|None = None,
+        dll: CDLL|None = None,
+        maxsize: int = 16,
+        policy: str = 'drop-oldest',
+        buf_num: int = 0,
+        buf_len: int = 0,
+        reader: AsyncReader|None = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f'Invalid policy "{policy}". Must be one of {POLICIES}')
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        if reader is None:
+            if dev is None:
+                raise ValueError('Either dev or reader must be given')
+            reader = AsyncReader(dev, dll=dll, buf_num=buf_num, buf_len=buf_len)
+        self.reader = reader
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._queue: tp.Deque[SampleBlock] = collections.deque()
+        self._cond = threading.Condition()
+        self._waiter: asyncio.Future|None = None
+        self._loop: asyncio.AbstractEventLoop|None = None
+        self._thread: threading.Thread|None = None
+        self._finished = False
+        self._closed = False
+        # Set once `aclose` has detached from the reader
+        self._detached = False
+        self._exc: BaseException|None = None
+
+    def start(self):
+        """Start the driver thread (must be called from the event loop)
+        """
+        if self._thread is not None:
+            raise RuntimeError('Already started')
+        self._loop = asyncio.get_running_loop()
+        self.reader.add_consumer(self._on_block)
+        t = self._thread = threading.Thread(target=self._run, daemon=True)
+        t.start()
+
+    async def aclose(self):
+        """Cancel reading (with ``rtlsdr_cancel_async``) and wait for the
+        driver thread to exit
+
+        Calling this more than once has no further effect.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        t = self._thread
+        if t is None:
+            return
+        loop = asyncio.get_running_loop()
+        while t.is_alive():
+            # The cancel request is ignored if the driver loop hasn't
+            # started yet, so keep trying until the thread exits
+            self.reader.cancel()
+            await loop.run_in_executor(None, t.join, .1)
+        if not self._detached:
+            self._detached = True
+            self.reader.remove_consumer(self._on_block)
+
+    def _run(self):
+        try:
+            self.reader.run()
+        except BaseException as exc:
+            self._exc = exc
+        finally:
+            with self._cond:
+                self._finished = True
+                self._wakeup()
+
+    def _wakeup(self):
+        w = self._waiter
+        if w is not None:
+            self._waiter = None
+            assert self._loop is not None
+            self._loop.call_soon_threadsafe(_set_waiter, w)
+
+    def _on_block(self, block: SampleBlock):
+        # Called on the driver thread. This is the only producer, so the
+        # queue can only shrink while the lock is released for the copy.
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                if self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return
+                elif self.policy == 'block':
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+        retained = block.retain()
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(retained)
+            self._wakeup()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> SampleBlock:
+        if self._thread is None:
+            self.start()
+        while True:
+            with self._cond:
+                if len(self._queue):
+                    block = self._queue.popleft()
+                    self._cond.notify()
+                    return block
+                if self._finished:
+                    exc, self._exc = self._exc, None
+                    if exc is not None:
+                        raise exc
+                    raise StopAsyncIteration
+                assert self._loop is not None
+                w = self._waiter = self._loop.create_future()
+            try:
+                await w
+            except asyncio.CancelledError:
+                # Without this, a task iterating with a bare `async for`
+                # would leave the driver thread running after cancellation
+                await self.aclose()
+                raise
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -0,0 +1,267 @@
+"""Declared prototypes for the librtlsdr API
+
+The :class:`~ctypes.CDLL` returned by :func:`~.lib.load_librtlsdr` has no
+``argtypes`` or ``restype`` set, so calls through it use ctypes' default
+int conversion (which truncates 64-bit ``rtlsdr_dev_t*`` handles).
+
+:data:`PROTOTYPES` declares the API once. :class:`LibRtlSdr` binds a separate
+function object for each symbol, so the shared ``CDLL`` instance (which
+pyrtlsdr configures itself) is left untouched::
+
+    lib = get_bindings()
+    dev = c_void_p()
+    lib.rtlsdr_open(byref(dev), 0)
+    lib.rtlsdr_set_center_freq(dev, 100_000_000)
+
+If `cffi <https://cffi.readthedocs.io>`_ is installed, :func:`get_cffi_lib`
+provides an ABI-mode backend with lower per-call overhead, which helps in
+tight loops such as frequency sweeps.
+"""
+from __future__ import annotations
+import typing as tp
+import threading
+import ctypes
+from ctypes import (
+    CDLL, CFUNCTYPE, POINTER, c_char_p, c_int, c_uint8, c_uint16, c_uint32, c_void_p,
+)
+
+try:
+    import cffi
+except ImportError: # pragma: no cover
+    cffi = None
+
+from .lib import load_librtlsdr
+
+__all__ = (
+    'read_async_cb_t', 'PROTOTYPES', 'CDEF', 'LibRtlSdr',
+    'bind_function', 'get_bindings', 'get_cffi_lib',
+)
+
+read_async_cb_t = CFUNCTYPE(None, c_void_p, c_uint32, c_void_p)
+"""``void (*rtlsdr_read_async_cb_t)(unsigned char *buf, uint32_t len, void *ctx)``
+
+The buffer argument is declared as :class:`~ctypes.c_void_p` so it arrives
+as a plain integer address.
+"""
+
+_dev = c_void_p
+
+PROTOTYPES: tp.Dict[str, tp.Tuple[tp.Any, tp.Tuple[tp.Any, ...]]] = {
+    'rtlsdr_get_device_count': (c_uint32, ()),
+    'rtlsdr_get_device_name': (c_char_p, (c_uint32,)),
+    'rtlsdr_get_device_usb_strings': (c_int, (c_uint32, c_char_p, c_char_p, c_char_p)),
+    'rtlsdr_get_index_by_serial': (c_int, (c_char_p,)),
+    'rtlsdr_open': (c_int, (POINTER(c_void_p), c_uint32)),
+    'rtlsdr_close': (c_int, (_dev,)),
+    'rtlsdr_set_xtal_freq': (c_int, (_dev, c_uint32, c_uint32)),
+    'rtlsdr_get_xtal_freq': (c_int, (_dev, POINTER(c_uint32), POINTER(c_uint32))),
+    'rtlsdr_get_usb_strings': (c_int, (_dev, c_char_p, c_char_p, c_char_p)),
+    'rtlsdr_write_eeprom': (c_int, (_dev, c_void_p, c_uint8, c_uint16)),
+    'rtlsdr_read_eeprom': (c_int, (_dev, c_void_p, c_uint8, c_uint16)),
+    'rtlsdr_set_center_freq': (c_int, (_dev, c_uint32)),
+    'rtlsdr_get_center_freq': (c_uint32, (_dev,)),
+    'rtlsdr_set_freq_correction': (c_int, (_dev, c_int)),
+    'rtlsdr_get_freq_correction': (c_int, (_dev,)),
+    'rtlsdr_get_tuner_type': (c_int, (_dev,)),
+    'rtlsdr_get_tuner_gains': (c_int, (_dev, POINTER(c_int))),
+    'rtlsdr_set_tuner_gain': (c_int, (_dev, c_int)),
+    'rtlsdr_set_tuner_bandwidth': (c_int, (_dev, c_uint32)),
+    'rtlsdr_get_tuner_gain': (c_int, (_dev,)),
+    'rtlsdr_set_tuner_if_gain': (c_int, (_dev, c_int, c_int)),
+    'rtlsdr_set_tuner_gain_mode': (c_int, (_dev, c_int)),
+    'rtlsdr_set_sample_rate': (c_int, (_dev, c_uint32)),
+    'rtlsdr_get_sample_rate': (c_uint32, (_dev,)),
+    'rtlsdr_set_testmode': (c_int, (_dev, c_int)),
+    'rtlsdr_set_agc_mode': (c_int, (_dev, c_int)),
+    'rtlsdr_set_direct_sampling': (c_int, (_dev, c_int)),
+    'rtlsdr_get_direct_sampling': (c_int, (_dev,)),
+    'rtlsdr_set_offset_tuning': (c_int, (_dev, c_int)),
+    'rtlsdr_get_offset_tuning': (c_int, (_dev,)),
+    'rtlsdr_reset_buffer': (c_int, (_dev,)),
+    'rtlsdr_read_sync': (c_int, (_dev, c_void_p, c_int, POINTER(c_int))),
+    'rtlsdr_wait_async': (c_int, (_dev, read_async_cb_t, c_void_p)),
+    'rtlsdr_read_async': (c_int, (_dev, read_async_cb_t, c_void_p, c_uint32, c_uint32)),
+    'rtlsdr_cancel_async': (c_int, (_dev,)),
+    'rtlsdr_set_bias_tee': (c_int, (_dev, c_int)),
+    'rtlsdr_set_bias_tee_gpio': (c_int, (_dev, c_int, c_int)),
+}
+"""``(restype, argtypes)`` for each function in ``rtl-sdr.h``
+
+Device handles (``rtlsdr_dev_t*``) are declared as :class:`~ctypes.c_void_p`.
+"""
+
+CDEF = '''
+typedef struct rtlsdr_dev rtlsdr_dev_t;
+typedef void(*rtlsdr_read_async_cb_t)(unsigned char *buf, uint32_t len, void *ctx);
+
+uint32_t rtlsdr_get_device_count(void);
+const char* rtlsdr_get_device_name(uint32_t index);
+int rtlsdr_get_device_usb_strings(uint32_t index, char *manufact, char *product, char *serial);
+int rtlsdr_get_index_by_serial(const char *serial);
+int rtlsdr_open(rtlsdr_dev_t **dev, uint32_t index);
+int rtlsdr_close(rtlsdr_dev_t *dev);
+int rtlsdr_set_xtal_freq(rtlsdr_dev_t *dev, uint32_t rtl_freq, uint32_t tuner_freq);
+int rtlsdr_get_xtal_freq(rtlsdr_dev_t *dev, uint32_t *rtl_freq, uint32_t *tuner_freq);
+int rtlsdr_get_usb_strings(rtlsdr_dev_t *dev, char *manufact, char *product, char *serial);
+int rtlsdr_write_eeprom(rtlsdr_dev_t *dev, uint8_t *data, uint8_t offset, uint16_t len);
+int rtlsdr_read_eeprom(rtlsdr_dev_t *dev, uint8_t *data, uint8_t offset, uint16_t len);
+int rtlsdr_set_center_freq(rtlsdr_dev_t *dev, uint32_t freq);
+uint32_t rtlsdr_get_center_freq(rtlsdr_dev_t *dev);
+int rtlsdr_set_freq_correction(rtlsdr_dev_t *dev, int ppm);
+int rtlsdr_get_freq_correction(rtlsdr_dev_t *dev);
+int rtlsdr_get_tuner_type(rtlsdr_dev_t *dev);
+int rtlsdr_get_tuner_gains(rtlsdr_dev_t *dev, int *gains);
+int rtlsdr_set_tuner_gain(rtlsdr_dev_t *dev, int gain);
+int rtlsdr_set_tuner_bandwidth(rtlsdr_dev_t *dev, uint32_t bw);
+int rtlsdr_get_tuner_gain(rtlsdr_dev_t *dev);
+int rtlsdr_set_tuner_if_gain(rtlsdr_dev_t *dev, int stage, int gain);
+int rtlsdr_set_tuner_gain_mode(rtlsdr_dev_t *dev, int manual);
+int rtlsdr_set_sample_rate(rtlsdr_dev_t *dev, uint32_t rate);
+uint32_t rtlsdr_get_sample_rate(rtlsdr_dev_t *dev);
+int rtlsdr_set_testmode(rtlsdr_dev_t *dev, int on);
+int rtlsdr_set_agc_mode(rtlsdr_dev_t *dev, int on);
+int rtlsdr_set_direct_sampling(rtlsdr_dev_t *dev, int on);
+int rtlsdr_get_direct_sampling(rtlsdr_dev_t *dev);
+int rtlsdr_set_offset_tuning(rtlsdr_dev_t *dev, int on);
+int rtlsdr_get_offset_tuning(rtlsdr_dev_t *dev);
+int rtlsdr_reset_buffer(rtlsdr_dev_t *dev);
+int rtlsdr_read_sync(rtlsdr_dev_t *dev, void *buf, int len, int *n_read);
+int rtlsdr_wait_async(rtlsdr_dev_t *dev, rtlsdr_read_async_cb_t cb, void *ctx);
+int rtlsdr_read_async(rtlsdr_dev_t *dev, rtlsdr_read_async_cb_t cb, void *ctx,
+                      uint32_t buf_num, uint32_t buf_len);
+int rtlsdr_cancel_async(rtlsdr_dev_t *dev);
+int rtlsdr_set_bias_tee(rtlsdr_dev_t *dev, int on);
+int rtlsdr_set_bias_tee_gpio(rtlsdr_dev_t *dev, int gpio, int on);
+'''
+"""C declarations of :data:`PROTOTYPES` for :mod:`cffi`"""
+
+_lock = threading.Lock()
+_bindings: LibRtlSdr|None = None
+_cffi_lib: tp.Tuple[tp.Any, tp.Any, CDLL]|None = None
+
+
+def _bind(dll: CDLL, name: str, restype, *argtypes):
+    # Build a separate function object from the symbol's address so
+    # argtypes set here don't affect other users of the same CDLL instance
+    proto = CFUNCTYPE(restype, *argtypes)
+    addr = ctypes.cast(getattr(dll, name), c_void_p).value
+    return proto(addr)
+
+
+def bind_function(
+    dll: CDLL,
+    name: str,
+    prototype: tp.Tuple[tp.Any, tp.Tuple[tp.Any, ...]]|None = None,
+):
+    """Bind the function *name* from *dll* using its declared prototype
+
+    Arguments:
+        dll: The library
+        name: The function name
+        prototype: A ``(restype, argtypes)`` tuple for functions not in
+            :data:`PROTOTYPES` (such as extensions of patched builds)
+
+    Raises:
+        KeyError: If *name* is not in :data:`PROTOTYPES` and no *prototype*
+            was given
+        AttributeError: If the library does not export *name*
+
+    """
+    if prototype is None:
+        prototype = PROTOTYPES[name]
+    restype, argtypes = prototype
+    return _bind(dll, name, restype, *argtypes)
+
+
+class LibRtlSdr:
+    """The librtlsdr API with declared prototypes
+
+    Each function in :data:`PROTOTYPES` exported by the library is available
+    as an attribute of the same name.
+
+    Arguments:
+        dll: The librtlsdr library
+
+    Attributes:
+        dll: The library the functions were bound from
+        missing: Names of declared functions the library does not export
+            (older releases lack some of them)
+
+    """
+    def __init__(self, dll: CDLL):
+        self.dll = dll
+        missing = set()
+        for name in PROTOTYPES:
+            try:
+                func = bind_function(dll, name)
+            except AttributeError:
+                missing.add(name)
+                continue
+            setattr(self, name, func)
+        self.missing: tp.FrozenSet[str] = frozenset(missing)
+
+    def __getattr__(self, name):
+        # Only called for names that weren't bound
+        if name in PROTOTYPES:
+            raise AttributeError(f'librtlsdr does not export "{name}"')
+        raise AttributeError(name)
+
+
+def get_bindings(dll: CDLL|None = None) -> LibRtlSdr:
+    """Get a :class:`LibRtlSdr` instance
+
+    If *dll* is not given, bindings for :func:`~.lib.load_librtlsdr` are
+    created once and reused (as long as the library isn't reloaded).
+    """
+    global _bindings
+    if dll is not None:
+        return LibRtlSdr(dll)
+    dll = load_librtlsdr()
+    if dll is None:
+        raise RuntimeError('Could not load librtlsdr')
+    b = _bindings
+    if b is not None and b.dll is dll:
+        return b
+    with _lock:
+        b = _bindings
+        if b is None or b.dll is not dll:
+            b = _bindings = LibRtlSdr(dll)
+        return b
+
+
+def get_cffi_lib(dll: CDLL|None = None) -> tp.Tuple[tp.Any, tp.Any]:
+    """Open librtlsdr using :mod:`cffi` in ABI mode
+
+    Returns a tuple of the ``FFI`` instance and the library object. Device
+    handles from ctypes can be converted with
+    ``ffi.cast('rtlsdr_dev_t *', handle.value)``.
+
+    Arguments:
+        dll: A library loaded with ctypes. The same file is opened with cffi.
+            If not given, :func:`~.lib.load_librtlsdr` is used and the result
+            is reused for subsequent calls
+
+    Raises:
+        ImportError: If cffi is not installed
+
+    """
+    global _cffi_lib
+    if cffi is None:
+        raise ImportError('cffi is required for the cffi backend')
+    if dll is None:
+        dll = load_librtlsdr()
+        if dll is None:
+            raise RuntimeError('Could not load librtlsdr')
+        with _lock:
+            r = _cffi_lib
+            if r is None or r[2] is not dll:
+                r = _cffi_lib = _open_cffi(dll) + (dll,)
+            return r[0], r[1]
+    return _open_cffi(dll)
+
+
+def _open_cffi(dll: CDLL) -> tp.Tuple[tp.Any, tp.Any]:
+    assert cffi is not None
+    ffi = cffi.FFI()
+    ffi.cdef(CDEF)
+    return ffi, ffi.dlopen(dll._name)
@@ -1,8 +1,7 @@
 from __future__ import annotations
-import sys
 import typing as tp
 import enum
-import dataclasses
+import functools
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -24,6 +23,12 @@ class BuildType(enum.Flag):
     static = enum.auto()
     udpsrv = enum.auto()
 
+    # CPU-optimized variants (see `pyrtlsdrlib.platform.CPU_VARIANTS`)
+    x86_64_v2 = enum.auto()
+    x86_64_v3 = enum.auto()
+    x86_64_v4 = enum.auto()
+    armv8_2a = enum.auto()
+
     # Alias linux to ubuntu since we're compiling from manylinux.
     # This should probably be changed in the future to be more accurate.
     linux = ubuntu
@@ -39,14 +44,7 @@ class BuildType(enum.Flag):
 
     @staticmethod
     def from_str(s: str) -> BuildType:
-        if '|' in s:
-            result = BuildType.unknown
-            for name in s.split('|'):
-                result |= BuildType.from_str(name)
-            if result != BuildType.unknown:
-                result ^= BuildType.unknown
-            return result
-        return getattr(BuildType, s.lower())
+        return _parse_build_type(s)
 
     def filter_options(self) -> BuildType:
         to_exclude = self.from_str('all_os|source')
@@ -54,7 +52,14 @@ class BuildType(enum.Flag):
 
     def contains(self, other: BuildType|str) -> bool:
         if isinstance(other, str):
-            other = BuildType.from_str(other)
+            other = _parse_build_type(other)
+        key = (self._value_, other._value_)
+        r = _contains_table.get(key)
+        if r is None:
+            r = _contains_table[key] = self._contains(other)
+        return r
+
+    def _contains(self, other: BuildType) -> bool:
         if self & 'windows' and other & 'windows':
             arch_types = self & 'w32|w64'
             if not other & arch_types:
@@ -79,20 +84,37 @@ class BuildType(enum.Flag):
 
     def __or__(self, other: BuildType|str):
         if isinstance(other, str):
-            other = self.from_str(other)
+            other = _parse_build_type(other)
         return super().__or__(other)
 
     def __and__(self, other: BuildType|str):
         if isinstance(other, str):
-            other = self.from_str(other)
+            other = _parse_build_type(other)
         return super().__and__(other)
 
     def __xor__(self, other: BuildType|str):
         if isinstance(other, str):
-            other = self.from_str(other)
+            other = _parse_build_type(other)
         return super().__xor__(other)
 
 
+# Results of `BuildType.contains()` keyed by the (self, other) integer values.
+# Filled on first use of each pair since the full table of member combinations
+# would be mostly unused.
+_contains_table: tp.Dict[tp.Tuple[int, int], bool] = {}
+
+@functools.lru_cache(maxsize=512)
+def _parse_build_type(s: str) -> BuildType:
+    if '|' in s:
+        result = BuildType.unknown
+        for name in s.split('|'):
+            result |= _parse_build_type(name)
+        if result != BuildType.unknown:
+            result ^= BuildType.unknown
+        return result
+    return getattr(BuildType, s.lower())
+
+
 class FileType(enum.Enum):
     bin = enum.auto()
     lib = enum.auto()
@@ -105,7 +127,37 @@ class FileType(enum.Enum):
     def to_str(self) -> str:
         return self.name
 
-@dataclass
+# Short codes used by the flat build metadata format. These must never change
+# (new members need new codes).
+_BUILD_TYPE_CODES = {
+    'unknown': '?', 'macos': 'm', 'windows': 'W', 'ubuntu': 'u', 'source': 's',
+    'x86_64': 'x', 'aarch64': 'a', 'w32': '3', 'w64': '6', 'dlldep': 'd',
+    'static': 'S', 'udpsrv': 'U', 'x86_64_v2': '2', 'x86_64_v3': 'V', 'x86_64_v4': '4',
+    'armv8_2a': '8',
+}
+_FILE_TYPE_CODES = {'bin': 'b', 'lib': 'l', 'other': 'o'}
+
+@functools.lru_cache(maxsize=256)
+def _build_type_to_code(bt: BuildType) -> str:
+    return ''.join(_BUILD_TYPE_CODES[m.name] for m in bt)
+
+@functools.lru_cache(maxsize=256)
+def _build_type_from_code(code: str) -> BuildType:
+    names = {v:k for k,v in _BUILD_TYPE_CODES.items()}
+    return _parse_build_type('|'.join(names[c] for c in code))
+
+
+def _to_path(val: tp.Any) -> Path:
+    return val if isinstance(val, Path) else Path(val)
+
+def _to_build_type(val: tp.Any) -> BuildType:
+    return val if isinstance(val, BuildType) else _parse_build_type(val)
+
+def _to_file_type(val: tp.Any) -> FileType:
+    return val if isinstance(val, FileType) else FileType.from_str(val)
+
+
+@dataclass(slots=True)
 class BuildFile:
     build_type: BuildType
     file_type: FileType
@@ -113,70 +165,70 @@ class BuildFile:
     is_symlink: bool = False
     symlink_target: Path|None = None
 
-    _field_map: tp.ClassVar[tp.Dict[str, type]]|None = None
-
-    @classmethod
-    def _get_field_map(cls) -> tp.Dict[str, type]:
-        fields = cls._field_map
-        if fields is None:
-            fields = {}
-            for field in dataclasses.fields(cls):
-                ftype = field.type
-                if isinstance(ftype, str):
-                    if '|' in ftype:
-                        ftypes = set([t.strip(' ') for t in ftype.split('|')])
-                        ftypes.discard('None')
-                        assert len(ftypes) == 1
-                        ftype = ftypes.pop()
-
-                    if '.' in ftype:
-                        modname = '.'.join(ftype.split('.')[:-1])
-                        objname = ftype.split('.')[-1]
-                    else:
-                        objname = ftype
-                        b = __builtins__
-                        if not isinstance(b, dict):
-                            b = b.__dict__
-                        if objname in b:
-                            modname = 'builtins'
-                        else:
-                            modname = cls.__module__
-                    m = sys.modules[modname]
-                    ftype = getattr(m, objname)
-                fields[field.name] = ftype
-            cls._field_map = fields
-        return fields
-
     @classmethod
     def _deserialize(cls, data: tp.Dict[str, tp.Any]) -> BuildFile:
         kw = {}
-        for fname, ftype in cls._get_field_map().items():
+        for fname, conv in _FIELD_DECODERS:
             val = data.get(fname)
             if val is None:
                 continue
-            if isinstance(ftype, enum.EnumMeta) and not isinstance(val, enum.Enum):
-                val = ftype.from_str(val)
-            elif ftype is Path and not isinstance(val, Path):
-                assert isinstance(val, str)
-                val = Path(val)
-            kw[fname] = val
-
+            kw[fname] = conv(val)
         obj = cls(**kw)
         if obj.symlink_target is not None:
-            sym_fn = obj.symlink_target.name
-            sym_dir = obj.filename.parent
-            obj.symlink_target = sym_dir / sym_fn
+            obj.symlink_target = obj.filename.parent / obj.symlink_target.name
         return obj
 
     def _serialize(self) -> tp.Dict[str, tp.Any]:
-        d = dataclasses.asdict(self)
-        for key in d:
-            val = d[key]
-            if isinstance(val, (BuildType, FileType)):
-                val = val.to_str()
-            elif isinstance(val, Path):
-                val = str(val)
-            else:
-                continue
-            d[key] = val
-        return d
+        symlink_target = self.symlink_target
+        return dict(
+            build_type=self.build_type.to_str(),
+            file_type=self.file_type.to_str(),
+            filename=str(self.filename),
+            is_symlink=self.is_symlink,
+            symlink_target=None if symlink_target is None else str(symlink_target),
+        )
+
+    def to_row(self) -> tp.List[tp.Any]:
+        """Encode as a row of the flat build metadata format
+
+        The row is ``[build_type, file_type, filename, symlink_target]`` with
+        both types as short codes. The symlink target is stored by name
+        (``""`` for a symlink with no known target) and is ``None`` for
+        regular files.
+        """
+        if self.is_symlink:
+            target = '' if self.symlink_target is None else _to_path(self.symlink_target).name
+        else:
+            target = None
+        return [
+            _build_type_to_code(self.build_type),
+            _FILE_TYPE_CODES[self.file_type.name],
+            str(self.filename),
+            target,
+        ]
+
+    @classmethod
+    def from_row(cls, row: tp.Sequence[tp.Any]) -> BuildFile:
+        """Decode a row created by :meth:`to_row`
+        """
+        bt_code, ft_code, filename, target = row
+        filename = Path(filename)
+        if target is None:
+            is_symlink, symlink_target = False, None
+        else:
+            is_symlink = True
+            symlink_target = filename.parent / target if target else None
+        return cls(
+            _build_type_from_code(bt_code), _FILE_TYPES_BY_CODE[ft_code], filename,
+            is_symlink, symlink_target,
+        )
+
+
+_FIELD_DECODERS: tp.Tuple[tp.Tuple[str, tp.Callable[[tp.Any], tp.Any]], ...] = (
+    ('build_type', _to_build_type),
+    ('file_type', _to_file_type),
+    ('filename', _to_path),
+    ('is_symlink', bool),
+    ('symlink_target', _to_path),
+)
+_FILE_TYPES_BY_CODE = {v:FileType[k] for k,v in _FILE_TYPE_CODES.items()}
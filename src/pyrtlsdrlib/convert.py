@@ -0,0 +1,154 @@
+"""Conversion of interleaved unsigned 8-bit IQ (``cu8``) samples
+
+Samples are written into caller-supplied output arrays using in-place
+:mod:`numpy` ufuncs so no temporaries the size of the input are created.
+Inputs may be any bytes-like object (such as :attr:`.stream.SampleBlock.view`)
+or a ``uint8`` array. Arrays with more than one dimension are treated as a
+batch of blocks along the leading axes.
+
+Output formats:
+
+``cf32``
+    :class:`numpy.complex64` with I and Q scaled to ``[-1, 1]`` as
+    ``(x - 127.5) / 127.5``. The output has half as many elements as the
+    input along the last axis.
+
+``ci16``
+    Interleaved :class:`numpy.int16` scaled as ``(2 * x - 255) * 128``
+    (so dividing by 32640 gives the ``cf32`` values).
+
+``cs8``
+    Interleaved :class:`numpy.int8` as ``x - 128``.
+
+This module requires :mod:`numpy`, available with the ``numpy`` extra::
+
+    pip install pyrtlsdrlib[numpy]
+"""
+from __future__ import annotations
+import typing as tp
+
+import numpy as np
+
+__all__ = (
+    'FORMATS', 'to_cf32', 'to_ci16', 'to_cs8', 'convert', 'get_output_shape',
+    'Converter',
+)
+
+FORMATS = {
+    'cf32': np.dtype(np.complex64),
+    'ci16': np.dtype(np.int16),
+    'cs8': np.dtype(np.int8),
+}
+
+_F32_OFFSET = np.float32(127.5)
+_F32_SCALE = np.float32(1 / 127.5)
+_I16_OFFSET = np.int16(32640)
+
+
+def _as_input(samples) -> np.ndarray:
+    if isinstance(samples, np.ndarray):
+        if samples.dtype != np.uint8:
+            raise TypeError(f'Expected uint8 samples, got {samples.dtype}')
+        return samples
+    return np.frombuffer(samples, dtype=np.uint8)
+
+
+def get_output_shape(input_shape: tp.Tuple[int, ...], fmt: str) -> tp.Tuple[int, ...]:
+    """Get the shape of the output array for *input_shape* samples
+    converted to *fmt*
+    """
+    if input_shape[-1] % 2:
+        raise ValueError('Sample count must be even (interleaved I/Q)')
+    if fmt == 'cf32':
+        return input_shape[:-1] + (input_shape[-1] // 2,)
+    elif fmt in FORMATS:
+        return input_shape
+    raise ValueError(f'Unknown format "{fmt}"')
+
+
+def _get_output(samples: np.ndarray, out: np.ndarray|None, fmt: str) -> np.ndarray:
+    shape = get_output_shape(samples.shape, fmt)
+    dtype = FORMATS[fmt]
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.dtype != dtype:
+        raise TypeError(f'Output dtype must be {dtype} for "{fmt}", got {out.dtype}')
+    if out.shape != shape:
+        raise ValueError(f'Output shape must be {shape}, got {out.shape}')
+    if not out.flags.c_contiguous:
+        raise ValueError('Output array must be C-contiguous')
+    return out
+
+
+def to_cf32(samples, out: np.ndarray|None = None) -> np.ndarray:
+    """Convert to :class:`numpy.complex64`
+    """
+    samples = _as_input(samples)
+    out = _get_output(samples, out, 'cf32')
+    f = out.view(np.float32).reshape(samples.shape)
+    np.subtract(samples, _F32_OFFSET, out=f, dtype=np.float32)
+    np.multiply(f, _F32_SCALE, out=f)
+    return out
+
+
+def to_ci16(samples, out: np.ndarray|None = None) -> np.ndarray:
+    """Convert to interleaved :class:`numpy.int16`
+    """
+    samples = _as_input(samples)
+    out = _get_output(samples, out, 'ci16')
+    # 256 * x wraps for x >= 128 but the subtraction wraps back into range
+    np.left_shift(samples, 8, out=out, dtype=np.int16)
+    np.subtract(out, _I16_OFFSET, out=out)
+    return out
+
+
+def to_cs8(samples, out: np.ndarray|None = None) -> np.ndarray:
+    """Convert to interleaved :class:`numpy.int8`
+    """
+    samples = _as_input(samples)
+    out = _get_output(samples, out, 'cs8')
+    np.bitwise_xor(samples, np.uint8(0x80), out=out.view(np.uint8))
+    return out
+
+
+_CONVERTERS = {
+    'cf32': to_cf32,
+    'ci16': to_ci16,
+    'cs8': to_cs8,
+}
+
+def convert(samples, fmt: str = 'cf32', out: np.ndarray|None = None) -> np.ndarray:
+    """Convert *samples* to the given format (one of :data:`FORMATS`)
+    """
+    try:
+        func = _CONVERTERS[fmt]
+    except KeyError:
+        raise ValueError(f'Unknown format "{fmt}"')
+    return func(samples, out)
+
+
+class Converter:
+    """Converts blocks of a fixed size into a reused output buffer
+
+    Arguments:
+        fmt: The output format (one of :data:`FORMATS`)
+        num_bytes: Number of input bytes per block
+        batch_size: If given, blocks are converted in batches and the output
+            has this as its leading dimension
+
+    The array returned by :meth:`__call__` is overwritten on the next call.
+    """
+    def __init__(self, fmt: str, num_bytes: int, batch_size: int|None = None):
+        if fmt not in _CONVERTERS:
+            raise ValueError(f'Unknown format "{fmt}"')
+        self.fmt = fmt
+        self.func = _CONVERTERS[fmt]
+        in_shape = (num_bytes,) if batch_size is None else (batch_size, num_bytes)
+        self.input_shape = in_shape
+        self.out = np.empty(get_output_shape(in_shape, fmt), dtype=FORMATS[fmt])
+
+    def __call__(self, samples) -> np.ndarray:
+        samples = _as_input(samples)
+        if samples.shape != self.input_shape:
+            samples = samples.reshape(self.input_shape)
+        return self.func(samples, self.out)
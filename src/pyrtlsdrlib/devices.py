@@ -0,0 +1,251 @@
+"""Device enumeration and concurrent opening
+
+Opening a device with ``rtlsdr_open`` initializes its tuner which can take
+a significant amount of time. Since ctypes releases the GIL during foreign
+calls, :class:`DeviceRegistry` opens devices on a thread pool so startup time
+stays roughly constant as the number of devices grows.
+"""
+from __future__ import annotations
+import typing as tp
+import threading
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from ctypes import CDLL, byref, create_string_buffer, c_void_p
+
+from .lib import load_librtlsdr
+from .bindings import bind_function
+
+__all__ = ('DeviceInfo', 'DeviceKey', 'DeviceRegistry')
+
+USB_STRING_LENGTH = 256
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """USB information for a device, as reported by librtlsdr
+    """
+    index: int
+    name: str
+    manufacturer: str
+    product: str
+    serial: str
+
+
+DeviceKey = tp.Union[str, int]
+"""A device serial number, or its index for devices sharing a serial number"""
+
+
+class DeviceRegistry:
+    """Enumerates devices and opens them by serial number (or index)
+
+    Devices are identified by their serial number. Since many dongles ship
+    with the same serial (such as ``"00000001"``), devices sharing a serial
+    are identified by their device index instead (see :meth:`get_key`).
+
+    Arguments:
+        dll: The librtlsdr library. If not given, :func:`~.lib.load_librtlsdr`
+            is used
+        max_workers: Maximum number of threads used by :meth:`open`.
+            Defaults to the number of devices being opened
+
+    Attributes:
+        handles: The ``rtlsdr_dev_t*`` of each open device keyed by
+            :meth:`get_key`
+
+    The device list is read once and cached (see :meth:`enumerate`).
+    """
+    def __init__(self, dll: CDLL|None = None, max_workers: int|None = None):
+        if dll is None:
+            dll = load_librtlsdr()
+            if dll is None:
+                raise RuntimeError('Could not load librtlsdr')
+        self.max_workers = max_workers
+        self.handles: tp.Dict[DeviceKey, c_void_p] = {}
+        self._devices: tp.List[DeviceInfo]|None = None
+        self._duplicate_serials: tp.Set[str] = set()
+        # Futures for devices being opened by an `open` call, keyed by `get_key`
+        self._pending: tp.Dict[DeviceKey, Future] = {}
+        self._lock = threading.RLock()
+        self._get_device_count = bind_function(dll, 'rtlsdr_get_device_count')
+        self._get_device_name = bind_function(dll, 'rtlsdr_get_device_name')
+        self._get_device_usb_strings = bind_function(dll, 'rtlsdr_get_device_usb_strings')
+        self._open = bind_function(dll, 'rtlsdr_open')
+        self._close = bind_function(dll, 'rtlsdr_close')
+
+    def enumerate(self, refresh: bool = False) -> tp.List[DeviceInfo]:
+        """Get information for all connected devices
+
+        The result is cached unless *refresh* is True. Device indices change
+        when devices are connected or removed, so a refresh is needed after
+        hotplug events.
+        """
+        with self._lock:
+            devices = self._devices
+            if devices is None or refresh:
+                devices = self._devices = self._enumerate()
+                serials = [d.serial for d in devices]
+                self._duplicate_serials = {s for s in serials if serials.count(s) > 1}
+            return devices
+
+    def _enumerate(self) -> tp.List[DeviceInfo]:
+        devices = []
+        bufs = [create_string_buffer(USB_STRING_LENGTH) for _ in range(3)]
+        for index in range(self._get_device_count()):
+            for buf in bufs:
+                buf[0] = b'\0'
+            r = self._get_device_usb_strings(index, *bufs)
+            if r != 0:
+                raise OSError(f'rtlsdr_get_device_usb_strings returned {r} for device {index}')
+            name = self._get_device_name(index) or b''
+            manufacturer, product, serial = [b.value.decode(errors='replace') for b in bufs]
+            devices.append(DeviceInfo(
+                index=index,
+                name=name.decode(errors='replace'),
+                manufacturer=manufacturer,
+                product=product,
+                serial=serial,
+            ))
+        return devices
+
+    @property
+    def serials(self) -> tp.List[str]:
+        return [d.serial for d in self.enumerate()]
+
+    @property
+    def keys(self) -> tp.List[DeviceKey]:
+        """The :meth:`get_key` of each device"""
+        return [self.get_key(d) for d in self.enumerate()]
+
+    def get_key(self, info: DeviceInfo) -> DeviceKey:
+        """Get the key used for a device in :attr:`handles`
+
+        This is the serial number, or the device index if other devices
+        have the same serial number.
+        """
+        self.enumerate()
+        if info.serial in self._duplicate_serials:
+            return info.index
+        return info.serial
+
+    def get_info(self, device: DeviceKey) -> DeviceInfo:
+        """Find the :class:`DeviceInfo` for the given serial number (or
+        device index if an :class:`int` is given)
+
+        Raises :class:`KeyError` if not found or :class:`ValueError` if more
+        than one device has the serial number (open it by index or change
+        the serial with ``rtl_eeprom``)
+        """
+        if isinstance(device, int):
+            for d in self.enumerate():
+                if d.index == device:
+                    return d
+            raise KeyError(device)
+        matches = [d for d in self.enumerate() if d.serial == device]
+        if not len(matches):
+            raise KeyError(device)
+        if len(matches) > 1:
+            indices = [d.index for d in matches]
+            raise ValueError(f'Multiple devices with serial "{device}" (indices {indices})')
+        return matches[0]
+
+    def open_device(self, device: DeviceKey) -> c_void_p:
+        """Open a single device by serial number (or index), returning its handle
+        """
+        return self.open([device])[device]
+
+    def open(
+        self,
+        devices: tp.Iterable[DeviceKey]|None = None,
+        ignore_errors: bool = False,
+    ) -> tp.Dict[DeviceKey, c_void_p]:
+        """Open devices concurrently
+
+        Arguments:
+            devices: The serial numbers (or device indices) to open. If not
+                given, all devices are opened and keyed by :meth:`get_key`
+            ignore_errors: If False (the default), a failure to open any
+                device closes the others opened by this call and raises
+                :class:`OSError`. If True, failed devices are left out of
+                the result
+
+        Returns a dict of handles keyed by the given serial numbers (or
+        indices). Devices which are already open are included without being
+        opened again. If another call is opening any of the same devices,
+        this call waits for it to finish first.
+        """
+        if devices is None:
+            devices = self.keys
+        requested = [(device, self.get_info(device)) for device in devices]
+        result = {}
+        to_open: tp.Dict[DeviceKey, DeviceInfo] = {}
+        while True:
+            with self._lock:
+                busy = [
+                    self._pending[key] for key in (self.get_key(info) for _, info in requested)
+                    if key in self._pending
+                ]
+                if not len(busy):
+                    for device, info in requested:
+                        key = self.get_key(info)
+                        if key not in self.handles and key not in to_open:
+                            to_open[key] = info
+                            self._pending[key] = Future()
+                    break
+            wait(busy)
+
+        opened: tp.Dict[DeviceKey, c_void_p] = {}
+        errors = []
+        try:
+            if len(to_open):
+                max_workers = self.max_workers or len(to_open)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(self._open_device, to_open.values()))
+                for (key, info), (handle, r) in zip(to_open.items(), results):
+                    if handle is None:
+                        errors.append(f'{info.serial} (index {info.index}): rtlsdr_open returned {r}')
+                    else:
+                        opened[key] = handle
+                if len(errors) and not ignore_errors:
+                    for handle in opened.values():
+                        self._close(handle)
+                    opened.clear()
+        finally:
+            with self._lock:
+                self.handles.update(opened)
+                for key in to_open:
+                    self._pending.pop(key).set_result(opened.get(key))
+                for device, info in requested:
+                    handle = self.handles.get(self.get_key(info))
+                    if handle is not None:
+                        result[device] = handle
+        if len(errors) and not ignore_errors:
+            raise OSError('Could not open devices: {}'.format(', '.join(errors)))
+        return result
+
+    def _open_device(self, info: DeviceInfo) -> tp.Tuple[c_void_p|None, int]:
+        dev = c_void_p()
+        r = self._open(byref(dev), info.index)
+        if r < 0 or not dev.value:
+            return None, r
+        return dev, r
+
+    def close(self, device: DeviceKey):
+        """Close an open device by serial number (or index)
+        """
+        with self._lock:
+            key = device if device in self.handles else self.get_key(self.get_info(device))
+            handle = self.handles.pop(key)
+        self._close(handle)
+
+    def close_all(self):
+        with self._lock:
+            handles = list(self.handles.values())
+            self.handles.clear()
+        for handle in handles:
+            self._close(handle)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close_all()
@@ -1,5 +1,11 @@
+from __future__ import annotations
 from typing import cast
 import sys
+import os
+import json
+import hashlib
+import threading
+import importlib.metadata
 from ctypes import CDLL
 import traceback
 from pathlib import Path
@@ -14,8 +20,10 @@ def resource_filename(mod_name: str, filename: str) -> Path:
     return Path(str(importlib_resources.files(mod_name) / filename))
 
 
-from pyrtlsdrlib import BuildType
-from pyrtlsdrlib.platform import get_os_type
+from pyrtlsdrlib import BuildType, _check_pyrtlsdr_version_once
+from pyrtlsdrlib.platform import (
+    get_os_type, get_machine, get_libc, get_cpu_variants, is_library_compatible,
+)
 from . import custom_build
 
 BUILD_TYPE_LIB_GLOBS = {
@@ -25,27 +33,379 @@ BUILD_TYPE_LIB_GLOBS = {
     BuildType.windows | BuildType.w64: 'librtlsdr_w64*.dll',
 }
 
-def iter_library_files():
+UDPSRV_DIRNAME = 'udpsrv'
+"""Subdirectory of ``custom_build`` for builds with the UDP control server"""
+
+MANIFEST_FILENAME = 'lib-manifest.json'
+"""Name of the library manifest generated at build time (see :func:`read_manifest`)"""
+
+MANIFEST_FORMAT = 1
+
+CACHE_FORMAT = 1
+"""Version of the on-disk resolution cache format"""
+
+_lock = threading.RLock()
+_librtlsdr: CDLL|None = None
+_lib_dirs: tuple[Path, ...]|None = None
+_package_version: str|None = None
+_manifests: dict[Path, dict|None] = {}
+
+
+def iter_lib_dirs():
+    global _lib_dirs
+    dirs = _lib_dirs
+    if dirs is None:
+        dirs = _lib_dirs = tuple(
+            Path(resource_filename(lib_pkg, ''))
+            for lib_pkg in (custom_build.__name__, __name__)
+        )
+    yield from dirs
+
+
+def get_platform_key() -> BuildType|None:
+    """Get the key of :data:`BUILD_TYPE_LIB_GLOBS` (and of the manifest)
+    for the current platform
+    """
     os_type = get_os_type()
-    lib_glob = BUILD_TYPE_LIB_GLOBS.get(os_type)
     if BuildType.linux in os_type:
-        lib_glob = BUILD_TYPE_LIB_GLOBS[BuildType.linux]
-    if lib_glob is not None:
-        for lib_pkg in (custom_build.__name__, __name__):
-            lib_dir = Path(resource_filename(lib_pkg, ''))
+        return BuildType.linux
+    if os_type in BUILD_TYPE_LIB_GLOBS:
+        return os_type
+    return None
+
+
+def _get_lib_glob() -> str|None:
+    key = get_platform_key()
+    if key is None:
+        return None
+    return BUILD_TYPE_LIB_GLOBS[key]
+
+
+def read_manifest(lib_dir: Path) -> dict|None:
+    """Read the library manifest in *lib_dir*
+
+    The manifest is generated when the libraries are copied into the package
+    (``tools/manifest.py``). It maps each platform key (see
+    :func:`get_platform_key`) to a list of entries, most preferred first,
+    each containing:
+
+    - ``file``: The library filename (never a symlink)
+    - ``aliases``: Names of symlinks resolving to ``file``. These are not
+      included in wheels (see :func:`resolve_library_file`)
+    - ``archs``: Architectures the library was built for (if known)
+    - ``requires_glibc``: Whether the library links against glibc
+    - ``cpu``: The :data:`~pyrtlsdrlib.platform.CPU_VARIANTS` name for
+      CPU-optimized builds (``None`` for generic builds). These are only
+      loaded if supported by the CPU (see
+      :func:`~pyrtlsdrlib.platform.get_cpu_variants`) and are listed
+      before the generic build they replace
+
+    Returns ``None`` if *lib_dir* has no (readable) manifest or it is not
+    in the expected format. The result is
+    kept for the life of the process.
+    """
+    try:
+        return _manifests[lib_dir]
+    except KeyError:
+        pass
+    try:
+        data = json.loads((lib_dir / MANIFEST_FILENAME).read_text())
+    except (OSError, ValueError):
+        data = None
+    if not isinstance(data, dict) or data.get('format') != MANIFEST_FORMAT:
+        data = None
+    elif not isinstance(data.get('platforms'), dict):
+        data = None
+    _manifests[lib_dir] = data
+    return data
+
+
+def _get_manifest_entries(lib_dir: Path) -> list[dict]|None:
+    manifest = read_manifest(lib_dir)
+    if manifest is None:
+        return None
+    key = get_platform_key()
+    if key is None:
+        return []
+    return manifest['platforms'].get(key.to_str(), [])
+
+
+def _is_entry_compatible(entry: dict) -> bool:
+    # Same checks as `is_library_compatible` without reading the file
+    archs = entry.get('archs')
+    if archs is not None and get_machine() not in archs:
+        return False
+    if entry.get('requires_glibc'):
+        libc = get_libc()
+        if libc is not None and libc[0] == 'musl':
+            return False
+    cpu = entry.get('cpu')
+    if cpu is not None and cpu not in get_cpu_variants():
+        return False
+    return True
+
+
+def iter_library_files():
+    """Iterate over the library files for the current platform
+
+    Files are taken from the manifest of each library directory (see
+    :func:`read_manifest`). Directories without one are searched using
+    :data:`BUILD_TYPE_LIB_GLOBS`.
+    """
+    lib_glob = _get_lib_glob()
+    if lib_glob is None:
+        return
+    for lib_dir in iter_lib_dirs():
+        entries = _get_manifest_entries(lib_dir)
+        if entries is None:
             yield from lib_dir.glob(lib_glob)
+        else:
+            for entry in entries:
+                yield lib_dir / entry['file']
+
+
+def _udpsrv_enabled() -> bool:
+    return os.environ.get('PYRTLSDRLIB_UDPSRV') in ['1', 'true']
+
+
+def _iter_load_candidates():
+    lib_glob = _get_lib_glob()
+    if lib_glob is None:
+        return
+    if _udpsrv_enabled():
+        for lib_file in get_udpsrv_library_files():
+            if is_library_compatible(lib_file):
+                yield lib_file
+        return
+    for lib_dir in iter_lib_dirs():
+        entries = _get_manifest_entries(lib_dir)
+        if entries is None:
+            for lib_file in lib_dir.glob(lib_glob):
+                if is_library_compatible(lib_file):
+                    yield lib_file
+        else:
+            for entry in entries:
+                if _is_entry_compatible(entry):
+                    yield lib_dir / entry['file']
 
 
 def get_library_files():
     return [p for p in iter_library_files()]
 
 
-def load_librtlsdr():
-    for lib_file in iter_library_files():
+def resolve_library_file(name: str) -> Path|None:
+    """Find a library file for the current platform by its filename or
+    one of its aliases (such as ``librtlsdr.so.0``)
+
+    Aliases are resolved using the manifest so they do not need to exist
+    on disk (wheels only contain the real files). Directories without a
+    manifest are checked for *name* directly.
+    """
+    for lib_dir in iter_lib_dirs():
+        entries = _get_manifest_entries(lib_dir)
+        if entries is None:
+            lib_file = lib_dir / name
+            if lib_file.exists():
+                return lib_file.resolve()
+            continue
+        for entry in entries:
+            if name == entry['file'] or name in entry['aliases']:
+                return lib_dir / entry['file']
+    return None
+
+
+def get_udpsrv_library_files() -> list[Path]:
+    """Get library files built with the UDP control server
+
+    Source builds are placed in the :data:`UDPSRV_DIRNAME` subdirectory of
+    ``custom_build`` (their filenames match the standard build). Prebuilt
+    Windows libraries have ``udpsrv`` in their name.
+
+    These are only loaded if the ``PYRTLSDRLIB_UDPSRV`` environment variable
+    is set (see :func:`load_librtlsdr`).
+    """
+    lib_glob = _get_lib_glob()
+    if lib_glob is None:
+        return []
+    files = []
+    for lib_dir in iter_lib_dirs():
+        candidates = list((lib_dir / UDPSRV_DIRNAME).glob(lib_glob))
+        if BuildType.windows in get_os_type():
+            candidates.extend(p for p in lib_dir.glob(lib_glob) if 'udpsrv' in p.name)
+        # Skip symlinks to the versioned libraries (as setup.py does for wheels)
+        files.extend(p for p in candidates if p.is_file() and not p.is_symlink())
+    return files
+
+
+def get_cache_dir() -> Path:
+    """Get the directory used for the on-disk library resolution cache
+
+    This may be set using the ``PYRTLSDRLIB_CACHE_DIR`` environment variable,
+    otherwise the platform's user cache directory is used.
+    """
+    p = os.environ.get('PYRTLSDRLIB_CACHE_DIR')
+    if p:
+        return Path(p)
+    if sys.platform == 'win32':
+        root = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    elif sys.platform == 'darwin':
+        root = Path.home() / 'Library' / 'Caches'
+    else:
+        root = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(root) / 'pyrtlsdrlib'
+
+
+def get_cache_filename() -> Path:
+    # Key the filename by install location so separate environments
+    # do not overwrite each other's entries
+    lib_dir = str(Path(resource_filename(__name__, '')).resolve())
+    h = hashlib.sha1(lib_dir.encode()).hexdigest()[:16]
+    return get_cache_dir() / f'resolve-{h}.json'
+
+
+def _cache_enabled() -> bool:
+    return os.environ.get('PYRTLSDRLIB_NO_CACHE') not in ['1', 'true']
+
+
+def _get_package_version() -> str:
+    global _package_version
+    v = _package_version
+    if v is None:
+        try:
+            v = importlib.metadata.version('pyrtlsdrlib')
+        except importlib.metadata.PackageNotFoundError:
+            v = 'unknown'
+        _package_version = v
+    return v
+
+
+def _get_cache_key() -> dict:
+    lib_dirs = {}
+    for lib_dir in iter_lib_dirs():
+        try:
+            lib_dirs[str(lib_dir)] = lib_dir.stat().st_mtime_ns
+        except OSError:
+            lib_dirs[str(lib_dir)] = None
+    return dict(
+        format=CACHE_FORMAT,
+        version=_get_package_version(),
+        os_type=get_os_type().value,
+        # A cache shared between hosts must not select an unsupported variant
+        cpu_variants=list(get_cpu_variants()),
+        udpsrv=_udpsrv_enabled(),
+        lib_dirs=lib_dirs,
+    )
+
+
+def _read_cache(key: dict) -> Path|None:
+    try:
+        data = json.loads(get_cache_filename().read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('key') != key:
+        return None
+    lib_file = Path(data['filename'])
+    try:
+        st = lib_file.stat()
+    except OSError:
+        return None
+    if [st.st_mtime_ns, st.st_size] != data.get('stat'):
+        return None
+    return lib_file
+
+
+def _write_cache(key: dict, lib_file: Path):
+    st = lib_file.stat()
+    data = dict(key=key, filename=str(lib_file), stat=[st.st_mtime_ns, st.st_size])
+    fn = get_cache_filename()
+    tmp_fn = fn.with_name(f'{fn.name}.{os.getpid()}.tmp')
+    try:
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fn.write_text(json.dumps(data))
+        # Atomic so concurrent processes never read a partial file
+        os.replace(tmp_fn, fn)
+    except OSError:
         try:
-            dll = CDLL(str(lib_file))
-        except Exception as exc:
-            print(f'Could not load {lib_file}. Exception: {exc!r}')
-            dll = None
+            tmp_fn.unlink()
+        except OSError:
+            pass
+
+
+def _open_library(lib_file: Path) -> CDLL|None:
+    try:
+        dll = CDLL(str(lib_file))
+    except Exception as exc:
+        print(f'Could not load {lib_file}. Exception: {exc!r}')
+        dll = None
+    return dll
+
+
+def _load_librtlsdr() -> CDLL|None:
+    use_cache = _cache_enabled()
+    key = None
+    if use_cache:
+        key = _get_cache_key()
+        lib_file = _read_cache(key)
+        if lib_file is not None:
+            dll = _open_library(lib_file)
+            if dll is not None:
+                return dll
+    for lib_file in _iter_load_candidates():
+        dll = _open_library(lib_file)
         if dll is not None:
+            if use_cache:
+                assert key is not None
+                _write_cache(key, lib_file)
             return dll
+
+
+def load_librtlsdr() -> CDLL|None:
+    """Load the librtlsdr shared library
+
+    The library is resolved and opened once per process and the same
+    :class:`~ctypes.CDLL` instance is returned for subsequent calls.
+    The resolved filename is also stored on disk (see :func:`get_cache_dir`)
+    so new processes can skip discovery.
+
+    Set the ``PYRTLSDRLIB_NO_CACHE`` environment variable to ``1`` to
+    disable the on-disk cache.
+
+    Set the ``PYRTLSDRLIB_UDPSRV`` environment variable to ``1`` to load a
+    build with the UDP control server instead of the standard library
+    (see :func:`get_udpsrv_library_files`). No library is loaded if none
+    is installed.
+
+    The installed pyrtlsdr version is checked on the first call
+    (see :func:`pyrtlsdrlib.check_pyrtlsdr_version`).
+    """
+    global _librtlsdr
+    dll = _librtlsdr
+    if dll is not None:
+        return dll
+    with _lock:
+        if _librtlsdr is None:
+            _check_pyrtlsdr_version_once()
+            _librtlsdr = _load_librtlsdr()
+        return _librtlsdr
+
+
+def invalidate_cache():
+    """Clear the in-process library handle, manifests and the on-disk
+    resolution cache
+    """
+    global _librtlsdr
+    with _lock:
+        _librtlsdr = None
+        _manifests.clear()
+        try:
+            get_cache_filename().unlink()
+        except OSError:
+            pass
+
+
+def reload() -> CDLL|None:
+    """Invalidate all cached state and load the library again
+    """
+    with _lock:
+        invalidate_cache()
+        return load_librtlsdr()
@@ -1,17 +1,74 @@
+from __future__ import annotations
+import typing as tp
 import sys
+import os
+import struct
 import platform
+import threading
+from pathlib import Path
 
 from . import BuildType
 
-def get_os_type() -> BuildType:
+__all__ = (
+    'CPU_VARIANTS', 'get_os_type', 'set_os_type', 'get_machine', 'get_libc',
+    'get_cpu_features', 'get_cpu_variants', 'get_binary_archs', 'requires_glibc',
+    'is_library_compatible',
+)
+
+_lock = threading.Lock()
+_os_type: BuildType|None = None
+_os_type_override: BuildType|None = None
+_machine: str|None = None
+_libc: tuple[str, str]|None|bool = False
+_cpu_features: tp.FrozenSet[str]|None|bool = False
+_cpu_variants: tuple[str, ...]|None = None
+
+# Normalized names for the values returned by `platform.machine()`
+MACHINE_ALIASES = {
+    'x86_64': 'x86_64',
+    'amd64': 'x86_64',
+    'x64': 'x86_64',
+    'aarch64': 'aarch64',
+    'arm64': 'aarch64',
+    'armv8l': 'aarch64',
+    'i386': 'x86',
+    'i686': 'x86',
+    'x86': 'x86',
+}
+
+ELF_MACHINES = {3: 'x86', 40: 'arm', 62: 'x86_64', 183: 'aarch64'}
+MACHO_CPU_TYPES = {7: 'x86', 0x01000007: 'x86_64', 12: 'arm', 0x0100000c: 'aarch64'}
+PE_MACHINES = {0x14c: 'x86', 0x8664: 'x86_64', 0xaa64: 'aarch64'}
+
+_X86_64_V2 = frozenset({'cx16', 'lahf_lm', 'popcnt', 'pni', 'sse4_1', 'sse4_2', 'ssse3'})
+_X86_64_V3 = _X86_64_V2 | {'avx', 'avx2', 'bmi1', 'bmi2', 'f16c', 'fma', 'abm', 'movbe', 'xsave'}
+_X86_64_V4 = _X86_64_V3 | {'avx512f', 'avx512bw', 'avx512cd', 'avx512dq', 'avx512vl'}
+
+CPU_VARIANTS: dict[str, tuple[str, tp.FrozenSet[str]]] = {
+    'x86_64_v4': ('x86_64', _X86_64_V4),
+    'x86_64_v3': ('x86_64', _X86_64_V3),
+    'x86_64_v2': ('x86_64', _X86_64_V2),
+    'armv8_2a': ('aarch64', frozenset({'atomics', 'asimdrdm', 'dcpop'})),
+}
+"""CPU-optimized library variants, most preferred first
+
+Each maps to the machine it applies to and the CPU flags (as listed in
+``/proc/cpuinfo``) it requires. The names match :class:`~.common.BuildType`
+members.
+"""
+
+
+def _normalize_machine(machine: str) -> str:
+    return MACHINE_ALIASES.get(machine.lower(), machine.lower())
+
+
+def _detect_os_type() -> BuildType:
     uname = platform.uname()
     if uname.system == 'Linux':
-        if 'ubuntu' in uname.version.lower():
-            t = BuildType.ubuntu
-        else:
-            t = BuildType.linux
-        arch_type = BuildType.from_str(uname.machine)
-        t |= arch_type
+        t = BuildType.linux
+        machine = _normalize_machine(uname.machine)
+        if machine in ('x86_64', 'aarch64'):
+            t |= BuildType.from_str(machine)
         return t
     elif uname.system == 'Darwin':
         return BuildType.macos
@@ -24,3 +81,250 @@ def get_os_type() -> BuildType:
             t |= BuildType.w32
         return t
     return BuildType.unknown
+
+
+def get_os_type() -> BuildType:
+    """Get the :class:`~.common.BuildType` for the current platform
+
+    Detection happens once per process. The result may be pinned (skipping
+    detection entirely) by setting the ``PYRTLSDRLIB_OS_TYPE`` environment
+    variable to a :meth:`BuildType.from_str <.common.BuildType.from_str>`
+    string such as ``"linux|aarch64"`` or by calling :func:`set_os_type`.
+    """
+    t = _os_type_override
+    if t is not None:
+        return t
+    t = _os_type
+    if t is not None:
+        return t
+    return _get_os_type()
+
+
+def _get_os_type() -> BuildType:
+    global _os_type
+    with _lock:
+        if _os_type is None:
+            env_val = os.environ.get('PYRTLSDRLIB_OS_TYPE')
+            if env_val:
+                _os_type = BuildType.from_str(env_val)
+            else:
+                _os_type = _detect_os_type()
+        return _os_type
+
+
+def set_os_type(os_type: BuildType|str|None):
+    """Override the value returned by :func:`get_os_type`
+
+    If *os_type* is ``None``, the override is removed and all cached
+    platform information is cleared.
+    """
+    global _os_type_override, _os_type, _machine, _libc, _cpu_features, _cpu_variants
+    if isinstance(os_type, str):
+        os_type = BuildType.from_str(os_type)
+    with _lock:
+        _os_type_override = os_type
+        _machine = None
+        _cpu_variants = None
+        if os_type is None:
+            _os_type = None
+            _libc = False
+            _cpu_features = False
+
+
+def get_machine() -> str:
+    """Get the normalized CPU architecture of the running interpreter
+
+    One of ``"x86_64"``, ``"aarch64"``, ``"x86"`` or the lower-cased
+    value of :func:`platform.machine` if it is not recognized.
+    """
+    global _machine
+    m = _machine
+    if m is not None:
+        return m
+    os_type = get_os_type()
+    if os_type & 'x86_64':
+        m = 'x86_64'
+    elif os_type & 'aarch64':
+        m = 'aarch64'
+    else:
+        m = _normalize_machine(platform.machine())
+        if os_type & 'windows':
+            # The process bitness matters here, not the host's
+            if os_type & 'w32':
+                m = 'x86'
+            elif m == 'x86':
+                m = 'x86_64'
+    _machine = m
+    return m
+
+
+def _detect_libc() -> tuple[str, str]|None:
+    if sys.platform != 'linux':
+        return None
+    try:
+        s = os.confstr('CS_GNU_LIBC_VERSION')
+    except (ValueError, OSError):
+        s = None
+    if s:
+        name, _, version = s.partition(' ')
+        return name, version
+    for lib_dir in ['/lib', '/usr/lib']:
+        p = Path(lib_dir)
+        if p.exists() and any(p.glob('ld-musl-*.so.1')):
+            return 'musl', ''
+    return None
+
+
+def get_libc() -> tuple[str, str]|None:
+    """Get the C library flavor and version as a tuple of ``(name, version)``
+
+    *name* is either ``"glibc"`` or ``"musl"`` (the musl version is not
+    detected and will be empty). ``None`` is returned on non-Linux platforms
+    or if detection fails.
+
+    The ``PYRTLSDRLIB_LIBC`` environment variable may be set to override
+    detection (for example ``"musl"`` or ``"glibc 2.28"``).
+    """
+    global _libc
+    r = _libc
+    if r is not False:
+        return r
+    env_val = os.environ.get('PYRTLSDRLIB_LIBC')
+    if env_val:
+        name, _, version = env_val.partition(' ')
+        r = (name, version)
+    else:
+        r = _detect_libc()
+    _libc = r
+    return r
+
+
+def _detect_cpu_features() -> tp.FrozenSet[str]|None:
+    try:
+        text = Path('/proc/cpuinfo').read_text()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        # "flags" on x86, "Features" on arm
+        key, _, value = line.partition(':')
+        if key.strip() in ('flags', 'Features'):
+            return frozenset(value.split())
+    return None
+
+
+def get_cpu_features() -> tp.FrozenSet[str]|None:
+    """Get the CPU feature flags from ``/proc/cpuinfo``
+
+    ``None`` is returned if they are not available (including on non-Linux
+    platforms). The ``PYRTLSDRLIB_CPU_FEATURES`` environment variable may be
+    set to a space-separated list of flags to override detection.
+    """
+    global _cpu_features
+    r = _cpu_features
+    if r is not False:
+        return r
+    env_val = os.environ.get('PYRTLSDRLIB_CPU_FEATURES')
+    if env_val is not None:
+        r = frozenset(env_val.split())
+    else:
+        r = _detect_cpu_features()
+    _cpu_features = r
+    return r
+
+
+def get_cpu_variants() -> tuple[str, ...]:
+    """Get the names of the :data:`CPU_VARIANTS` this CPU supports,
+    most preferred first
+
+    Set the ``PYRTLSDRLIB_CPU_VARIANT`` environment variable to ``generic``
+    to disable optimized variants or to a variant name to limit the
+    result to that variant.
+    """
+    global _cpu_variants
+    r = _cpu_variants
+    if r is not None:
+        return r
+    features = get_cpu_features()
+    machine = get_machine()
+    if features is None:
+        r = ()
+    else:
+        r = tuple(
+            name for name, (variant_machine, required) in CPU_VARIANTS.items()
+            if variant_machine == machine and required <= features
+        )
+    env_val = os.environ.get('PYRTLSDRLIB_CPU_VARIANT')
+    if env_val:
+        r = tuple(name for name in r if name == env_val)
+    _cpu_variants = r
+    return r
+
+
+def get_binary_archs(filename: Path) -> tp.Set[str]|None:
+    """Read the header of a shared library and return the architectures
+    it was built for
+
+    ELF, Mach-O (including universal binaries) and PE formats are recognized.
+    ``None`` is returned if the format is not.
+    """
+    with open(filename, 'rb') as fd:
+        head = fd.read(4096)
+    if head[:4] == b'\x7fELF':
+        endian = '<' if head[5] == 1 else '>'
+        e_machine = struct.unpack_from(f'{endian}H', head, 18)[0]
+        return {ELF_MACHINES.get(e_machine, f'elf-{e_machine}')}
+    elif head[:4] in (b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe'):
+        cputype = struct.unpack_from('<i', head, 4)[0]
+        return {MACHO_CPU_TYPES.get(cputype, f'macho-{cputype}')}
+    elif head[:4] == b'\xca\xfe\xba\xbe':
+        nfat_arch = struct.unpack_from('>I', head, 4)[0]
+        archs = set()
+        for i in range(nfat_arch):
+            cputype = struct.unpack_from('>i', head, 8 + i * 20)[0]
+            archs.add(MACHO_CPU_TYPES.get(cputype, f'macho-{cputype}'))
+        return archs
+    elif head[:2] == b'MZ':
+        pe_offset = struct.unpack_from('<I', head, 0x3c)[0]
+        if pe_offset + 6 > len(head) or head[pe_offset:pe_offset+4] != b'PE\0\0':
+            return None
+        machine = struct.unpack_from('<H', head, pe_offset + 4)[0]
+        return {PE_MACHINES.get(machine, f'pe-{machine}')}
+    return None
+
+
+def requires_glibc(filename: Path) -> bool:
+    """Check whether the shared library at *filename* links against glibc
+
+    This looks for glibc symbol version requirements (e.g. ``GLIBC_2.17``)
+    in the dynamic string table, which is near the start of the file.
+    """
+    with open(filename, 'rb') as fd:
+        head = fd.read(1 << 18)
+    return b'GLIBC_2.' in head
+
+
+def is_library_compatible(filename: Path) -> bool:
+    """Check whether the shared library at *filename* could be loaded
+    on this platform
+
+    The architecture recorded in the binary is compared to :func:`get_machine`
+    and on musl-based systems, libraries linked against glibc are rejected.
+    Unrecognized formats are assumed to be compatible, but files which can't
+    be read or have a truncated or malformed header are not.
+    """
+    try:
+        archs = get_binary_archs(filename)
+    except (OSError, struct.error, ValueError, IndexError):
+        return False
+    if archs is None:
+        return True
+    if get_machine() not in archs:
+        return False
+    libc = get_libc()
+    if libc is not None and libc[0] == 'musl':
+        try:
+            if requires_glibc(filename):
+                return False
+        except OSError:
+            return False
+    return True
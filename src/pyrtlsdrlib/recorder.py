@@ -0,0 +1,198 @@
+"""Recording raw IQ samples to disk
+
+:class:`IQRecorder` copies each block into a memory-mapped window of a
+preallocated file, so the driver callback only performs a memory copy.
+Filled windows are handed to a background thread which flushes them,
+unmaps them and advises the kernel to drop them from the page cache.
+
+Metadata is written to a `SigMF <https://sigmf.org>`_ sidecar file next
+to the recording.
+"""
+from __future__ import annotations
+import typing as tp
+import os
+import json
+import mmap
+import queue
+import threading
+import datetime
+from pathlib import Path
+
+if tp.TYPE_CHECKING:
+    from .stream import SampleBlock
+
+__all__ = ('IQRecorder',)
+
+SIGMF_VERSION = '1.0.0'
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return -(-value // multiple) * multiple
+
+
+def _allocate(fd: int, offset: int, length: int):
+    # Reserve the blocks up front (where supported) so the filesystem
+    # doesn't have to allocate them as pages are written back
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, offset, length)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, offset + length)
+
+
+class IQRecorder:
+    """Records blocks of samples to a file
+
+    Arguments:
+        filename: The output filename. Conventionally this ends in
+            ``.sigmf-data``
+        sample_rate: The sample rate in Hz
+        center_freq: The center frequency in Hz
+        window_size: Size of each memory-mapped window in bytes. Rounded up to
+            a multiple of :data:`mmap.ALLOCATIONGRANULARITY`
+        prealloc_size: Amount to grow the file by when more space is needed.
+            Defaults to four windows
+        metadata: Extra fields for the ``global`` section of the sidecar
+
+    Instances may be added as a consumer of :class:`~.stream.AsyncReader`.
+    :meth:`write` must only be called from one thread at a time.
+
+    Attributes:
+        num_bytes: Number of bytes written
+        start_time: The (UTC) time the recording started
+
+    """
+    def __init__(
+        self,
+        filename: Path|str,
+        sample_rate: float,
+        center_freq: float,
+        window_size: int = 1 << 26,
+        prealloc_size: int|None = None,
+        metadata: tp.Dict[str, tp.Any]|None = None,
+    ):
+        self.filename = Path(filename)
+        self.meta_filename = self.filename.with_suffix('.sigmf-meta')
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.window_size = _round_up(window_size, mmap.ALLOCATIONGRANULARITY)
+        if prealloc_size is None:
+            prealloc_size = self.window_size * 4
+        self.prealloc_size = _round_up(prealloc_size, self.window_size)
+        self.metadata = metadata or {}
+        self.num_bytes = 0
+        self.start_time = datetime.datetime.now(datetime.timezone.utc)
+        self.closed = False
+
+        self._file_size = 0
+        self._window: mmap.mmap|None = None
+        self._window_offset = -self.window_size
+        self._window_pos = 0
+        flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        self._fd = os.open(self.filename, flags, 0o644)
+        self._flush_queue: queue.Queue = queue.Queue()
+        self._flusher = threading.Thread(target=self._flush_worker, daemon=True)
+        self._flusher.start()
+        self.write_metadata()
+
+    @property
+    def num_samples(self) -> int:
+        return self.num_bytes // 2
+
+    def _ensure_size(self, size: int):
+        if size <= self._file_size:
+            return
+        new_size = max(size, self._file_size + self.prealloc_size)
+        _allocate(self._fd, self._file_size, new_size - self._file_size)
+        self._file_size = new_size
+
+    def _next_window(self):
+        if self._window is not None:
+            self._flush_queue.put((self._window, self._window_offset))
+        offset = self._window_offset + self.window_size
+        # Keep one window allocated ahead of the one being written
+        self._ensure_size(offset + self.window_size * 2)
+        self._window = mmap.mmap(self._fd, self.window_size, offset=offset)
+        self._window_offset = offset
+        self._window_pos = 0
+
+    def write(self, data):
+        """Write a bytes-like object to the file
+        """
+        if self.closed:
+            raise ValueError('Recorder is closed')
+        data = memoryview(data).cast('B')
+        nbytes = data.nbytes
+        window_size = self.window_size
+        pos = 0
+        while pos < nbytes:
+            if self._window is None or self._window_pos == window_size:
+                self._next_window()
+            window_pos = self._window_pos
+            count = min(nbytes - pos, window_size - window_pos)
+            self._window[window_pos:window_pos+count] = data[pos:pos+count]
+            self._window_pos = window_pos + count
+            pos += count
+        self.num_bytes += nbytes
+
+    def __call__(self, block: SampleBlock):
+        self.write(block.view)
+
+    def _flush_worker(self):
+        while True:
+            item = self._flush_queue.get()
+            if item is None:
+                break
+            m, offset = item
+            m.flush()
+            m.close()
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(self._fd, offset, self.window_size, os.POSIX_FADV_DONTNEED)
+
+    def close(self):
+        """Flush all data, trim the file to the number of bytes written and
+        update the metadata
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self._window is not None:
+            self._flush_queue.put((self._window, self._window_offset))
+            self._window = None
+        self._flush_queue.put(None)
+        self._flusher.join()
+        os.ftruncate(self._fd, self.num_bytes)
+        os.close(self._fd)
+        self.write_metadata()
+
+    def get_metadata(self) -> tp.Dict[str, tp.Any]:
+        """Get the SigMF metadata for the recording
+        """
+        dt = self.start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        global_meta = {
+            'core:datatype': 'cu8',
+            'core:sample_rate': self.sample_rate,
+            'core:version': SIGMF_VERSION,
+            'core:recorder': 'pyrtlsdrlib',
+        }
+        global_meta.update(self.metadata)
+        return {
+            'global': global_meta,
+            'captures': [{
+                'core:sample_start': 0,
+                'core:frequency': self.center_freq,
+                'core:datetime': dt,
+            }],
+            'annotations': [],
+        }
+
+    def write_metadata(self):
+        self.meta_filename.write_text(json.dumps(self.get_metadata(), indent=2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,297 @@
+"""Shared-memory ring buffer for passing sample blocks between processes
+
+A single producer (usually fed directly by :class:`~.stream.AsyncReader`)
+writes blocks into fixed-size slots of a :class:`multiprocessing.shared_memory.SharedMemory`
+segment. Any number of readers in other processes attach to the segment by
+name and receive read-only views of each slot without serialization.
+
+No locks are used. Each slot carries the sequence number of the block it
+holds which the producer clears before overwriting, so readers can detect
+when they have fallen behind (an overrun) or when a slot was overwritten
+while they were still using it (see :meth:`RingBlock.is_valid`).
+"""
+from __future__ import annotations
+import typing as tp
+import os
+import sys
+import time
+import struct
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover
+    np = None
+
+if tp.TYPE_CHECKING:
+    from .stream import SampleBlock
+
+__all__ = ('SampleRing', 'RingReader', 'RingBlock')
+
+MAGIC = b'RTLR'
+VERSION = 1
+
+# magic, version, num_slots, slot_size, write_seq
+_HEADER = struct.Struct('<4sIIIQ')
+HEADER_SIZE = 64
+_WRITE_SEQ_OFFSET = 16
+
+# seq + 1 (0 while empty or being written), nbytes
+_SLOT_HEADER = struct.Struct('<QI')
+SLOT_HEADER_SIZE = 16
+
+_u64 = struct.Struct('<Q')
+
+# Before Python 3.13 the resource tracker registers every attached segment
+_TRACKS_ATTACHED = sys.version_info < (3, 13) and os.name == 'posix'
+
+
+def _get_stride(slot_size: int) -> int:
+    stride = SLOT_HEADER_SIZE + slot_size
+    # Keep each slot's data cache-line aligned
+    return (stride + 63) & ~63
+
+
+class SampleRing:
+    """Producer side of the ring
+
+    Arguments:
+        num_slots: Number of blocks the ring can hold
+        slot_size: Maximum size of each block in bytes. The librtlsdr
+            default buffer length is 262144
+        name: Name of the shared memory segment. If not given, a unique name
+            is generated
+
+    Instances may be added as a consumer of :class:`~.stream.AsyncReader`.
+    """
+    def __init__(self, num_slots: int, slot_size: int = 262144, name: str|None = None):
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.stride = _get_stride(slot_size)
+        size = HEADER_SIZE + self.stride * num_slots
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buf = self.shm.buf
+        self.write_seq = 0
+        _HEADER.pack_into(self.buf, 0, MAGIC, VERSION, num_slots, slot_size, 0)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, data) -> int:
+        """Copy *data* (any bytes-like object) into the next slot
+
+        Returns the sequence number of the block
+        """
+        seq = self.write_seq
+        data = memoryview(data).cast('B')
+        nbytes = data.nbytes
+        if nbytes > self.slot_size:
+            raise ValueError(f'Block size {nbytes} exceeds slot size {self.slot_size}')
+        buf = self.buf
+        offset = HEADER_SIZE + (seq % self.num_slots) * self.stride
+        data_offset = offset + SLOT_HEADER_SIZE
+
+        # Invalidate the slot before overwriting so readers holding views
+        # of the previous block can tell
+        _SLOT_HEADER.pack_into(buf, offset, 0, nbytes)
+        buf[data_offset:data_offset+nbytes] = data
+        _SLOT_HEADER.pack_into(buf, offset, seq + 1, nbytes)
+
+        self.write_seq = seq + 1
+        _u64.pack_into(buf, _WRITE_SEQ_OFFSET, seq + 1)
+        return seq
+
+    def __call__(self, block: SampleBlock):
+        self.write(block.view)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        if _TRACKS_ATTACHED:
+            # A reader sharing our resource tracker (in this process or a
+            # child) removes the registration when it attaches (see `_attach`).
+            # Registering again is otherwise a no-op and keeps the unregister
+            # done by `unlink` balanced.
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        self.unlink()
+
+
+class RingBlock:
+    """A view of one block in the ring
+
+    Attributes:
+        seq: Sequence number of the block
+        view: Read-only :class:`memoryview` of the block data in shared memory
+
+    The data may be overwritten by the producer at any time once the reader
+    falls behind by more than ``num_slots`` blocks. Call :meth:`is_valid`
+    after processing (or use :meth:`copy`) to detect this.
+    """
+    __slots__ = ('reader', 'seq', 'view')
+
+    def __init__(self, reader: RingReader, seq: int, view: memoryview):
+        self.reader = reader
+        self.seq = seq
+        self.view = view
+
+    @property
+    def nbytes(self) -> int:
+        return self.view.nbytes
+
+    def as_array(self) -> 'np.ndarray':
+        """Get a read-only :mod:`numpy` ``uint8`` array of the block data
+        (without copying)
+        """
+        if np is None:
+            raise ImportError('numpy is required for RingBlock.as_array()')
+        return np.frombuffer(self.view, dtype=np.uint8)
+
+    def is_valid(self) -> bool:
+        """Check whether the slot still holds this block
+        """
+        return self.reader._slot_seq(self.seq) == self.seq + 1
+
+    def copy(self) -> bytes|None:
+        """Copy the block data, returning ``None`` if it was overwritten
+        before the copy completed
+        """
+        data = bytes(self.view)
+        if not self.is_valid():
+            return None
+        return data
+
+    def release(self):
+        self.view.release()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}: seq={self.seq}>'
+
+
+class RingReader:
+    """Reader side of the ring
+
+    Arguments:
+        name: Name of the shared memory segment (:attr:`SampleRing.name`)
+        start: Where to start reading. ``'latest'`` begins with the next block
+            written, ``'oldest'`` with the oldest block still in the ring
+
+    Attributes:
+        dropped: Total number of blocks skipped due to overruns
+
+    """
+    def __init__(self, name: str, start: str = 'latest'):
+        self.shm = _attach(name)
+        self.buf = self.shm.buf.toreadonly()
+        magic, version, num_slots, slot_size, write_seq = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Shared memory "{name}" is not a SampleRing (or is incompatible)')
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.stride = _get_stride(slot_size)
+        self.dropped = 0
+        if start == 'latest':
+            self.next_seq = write_seq
+        elif start == 'oldest':
+            self.next_seq = max(0, write_seq - num_slots)
+        else:
+            raise ValueError(f'Invalid value for start: "{start}"')
+
+    @property
+    def write_seq(self) -> int:
+        return _u64.unpack_from(self.buf, _WRITE_SEQ_OFFSET)[0]
+
+    @property
+    def available(self) -> int:
+        """Number of blocks written but not yet read"""
+        return self.write_seq - self.next_seq
+
+    def _slot_seq(self, seq: int) -> int:
+        offset = HEADER_SIZE + (seq % self.num_slots) * self.stride
+        return _u64.unpack_from(self.buf, offset)[0]
+
+    def read_nowait(self) -> RingBlock|None:
+        """Get the next block or ``None`` if none are available
+
+        If the producer has overwritten unread blocks, they are skipped and
+        added to :attr:`dropped`.
+        """
+        buf = self.buf
+        while True:
+            write_seq = _u64.unpack_from(buf, _WRITE_SEQ_OFFSET)[0]
+            seq = self.next_seq
+            if seq >= write_seq:
+                return None
+            oldest = write_seq - self.num_slots
+            if seq < oldest:
+                self.dropped += oldest - seq
+                seq = self.next_seq = oldest
+            offset = HEADER_SIZE + (seq % self.num_slots) * self.stride
+            slot_seq, nbytes = _SLOT_HEADER.unpack_from(buf, offset)
+            if slot_seq != seq + 1:
+                # Overwritten between reading write_seq and the slot header
+                continue
+            self.next_seq = seq + 1
+            data_offset = offset + SLOT_HEADER_SIZE
+            return RingBlock(self, seq, buf[data_offset:data_offset+nbytes])
+
+    def read(self, timeout: float|None = None, poll_interval: float = .001) -> RingBlock|None:
+        """Wait for the next block
+
+        Returns ``None`` if *timeout* seconds pass without one
+        """
+        block = self.read_nowait()
+        if block is not None:
+            return block
+        start_ts = time.monotonic()
+        while block is None:
+            if timeout is not None and time.monotonic() - start_ts >= timeout:
+                return None
+            time.sleep(poll_interval)
+            block = self.read_nowait()
+        return block
+
+    def __iter__(self) -> tp.Iterator[RingBlock]:
+        while True:
+            block = self.read()
+            assert block is not None
+            yield block
+
+    def close(self):
+        """Detach from the shared memory
+
+        All :class:`RingBlock` views must be released first
+        """
+        self.buf.release()
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Readers must not unlink the segment when they exit, which the
+    # resource tracker does for attached segments before Python 3.13.
+    # Only this segment is unregistered. If the tracker is shared with the
+    # producer this also drops its registration until `SampleRing.unlink`.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if _TRACKS_ATTACHED:
+        from multiprocessing import resource_tracker
+        # `_name` is the name registered by SharedMemory (with its "/" prefix)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
@@ -0,0 +1,215 @@
+"""Zero-copy sample delivery using ``rtlsdr_read_async``
+
+A single ctypes callback is registered with the driver and each buffer it
+delivers is wrapped in a :class:`SampleBlock` (a read-only view of the
+driver-owned memory) which is passed to every consumer in turn.
+
+The memory belongs to librtlsdr and is reused once the callback returns, so
+consumers that need the data afterwards must call :meth:`SampleBlock.retain`.
+Only :attr:`SampleBlock.view` is invalidated when a block is released, so
+anything else created from it (such as a :func:`numpy.frombuffer` array) must
+not outlive the callback. Use :meth:`SampleBlock.as_array` on a retained block
+for arrays that are kept.
+"""
+from __future__ import annotations
+import typing as tp
+import threading
+import ctypes
+from ctypes import CDLL, PYFUNCTYPE, c_int, c_void_p, c_ssize_t, py_object
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover
+    np = None
+
+from .lib import load_librtlsdr
+from .bindings import read_async_cb_t, bind_function
+
+__all__ = ('read_async_cb_t', 'SampleBlock', 'AsyncReader')
+
+_PyBUF_READ = 0x100
+_memoryview_from_memory = PYFUNCTYPE(py_object, c_void_p, c_ssize_t, c_int)(
+    ('PyMemoryView_FromMemory', ctypes.pythonapi),
+)
+
+Consumer = tp.Callable[['SampleBlock'], None]
+
+
+class SampleBlock:
+    """A block of interleaved unsigned 8-bit IQ samples
+
+    Attributes:
+        index: Sequence number of the block since the reader started
+
+    """
+    __slots__ = ('index', '_view', '_data')
+
+    index: int
+    _view: memoryview|None
+    _data: bytes|None
+
+    def __init__(self, index: int, view: memoryview, data: bytes|None = None):
+        self.index = index
+        self._view = view
+        self._data = data
+
+    @property
+    def view(self) -> memoryview:
+        """A read-only :class:`memoryview` of the sample data
+
+        Raises :class:`ValueError` if accessed after the block is released
+        """
+        v = self._view
+        if v is None:
+            raise ValueError('SampleBlock has been released')
+        return v
+
+    @property
+    def nbytes(self) -> int:
+        return self.view.nbytes
+
+    @property
+    def is_retained(self) -> bool:
+        """True if the block owns its data (see :meth:`retain`)"""
+        return self._data is not None
+
+    def as_array(self) -> 'np.ndarray':
+        """Get a read-only :mod:`numpy` ``uint8`` array of the sample data
+
+        Only available for blocks returned by :meth:`retain`. The array views
+        the retained copy (without copying again) and stays valid after the
+        block is released.
+
+        Within the callback, pass :attr:`view` directly to functions that
+        accept buffers (such as :func:`pyrtlsdrlib.convert.convert`) instead.
+
+        Raises:
+            ValueError: If the block views driver-owned memory or has been
+                released
+        """
+        if np is None:
+            raise ImportError('numpy is required for SampleBlock.as_array()')
+        if self._view is None:
+            raise ValueError('SampleBlock has been released')
+        data = self._data
+        if data is None:
+            raise ValueError(
+                'SampleBlock.as_array() requires a retained block (see SampleBlock.retain())'
+            )
+        return np.frombuffer(data, dtype=np.uint8)
+
+    def retain(self) -> SampleBlock:
+        """Copy the data into a new :class:`SampleBlock` which remains valid
+        after the callback returns
+        """
+        data = bytes(self.view)
+        return SampleBlock(self.index, memoryview(data), data)
+
+    def release(self):
+        v = self._view
+        self._view = None
+        if v is not None:
+            v.release()
+
+    def __repr__(self):
+        nbytes = None if self._view is None else self._view.nbytes
+        return f'<{self.__class__.__name__}: index={self.index}, nbytes={nbytes}>'
+
+
+class AsyncReader:
+    """Reads samples from an open device with ``rtlsdr_read_async``
+
+    Arguments:
+        dev: The ``rtlsdr_dev_t*`` handle of an open device
+        dll: The librtlsdr library. If not given, :func:`~.lib.load_librtlsdr`
+            is used
+        buf_num: Number of buffers for the driver to allocate (``0`` uses
+            the driver default)
+        buf_len: Length of each buffer in bytes (``0`` uses the driver default)
+
+    """
+    def __init__(
+        self,
+        dev: c_void_p|int,
+        dll: CDLL|None = None,
+        buf_num: int = 0,
+        buf_len: int = 0,
+    ):
+        if dll is None:
+            dll = load_librtlsdr()
+            if dll is None:
+                raise RuntimeError('Could not load librtlsdr')
+        self.dev = dev
+        self.buf_num = buf_num
+        self.buf_len = buf_len
+        self.consumers: tp.List[Consumer] = []
+        self.blocks_read = 0
+        self._read_async = bind_function(dll, 'rtlsdr_read_async')
+        self._cancel_async = bind_function(dll, 'rtlsdr_cancel_async')
+        # Created once and kept referenced for the lifetime of the reader
+        self._callback = read_async_cb_t(self._on_samples)
+        self._exc: BaseException|None = None
+        self._thread: threading.Thread|None = None
+
+    def add_consumer(self, consumer: Consumer):
+        """Add a callable to receive each :class:`SampleBlock`
+
+        Consumers are called from the driver thread and should return
+        quickly.
+        """
+        self.consumers.append(consumer)
+
+    def remove_consumer(self, consumer: Consumer):
+        self.consumers.remove(consumer)
+
+    def run(self):
+        """Read samples until :meth:`cancel` is called (blocking)
+
+        Any exception raised by a consumer cancels reading and is re-raised
+        here.
+        """
+        self._exc = None
+        r = self._read_async(self.dev, self._callback, None, self.buf_num, self.buf_len)
+        exc, self._exc = self._exc, None
+        if exc is not None:
+            raise exc
+        if r < 0:
+            raise OSError(f'rtlsdr_read_async returned {r}')
+
+    def cancel(self):
+        """Request the driver to stop reading
+        """
+        self._cancel_async(self.dev)
+
+    def start(self) -> threading.Thread:
+        """Call :meth:`run` in a new thread and return it
+        """
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError('Already running')
+        t = self._thread = threading.Thread(target=self.run, daemon=True)
+        t.start()
+        return t
+
+    def stop(self, timeout: float|None = None):
+        """Cancel reading and wait for the thread from :meth:`start` to exit
+        """
+        t = self._thread
+        if t is None:
+            return
+        self.cancel()
+        t.join(timeout)
+        self._thread = None
+
+    def _on_samples(self, addr: int, length: int, ctx):
+        block = SampleBlock(
+            self.blocks_read, _memoryview_from_memory(addr, length, _PyBUF_READ),
+        )
+        self.blocks_read += 1
+        try:
+            for consumer in self.consumers:
+                consumer(block)
+        except BaseException as exc:
+            self._exc = exc
+            self._cancel_async(self.dev)
+        finally:
+            block.release()
@@ -0,0 +1,276 @@
+"""asyncio client for ``rtl_tcp``
+
+``rtl_tcp`` (included in the librtlsdr releases) serves a device over TCP.
+On connection the server sends a 12-byte header followed by a continuous
+stream of unsigned 8-bit IQ samples. Settings are changed by sending 5-byte
+command packets (a command byte followed by a big-endian ``uint32``).
+
+:class:`RtlTcpClient` reads the sample stream with ``recv_into`` directly into
+a small pool of preallocated buffers and yields :class:`~.stream.SampleBlock`
+objects, like :class:`~.aio.AsyncStream` does for local devices::
+
+    async with RtlTcpClient('192.168.1.10') as client:
+        await client.set_center_freq(100_000_000)
+        async for block in client:
+            process(block.view)
+
+Each block views one of the pool's buffers. When that buffer is reused
+(*num_buffers* blocks later) the block is released, so blocks needed for
+longer must be copied with :meth:`~.stream.SampleBlock.retain`.
+"""
+from __future__ import annotations
+import typing as tp
+import enum
+import socket
+import struct
+import asyncio
+from dataclasses import dataclass
+
+from .stream import SampleBlock
+
+__all__ = ('Command', 'DongleInfo', 'RtlTcpClient')
+
+HEADER_MAGIC = b'RTL0'
+HEADER_STRUCT = struct.Struct('>4sII')
+COMMAND_STRUCT = struct.Struct('>BI')
+
+
+class Command(enum.IntEnum):
+    """rtl_tcp command codes
+    """
+    SET_FREQUENCY = 0x01
+    SET_SAMPLE_RATE = 0x02
+    SET_GAIN_MODE = 0x03
+    SET_GAIN = 0x04
+    SET_FREQ_CORRECTION = 0x05
+    SET_IF_GAIN = 0x06
+    SET_TEST_MODE = 0x07
+    SET_AGC_MODE = 0x08
+    SET_DIRECT_SAMPLING = 0x09
+    SET_OFFSET_TUNING = 0x0a
+    SET_RTL_XTAL = 0x0b
+    SET_TUNER_XTAL = 0x0c
+    SET_GAIN_BY_INDEX = 0x0d
+    SET_BIAS_TEE = 0x0e
+
+
+@dataclass(frozen=True)
+class DongleInfo:
+    """The header sent by the server on connection
+    """
+    tuner_type: int
+    """The ``rtlsdr_tuner`` enum value of the device"""
+    gain_count: int
+    """Number of gain values supported by the tuner"""
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> DongleInfo:
+        magic, tuner_type, gain_count = HEADER_STRUCT.unpack(data)
+        if magic != HEADER_MAGIC:
+            raise ValueError(f'Invalid rtl_tcp header: {data!r}')
+        return cls(tuner_type=tuner_type, gain_count=gain_count)
+
+
+class RtlTcpClient:
+    """Streams samples from an ``rtl_tcp`` server
+
+    Arguments:
+        host: The server address
+        port: The server port
+        block_size: Size of each yielded block in bytes (must be even)
+        num_buffers: Number of preallocated buffers
+        rcvbuf_size: Requested socket receive buffer size (``SO_RCVBUF``)
+
+    Attributes:
+        dongle_info: The :class:`DongleInfo` received from the server, set by
+            :meth:`connect`
+        blocks_read: Number of blocks yielded
+
+    """
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 1234,
+        block_size: int = 262144,
+        num_buffers: int = 4,
+        rcvbuf_size: int = 1 << 20,
+    ):
+        if block_size <= 0 or block_size % 2:
+            raise ValueError('block_size must be a positive even number')
+        if num_buffers < 1:
+            raise ValueError('num_buffers must be at least 1')
+        self.host = host
+        self.port = port
+        self.block_size = block_size
+        self.num_buffers = num_buffers
+        self.rcvbuf_size = rcvbuf_size
+        self.dongle_info: DongleInfo|None = None
+        self.blocks_read = 0
+        self._buffers = [memoryview(bytearray(block_size)) for _ in range(num_buffers)]
+        self._blocks: tp.List[SampleBlock|None] = [None] * num_buffers
+        self._sock: socket.socket|None = None
+        self._eof = False
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    async def connect(self) -> DongleInfo:
+        """Connect to the server and read the :class:`DongleInfo` header
+        """
+        if self._sock is not None:
+            raise RuntimeError('Already connected')
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        exc: OSError|None = None
+        for family, type_, proto, _, addr in infos:
+            sock = socket.socket(family, type_, proto)
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf_size)
+            try:
+                await loop.sock_connect(sock, addr)
+            except OSError as _exc:
+                sock.close()
+                exc = _exc
+                continue
+            break
+        else:
+            assert exc is not None
+            raise exc
+        self._sock = sock
+        self._eof = False
+        try:
+            header = bytearray(HEADER_STRUCT.size)
+            n = await self._recv_into(memoryview(header))
+            if n < len(header):
+                raise ConnectionError('Connection closed before header was received')
+            self.dongle_info = DongleInfo.from_bytes(bytes(header))
+        except BaseException:
+            await self.aclose()
+            raise
+        return self.dongle_info
+
+    async def aclose(self):
+        """Close the connection and release all outstanding blocks
+        """
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+        for i, block in enumerate(self._blocks):
+            if block is not None:
+                block.release()
+                self._blocks[i] = None
+
+    async def _recv_into(self, view: memoryview) -> int:
+        """Fill *view* from the socket, returning fewer bytes only at EOF
+        """
+        sock = self._sock
+        if sock is None:
+            raise RuntimeError('Not connected')
+        loop = asyncio.get_running_loop()
+        nbytes = view.nbytes
+        pos = 0
+        while pos < nbytes:
+            n = await loop.sock_recv_into(sock, view[pos:])
+            if n == 0:
+                self._eof = True
+                break
+            pos += n
+        return pos
+
+    async def send_command(self, command: Command|int, param: int):
+        """Send a command packet
+        """
+        sock = self._sock
+        if sock is None:
+            raise RuntimeError('Not connected')
+        loop = asyncio.get_running_loop()
+        await loop.sock_sendall(sock, COMMAND_STRUCT.pack(command, param & 0xffffffff))
+
+    async def set_center_freq(self, freq: int):
+        await self.send_command(Command.SET_FREQUENCY, int(freq))
+
+    async def set_sample_rate(self, rate: int):
+        await self.send_command(Command.SET_SAMPLE_RATE, int(rate))
+
+    async def set_gain_mode(self, manual: bool):
+        await self.send_command(Command.SET_GAIN_MODE, int(manual))
+
+    async def set_gain(self, gain: int):
+        """Set the tuner gain in tenths of a dB
+        """
+        await self.send_command(Command.SET_GAIN, gain)
+
+    async def set_freq_correction(self, ppm: int):
+        await self.send_command(Command.SET_FREQ_CORRECTION, ppm)
+
+    async def set_if_gain(self, stage: int, gain: int):
+        await self.send_command(Command.SET_IF_GAIN, (stage << 16) | (gain & 0xffff))
+
+    async def set_test_mode(self, on: bool):
+        await self.send_command(Command.SET_TEST_MODE, int(on))
+
+    async def set_agc_mode(self, on: bool):
+        await self.send_command(Command.SET_AGC_MODE, int(on))
+
+    async def set_direct_sampling(self, mode: int):
+        await self.send_command(Command.SET_DIRECT_SAMPLING, mode)
+
+    async def set_offset_tuning(self, on: bool):
+        await self.send_command(Command.SET_OFFSET_TUNING, int(on))
+
+    async def set_rtl_xtal(self, freq: int):
+        await self.send_command(Command.SET_RTL_XTAL, freq)
+
+    async def set_tuner_xtal(self, freq: int):
+        await self.send_command(Command.SET_TUNER_XTAL, freq)
+
+    async def set_gain_by_index(self, index: int):
+        await self.send_command(Command.SET_GAIN_BY_INDEX, index)
+
+    async def set_bias_tee(self, on: bool):
+        await self.send_command(Command.SET_BIAS_TEE, int(on))
+
+    async def read_block(self) -> SampleBlock|None:
+        """Read the next block of samples
+
+        The block is shorter than :attr:`block_size` only if the server
+        closed the connection. Returns ``None`` when no more data is
+        available.
+        """
+        if self._eof:
+            return None
+        slot = self.blocks_read % self.num_buffers
+        prev = self._blocks[slot]
+        if prev is not None:
+            prev.release()
+            self._blocks[slot] = None
+        buf = self._buffers[slot]
+        n = await self._recv_into(buf)
+        # Drop any trailing half of an IQ pair
+        n -= n % 2
+        if n == 0:
+            return None
+        block = SampleBlock(self.blocks_read, buf[:n].toreadonly())
+        self._blocks[slot] = block
+        self.blocks_read += 1
+        return block
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> SampleBlock:
+        if self._sock is None:
+            await self.connect()
+        block = await self.read_block()
+        if block is None:
+            raise StopAsyncIteration
+        return block
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -0,0 +1,166 @@
+"""Control client for the ``udpsrv`` variant of librtlsdr
+
+Builds of librtlsdr with the UDP server enabled (:attr:`.BuildType.udpsrv`,
+loaded when ``PYRTLSDRLIB_UDPSRV`` is set, see :func:`.lib.load_librtlsdr`)
+accept commands for an open device as datagrams. This lets a long running
+capture be retuned with a single datagram instead of reopening the device.
+
+Each datagram holds one command: a single letter followed by its integer
+arguments, separated by spaces:
+
+==============================  ==============================================
+``f <freq>``                    Set the center frequency in Hz
+``i <freq>``                    Set the IF frequency in Hz
+``s <reg> <value> [<mask>]``    Set the bits of a tuner register given by
+                                *mask* (all bits if omitted)
+``g <reg>``                     Get the value of a tuner register
+==============================  ==============================================
+
+Only ``g`` commands are answered (errors may be answered with a message
+starting with ``?``)::
+
+    with UdpControlClient('127.0.0.1') as ctrl:
+        ctrl.set_center_freq(101_100_000)
+        value = ctrl.get_register(0x05)
+"""
+from __future__ import annotations
+import re
+import socket
+
+__all__ = ('DEFAULT_PORT', 'COMMANDS', 'format_command', 'UdpControlClient')
+
+DEFAULT_PORT = 32323
+
+COMMANDS = ('f', 'i', 's', 'g')
+"""The command letters understood by the server"""
+
+_INT_RE = re.compile(r'0x[0-9a-fA-F]+|-?\d+')
+
+
+def format_command(command: str, *args: int|float) -> bytes:
+    """Format a command datagram
+
+    Floats are rounded to integers (the server only accepts integers).
+
+    Raises:
+        ValueError: If *command* is not one of :data:`COMMANDS`
+
+    """
+    if command not in COMMANDS:
+        raise ValueError(f'Invalid command: {command!r}')
+    parts = [command]
+    for arg in args:
+        if isinstance(arg, float):
+            arg = round(arg)
+        parts.append(str(int(arg)))
+    return ' '.join(parts).encode('ascii')
+
+
+class UdpControlClient:
+    """Sends commands to a udpsrv-enabled librtlsdr
+
+    Arguments:
+        host: Address of the host the device is open on
+        port: The UDP port of the server
+        timeout: Timeout in seconds for :meth:`request`
+
+    The socket is connected on creation, so each command costs a single
+    ``send()`` call.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, timeout: float = 1.):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        family, type_, proto, _, addr = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+        self._sock: socket.socket|None = socket.socket(family, type_, proto)
+        self._sock.settimeout(timeout)
+        self._sock.connect(addr)
+
+    @property
+    def sock(self) -> socket.socket:
+        sock = self._sock
+        if sock is None:
+            raise ValueError('Client is closed')
+        return sock
+
+    def send_command(self, command: str, *args: int|float):
+        """Send a command without waiting for a reply
+        """
+        self.sock.send(format_command(command, *args))
+
+    def _discard_pending(self, sock: socket.socket):
+        # Drop replies left over from earlier commands (such as error
+        # messages for unanswered set commands)
+        sock.setblocking(False)
+        try:
+            while True:
+                try:
+                    sock.recv(4096)
+                except (BlockingIOError, ConnectionRefusedError):
+                    break
+        finally:
+            sock.settimeout(self.timeout)
+
+    def request(self, command: str, *args: int|float, bufsize: int = 4096) -> str:
+        """Send a command and wait for the reply
+
+        Raises:
+            TimeoutError: If no reply is received within the timeout
+            ValueError: If the server rejected the command
+
+        """
+        sock = self.sock
+        self._discard_pending(sock)
+        sock.send(format_command(command, *args))
+        try:
+            reply = sock.recv(bufsize)
+        except socket.timeout as exc:
+            raise TimeoutError(f'No reply from {self.host}:{self.port}') from exc
+        text = reply.decode('ascii', errors='replace').strip()
+        if text.startswith('?'):
+            raise ValueError(f'Command {command!r} rejected: {text[1:].strip()}')
+        return text
+
+    def set_center_freq(self, freq: int|float):
+        self.send_command('f', freq)
+
+    def set_if_freq(self, freq: int|float):
+        self.send_command('i', freq)
+
+    def set_register(self, reg: int, value: int, mask: int|None = None):
+        """Set a tuner register
+
+        If *mask* is given, only the bits set in it are changed.
+        """
+        if mask is None:
+            self.send_command('s', reg, value)
+        else:
+            self.send_command('s', reg, value, mask)
+
+    def get_register(self, reg: int) -> int:
+        """Get the value of a tuner register
+
+        The first integer in the reply (decimal or ``0x`` prefixed hex)
+        is returned.
+
+        Raises:
+            TimeoutError: If no reply is received within the timeout
+            ValueError: If the reply contains no value
+
+        """
+        text = self.request('g', reg)
+        m = _INT_RE.search(text)
+        if m is None:
+            raise ValueError(f'No value in reply: {text!r}')
+        return int(m.group(0), 0)
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,4 +1,10 @@
 import os
+import sys
+import logging
+import importlib
+import threading
+import shutil
+from ctypes import byref, c_void_p
 from pathlib import Path
 import pytest
 import platform
@@ -6,10 +12,42 @@ import platform
 from pyrtlsdrlib import lib as LIB_MODULE
 from pyrtlsdrlib.lib import custom_build as CUSTOM_LIB_MODULE
 from pyrtlsdrlib.lib import resource_filename
+from pyrtlsdrlib.bindings import bind_function
 
 HAS_CUSTOM_BUILD = os.environ.get('PYRTLSDRLIB_NO_CUSTOM') not in ['1', 'true']
 IS_CI = os.environ.get('CI') == 'true'
 MACOS_ARCH = os.environ.get('MACOS_ARCH')
+TOOLS_DIR = Path(__file__).resolve().parent.parent / 'tools'
+BENCH_LOGGER = logging.getLogger('pyrtlsdrlib.benchmark')
+
+
+@pytest.fixture
+def bench_report(request, record_property):
+    """Report benchmark results
+
+    Each call logs ``<test>: <name>: key=value, ...`` to the
+    ``pyrtlsdrlib.benchmark`` logger (shown with ``--log-cli-level=INFO``) and
+    records the values as properties of the test (included in ``--junitxml``
+    reports).
+    """
+    def report(name: str, **values: float):
+        items = ', '.join(f'{key}={val:.4g}' for key, val in values.items())
+        BENCH_LOGGER.info(f'{request.node.name}: {name}: {items}')
+        for key, val in values.items():
+            record_property(f'{name}.{key}', val)
+    return report
+
+
+def import_tool(name: str):
+    """Import a module from ``tools/``, skipping if its dependencies are missing
+    """
+    for dep in ['loguru', 'jsonfactory', 'click', 'requests']:
+        pytest.importorskip(dep)
+    sys.path.insert(0, str(TOOLS_DIR))
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(str(TOOLS_DIR))
 
 
 @pytest.fixture
@@ -20,3 +58,162 @@ def package_lib_root():
 @pytest.fixture
 def custom_lib_root():
     return Path(resource_filename(CUSTOM_LIB_MODULE.__name__, ''))
+
+
+class FakeAsyncLib:
+    """Stand-in for the async read functions of librtlsdr
+
+    Each block delivered is filled with its index (modulo 256).
+    If *num_blocks* is ``None``, blocks are delivered until cancelled.
+    """
+    def __init__(self, num_blocks: int|None = 8, buf_len: int = 16384, buf_num: int = 4):
+        from ctypes import CFUNCTYPE, c_int, c_uint32, c_void_p, c_ubyte
+        from pyrtlsdrlib.stream import read_async_cb_t
+        self.num_blocks = num_blocks
+        self.buffers = [(c_ubyte * buf_len)() for _ in range(buf_num)]
+        self.cancelled = False
+        self.blocks_sent = 0
+        read_async_t = CFUNCTYPE(c_int, c_void_p, read_async_cb_t, c_void_p, c_uint32, c_uint32)
+        cancel_async_t = CFUNCTYPE(c_int, c_void_p)
+        self.rtlsdr_read_async = read_async_t(self._read_async)
+        self.rtlsdr_cancel_async = cancel_async_t(self._cancel_async)
+
+    def _read_async(self, dev, cb, ctx, buf_num, buf_len):
+        import ctypes
+        self.cancelled = False
+        self.blocks_sent = 0
+        while not self.cancelled:
+            if self.num_blocks is not None and self.blocks_sent >= self.num_blocks:
+                break
+            buf = self.buffers[self.blocks_sent % len(self.buffers)]
+            ctypes.memset(buf, self.blocks_sent & 0xff, len(buf))
+            cb(ctypes.addressof(buf), len(buf), ctx)
+            self.blocks_sent += 1
+        return 0
+
+    def _cancel_async(self, dev):
+        self.cancelled = True
+        return 0
+
+
+@pytest.fixture
+def fake_async_lib():
+    return FakeAsyncLib()
+
+
+# The simulated librtlsdr from tools/simlib, built once per session and
+# loaded through the normal ``load_librtlsdr`` resolution path
+@pytest.fixture(scope='session')
+def sim_lib_dir(tmp_path_factory):
+    if shutil.which('cmake') is None or shutil.which('make') is None:
+        pytest.skip('cmake and make are required to build the simulated library')
+    SimBuilder = import_tool('build_from_source').SimBuilder
+    lib_dest = tmp_path_factory.mktemp('sim_lib')
+    with SimBuilder(lib_dest) as builder:
+        builder.build()
+    return lib_dest
+
+
+@pytest.fixture
+def sim_lib(sim_lib_dir, monkeypatch, tmp_path):
+    monkeypatch.setenv('PYRTLSDRLIB_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('PYRTLSDRLIB_NO_CACHE', raising=False)
+    monkeypatch.setattr(LIB_MODULE, '_lib_dirs', (sim_lib_dir,))
+    LIB_MODULE.invalidate_cache()
+    dll = LIB_MODULE.load_librtlsdr()
+    assert dll is not None
+    yield dll
+    LIB_MODULE.invalidate_cache()
+
+
+@pytest.fixture
+def sim_dev(sim_lib):
+    dev = c_void_p()
+    r = bind_function(sim_lib, 'rtlsdr_open')(byref(dev), 0)
+    assert r == 0
+    yield dev
+    bind_function(sim_lib, 'rtlsdr_close')(dev)
+
+
+class FakeHTTPServer:
+    """Local HTTP server serving the byte strings in :attr:`files`
+
+    Responses include an ``ETag`` (derived from the content) and requests
+    with a matching ``If-None-Match`` header get a 304 response. ``Range``
+    requests are supported (honoring ``If-Range``).
+    Each request's path and headers are recorded in :attr:`requests`.
+
+    The next response for a path in :attr:`fail_after` is cut off (by closing
+    the connection) after the given number of bytes.
+    """
+    def __init__(self):
+        import re
+        import hashlib
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        self.files = {}
+        self.requests = []
+        self.fail_after = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{hashlib.sha1(data).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                total = len(data)
+                m = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+                if_range = self.headers.get('If-Range')
+                if m is not None and (if_range is None or if_range == etag):
+                    start = int(m.group(1))
+                    if start >= total:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{total}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{total-1}/{total}')
+                    data = data[start:]
+                else:
+                    self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                fail_after = server.fail_after.pop(self.path, None)
+                if fail_after is not None:
+                    self.wfile.write(data[:fail_after])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(data)
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.port}{path}'
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    server = FakeHTTPServer()
+    yield server
+    server.close()
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import pytest
+
+from pyrtlsdrlib.aio import AsyncStream
+
+from conftest import FakeAsyncLib
+
+
+def test_iterate_all():
+    lib = FakeAsyncLib(num_blocks=20, buf_len=1024)
+    async def run():
+        async with AsyncStream(1, dll=lib, maxsize=32, policy='block') as stream:
+            return [(block.index, block.view[0]) async for block in stream]
+    result = asyncio.run(run())
+    assert result == [(i, i) for i in range(20)]
+
+def test_block_policy_backpressure():
+    lib = FakeAsyncLib(num_blocks=50, buf_len=256)
+    async def run():
+        async with AsyncStream(1, dll=lib, maxsize=2, policy='block') as stream:
+            indices = []
+            async for block in stream:
+                indices.append(block.index)
+                await asyncio.sleep(0)
+            return indices, stream.dropped
+    indices, dropped = asyncio.run(run())
+    assert indices == list(range(50))
+    assert dropped == 0
+
+@pytest.mark.parametrize('policy', ['drop-oldest', 'drop-newest'])
+def test_drop_policies(policy):
+    lib = FakeAsyncLib(num_blocks=50, buf_len=256)
+    async def run():
+        stream = AsyncStream(1, dll=lib, maxsize=4, policy=policy)
+        stream.start()
+        # Let the driver fill the queue before consuming
+        while not stream._finished:
+            await asyncio.sleep(.01)
+        indices = [block.index async for block in stream]
+        await stream.aclose()
+        return indices, stream.dropped
+    indices, dropped = asyncio.run(run())
+    assert dropped == 46
+    if policy == 'drop-oldest':
+        assert indices == list(range(46, 50))
+    else:
+        assert indices == list(range(4))
+
+def test_cancel():
+    lib = FakeAsyncLib(num_blocks=None, buf_len=256)
+    async def run():
+        async with AsyncStream(1, dll=lib, maxsize=4) as stream:
+            count = 0
+            async for block in stream:
+                count += 1
+                if count == 10:
+                    break
+        return stream
+    stream = asyncio.run(run())
+    assert lib.cancelled
+    assert not stream._thread.is_alive()
+
+def test_task_cancel():
+    lib = FakeAsyncLib(num_blocks=None, buf_len=256)
+    async def consume(stream):
+        async for block in stream:
+            await asyncio.sleep(.001)
+    async def run():
+        async with AsyncStream(1, dll=lib, maxsize=4, policy='block') as stream:
+            task = asyncio.create_task(consume(stream))
+            await asyncio.sleep(.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        return stream
+    stream = asyncio.run(run())
+    assert lib.cancelled
+    assert not stream._thread.is_alive()
+
+class StallingAsyncLib(FakeAsyncLib):
+    """Delivers *num_blocks* blocks, then waits until cancelled
+    """
+    def _read_async(self, dev, cb, ctx, buf_num, buf_len):
+        r = super()._read_async(dev, cb, ctx, buf_num, buf_len)
+        while not self.cancelled:
+            time.sleep(.001)
+        return r
+
+def test_bare_iteration_cancel():
+    lib = StallingAsyncLib(num_blocks=2, buf_len=256)
+    stream = AsyncStream(1, dll=lib, maxsize=4)
+    async def consume():
+        async for block in stream:
+            pass
+    async def run():
+        task = asyncio.create_task(consume())
+        while lib.blocks_sent < 2 or len(stream._queue):
+            await asyncio.sleep(.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(run())
+    assert lib.cancelled
+    assert not stream._thread.is_alive()
+    assert not len(stream.reader.consumers)
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        AsyncStream(1, dll=FakeAsyncLib(), policy='foo')
+
+
+def test_aclose_idempotent():
+    lib = FakeAsyncLib(num_blocks=None, buf_len=256)
+    async def run():
+        stream = AsyncStream(1, dll=lib)
+        stream.start()
+        await asyncio.gather(stream.aclose(), stream.aclose())
+        await stream.aclose()
+        return stream
+    stream = asyncio.run(run())
+    assert not len(stream.reader.consumers)
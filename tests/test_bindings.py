@@ -0,0 +1,107 @@
+import re
+import time
+import ctypes
+from ctypes import CFUNCTYPE, byref, c_int, c_uint32, c_void_p
+import pytest
+
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib.bindings import PROTOTYPES, CDEF, LibRtlSdr, get_bindings, get_cffi_lib
+
+
+class PartialLib:
+    """A library exporting only ``rtlsdr_get_device_count``
+    """
+    def __init__(self):
+        self.rtlsdr_get_device_count = CFUNCTYPE(c_uint32)(lambda: 3)
+
+
+def test_cdef_matches_prototypes():
+    names = re.findall(r'\b(rtlsdr_\w+)\(', CDEF)
+    assert names == list(PROTOTYPES)
+
+def test_missing_symbols():
+    lib = LibRtlSdr(PartialLib())
+    assert lib.rtlsdr_get_device_count() == 3
+    assert lib.missing == set(PROTOTYPES) - {'rtlsdr_get_device_count'}
+    with pytest.raises(AttributeError, match='does not export'):
+        lib.rtlsdr_open
+    with pytest.raises(AttributeError):
+        lib.foo
+
+def test_bindings(sim_lib, sim_dev):
+    lib = get_bindings()
+    assert lib.dll is sim_lib
+    assert get_bindings() is lib
+    # The shared CDLL must not be modified
+    assert sim_lib.rtlsdr_set_center_freq.argtypes is None
+
+    assert lib.rtlsdr_set_center_freq(sim_dev, 3_000_000_000) == 0
+    assert lib.rtlsdr_get_center_freq(sim_dev) == 3_000_000_000
+    assert lib.rtlsdr_get_device_name(0) == b'Simulated RTL2832U'
+    assert lib.rtlsdr_get_index_by_serial(b'SIM00000') == 0
+    rtl_xtal, tuner_xtal = c_uint32(), c_uint32()
+    assert lib.rtlsdr_get_xtal_freq(sim_dev, byref(rtl_xtal), byref(tuner_xtal)) == 0
+    assert rtl_xtal.value == 28800000
+    buf = (ctypes.c_ubyte * 512)()
+    n_read = c_int()
+    assert lib.rtlsdr_read_sync(sim_dev, buf, len(buf), byref(n_read)) == 0
+    assert n_read.value == 512
+
+    LIB_MODULE.reload()
+    assert get_bindings() is not lib
+
+def test_cffi(sim_lib, sim_dev, monkeypatch):
+    pytest.importorskip('cffi')
+    monkeypatch.setenv('RTLSDR_SIM_RATE', '0')
+    ffi, lib = get_cffi_lib()
+    assert get_cffi_lib()[1] is lib
+    dev = ffi.cast('rtlsdr_dev_t *', sim_dev.value)
+    assert lib.rtlsdr_set_center_freq(dev, 3_000_000_000) == 0
+    assert lib.rtlsdr_get_center_freq(dev) == 3_000_000_000
+    assert get_bindings().rtlsdr_get_center_freq(sim_dev) == 3_000_000_000
+    buf = ffi.new('unsigned char[]', 512)
+    n_read = ffi.new('int *')
+    assert lib.rtlsdr_read_sync(dev, buf, 512, n_read) == 0
+    assert n_read[0] == 512
+    assert ffi.string(lib.rtlsdr_get_device_name(0)) == b'Simulated RTL2832U'
+
+
+def _time_calls(func, *args, n=20000):
+    start_ts = time.perf_counter()
+    for _ in range(n):
+        func(*args)
+    return (time.perf_counter() - start_ts) / n * 1e6
+
+def test_bench_call_overhead(sim_lib, sim_dev, monkeypatch, bench_report):
+    cffi = pytest.importorskip('cffi')
+    monkeypatch.setenv('RTLSDR_SIM_RATE', '0')
+    lib = get_bindings()
+    ffi, cffi_lib = get_cffi_lib()
+    cffi_dev = ffi.cast('rtlsdr_dev_t *', sim_dev.value)
+    buf = (ctypes.c_ubyte * 512)()
+    n_read = c_int()
+    cffi_buf = ffi.new('unsigned char[]', 512)
+    cffi_n_read = ffi.new('int *')
+
+    results = {
+        'set_center_freq': (
+            _time_calls(lib.rtlsdr_set_center_freq, sim_dev, 100_000_000),
+            _time_calls(cffi_lib.rtlsdr_set_center_freq, cffi_dev, 100_000_000),
+        ),
+        'read_sync': (
+            _time_calls(lib.rtlsdr_read_sync, sim_dev, buf, 512, byref(n_read)),
+            _time_calls(cffi_lib.rtlsdr_read_sync, cffi_dev, cffi_buf, 512, cffi_n_read),
+        ),
+    }
+    for name, (t_ctypes, t_cffi) in results.items():
+        bench_report(name, ctypes_us=t_ctypes, cffi_us=t_cffi)
+    t_ctypes, t_cffi = results['set_center_freq']
+    assert t_cffi < t_ctypes
+
+
+def test_bind_function_prototype(sim_lib, sim_dev):
+    from pyrtlsdrlib.bindings import bind_function
+    with pytest.raises(KeyError):
+        bind_function(sim_lib, 'rtlsdr_sim_get_dropped')
+    func = bind_function(sim_lib, 'rtlsdr_sim_get_dropped', (ctypes.c_uint64, (c_void_p,)))
+    assert func(sim_dev) == 0
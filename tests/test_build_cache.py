@@ -0,0 +1,94 @@
+import shutil
+import tarfile
+from pathlib import Path
+import pytest
+
+from conftest import import_tool, TOOLS_DIR
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('cmake') is None, reason='cmake is required',
+)
+
+
+@pytest.fixture
+def build_mod():
+    return import_tool('build_from_source')
+
+
+class TarballAsset:
+    """Stands in for a SourceAsset, serving a tarball of *source_dir*
+    """
+    def __init__(self, source_dir: Path):
+        self.source_dir = source_dir
+
+    def download_to(self, dest_dir: Path) -> Path:
+        fn = dest_dir / 'source.tar.gz'
+        with tarfile.open(fn, 'w:gz') as tf:
+            tf.add(self.source_dir, arcname='librtlsdr-src')
+        return fn
+
+    def __str__(self):
+        return 'Source'
+
+
+def test_sync_tree(build_mod, tmp_path):
+    src, dest = tmp_path / 'src', tmp_path / 'dest'
+    (src / 'sub').mkdir(parents=True)
+    (src / 'a.c').write_text('a')
+    (src / 'sub' / 'b.c').write_text('b')
+    assert build_mod.sync_tree(src, dest) == 2
+    mtime = (dest / 'a.c').stat().st_mtime_ns
+
+    (src / 'sub' / 'b.c').write_text('b2')
+    (dest / 'stale.c').write_text('x')
+    assert build_mod.sync_tree(src, dest) == 2
+    assert (dest / 'a.c').stat().st_mtime_ns == mtime
+    assert (dest / 'sub' / 'b.c').read_text() == 'b2'
+    assert not (dest / 'stale.c').exists()
+
+
+def test_persistent_build(build_mod, tmp_path, bench_report):
+    source_dir = tmp_path / 'source'
+    shutil.copytree(TOOLS_DIR / 'simlib', source_dir)
+    asset = TarballAsset(source_dir)
+    cache_dir = tmp_path / 'build-cache'
+
+    def build():
+        lib_dest = tmp_path / 'lib'
+        with build_mod.Builder(None, asset, lib_dest, build_cache_dir=cache_dir) as builder:
+            builder.build()
+        variant_dir = builder.get_variant_dir()
+        lib_files = sorted((variant_dir / 'build' / 'src').glob('librtlsdr*'))
+        lib_file = [p for p in lib_files if not p.is_symlink()][0]
+        return builder, lib_file, lib_file.stat().st_mtime_ns
+
+    builder, lib_file, mtime = build()
+    assert builder.jobs == build_mod.get_num_jobs()
+    bench_report('cold build', **builder.timings)
+
+    # Same tarball: nothing is configured or compiled
+    builder, _, mtime2 = build()
+    bench_report('unchanged rebuild', **builder.timings)
+    assert mtime2 == mtime
+    stamp = (builder.get_variant_dir() / 'build' / build_mod.CONFIGURE_STAMP).read_text()
+    assert stamp.startswith('cmake')
+
+    # Changed source: rebuilt in the same tree
+    with (source_dir / 'rtlsdr_sim.c').open('a') as fd:
+        fd.write('\n/* changed */\n')
+    builder, _, mtime3 = build()
+    bench_report('changed rebuild', **builder.timings)
+    assert mtime3 != mtime
+    assert (tmp_path / 'lib' / lib_file.name).exists()
+
+
+def test_host_cpu_variants(build_mod, monkeypatch):
+    import click
+    monkeypatch.setattr(build_mod, 'get_machine', lambda: 'x86_64')
+    monkeypatch.setattr(build_mod, 'OS_TYPE', build_mod.BuildType.from_str('linux|x86_64'))
+    assert build_mod.get_host_cpu_variants(['x86_64_v3', 'armv8_2a']) == ['x86_64_v3']
+    for os_type in ['windows|w64', 'macos|x86_64']:
+        monkeypatch.setattr(build_mod, 'OS_TYPE', build_mod.BuildType.from_str(os_type))
+        assert build_mod.get_host_cpu_variants([]) == []
+        with pytest.raises(click.UsageError):
+            build_mod.get_host_cpu_variants(['x86_64_v3'])
@@ -0,0 +1,90 @@
+import time
+from pathlib import Path
+import pytest
+
+from pyrtlsdrlib import BuildType, FileType, BuildFile
+
+from conftest import import_tool
+
+
+@pytest.fixture
+def common_mod():
+    return import_tool('common')
+
+
+def make_project_meta(num_assets, files_per_asset):
+    build_types = ['macos', 'ubuntu', 'windows|w64|static', 'windows|w32|dlldep|udpsrv']
+    meta = {}
+    for i in range(num_assets):
+        bt = BuildType.from_str(build_types[i % len(build_types)])
+        asset_data = meta[f'asset{i}.zip'] = {}
+        for j in range(files_per_asset):
+            proj_file = f'librtlsdr_{i}.so.{j}'
+            is_symlink = j > 0
+            asset_data[proj_file] = dict(
+                tag_name='v0.8.0',
+                build_file=BuildFile(
+                    build_type=bt, file_type=FileType.lib,
+                    filename=Path(f'asset{i}/lib/{proj_file}'),
+                    is_symlink=is_symlink,
+                    symlink_target=Path(f'asset{i}/lib/librtlsdr_{i}.so.0') if is_symlink else None,
+                ),
+                proj_file=Path(proj_file),
+            )
+            if not is_symlink:
+                asset_data[proj_file]['sha256'] = f'{i:064x}'
+    return meta
+
+
+def test_build_file_row():
+    bf = BuildFile(BuildType.from_str('windows|w64|static|udpsrv'), FileType.bin, Path('a/rtl_test.exe'))
+    row = bf.to_row()
+    assert row == ['W6SU', 'b', 'a/rtl_test.exe', None]
+    assert BuildFile.from_row(row) == bf
+    bf = BuildFile(BuildType.linux, FileType.lib, Path('a/librtlsdr.so'), True, Path('librtlsdr.so.0'))
+    assert BuildFile.from_row(bf.to_row()).symlink_target == Path('a/librtlsdr.so.0')
+    with pytest.raises(AttributeError):
+        bf.foo = 1
+
+
+def test_roundtrip(common_mod, tmp_path):
+    meta = make_project_meta(4, 3)
+    common_mod.write_build_meta(tmp_path, meta)
+    assert common_mod.read_build_meta(tmp_path) == meta
+
+    files = [entry['build_file'] for asset_data in meta.values() for entry in asset_data.values()]
+    common_mod.write_build_meta(tmp_path, files)
+    assert common_mod.read_build_meta(tmp_path) == files
+
+    # Other metadata is unchanged
+    other = {'asset.zip': dict(tag_name='v0.8.0', build_files=files)}
+    common_mod.write_build_meta(tmp_path, other)
+    assert common_mod.read_build_meta(tmp_path) == other
+
+
+def test_read_legacy(common_mod, tmp_path):
+    import jsonfactory
+    meta = make_project_meta(4, 3)
+    (tmp_path / 'build-meta.json').write_text(jsonfactory.dumps(meta, indent=2))
+    assert common_mod.read_build_meta(tmp_path) == meta
+
+
+def test_bench_build_meta(common_mod, bench_report):
+    import jsonfactory
+    meta = make_project_meta(500, 10)
+
+    def bench(dumps, loads):
+        start_ts = time.perf_counter()
+        s = dumps(meta)
+        dump_time = time.perf_counter() - start_ts
+        start_ts = time.perf_counter()
+        assert loads(s) == meta
+        load_time = time.perf_counter() - start_ts
+        return dump_time, load_time, len(s)
+
+    legacy = bench(lambda m: jsonfactory.dumps(m, indent=2), common_mod.loads_build_meta)
+    flat = bench(common_mod.dumps_build_meta, common_mod.loads_build_meta)
+    for name, (dump_time, load_time, size) in [('legacy', legacy), ('flat', flat)]:
+        bench_report(f'{name} build-meta (5000 files)', dump_ms=dump_time*1e3, load_ms=load_time*1e3, kb=size/1e3)
+    assert flat[1] < legacy[1]
+    assert flat[2] < legacy[2] / 3
@@ -0,0 +1,92 @@
+import timeit
+import pytest
+
+from pyrtlsdrlib import BuildType
+from pyrtlsdrlib import common as COMMON_MODULE
+
+
+def test_from_str():
+    assert BuildType.from_str('macos') is BuildType.macos
+    assert BuildType.from_str('LINUX') is BuildType.ubuntu
+    assert BuildType.from_str('w32|w64') == BuildType.w32 | BuildType.w64
+    assert BuildType.from_str('unknown') is BuildType.unknown
+    t = BuildType.from_str('windows|w64|static')
+    assert not t & BuildType.unknown
+    assert BuildType.from_str(t.to_str()) == t
+    with pytest.raises(AttributeError):
+        BuildType.from_str('foo')
+
+def test_str_operators():
+    t = BuildType.windows | 'w32'
+    assert t == BuildType.windows | BuildType.w32
+    assert t & 'w32|w64' == BuildType.w32
+    assert t ^ 'w32' == BuildType.windows
+
+@pytest.mark.parametrize('self_str,other_str,expected', [
+    ('all_os|w32|w64|static', 'windows|w64|static', True),
+    ('all_os|w32|w64|static', 'windows|w64|dlldep', False),
+    ('all_os|w32|static', 'windows|w64|static', False),
+    ('all_os|w32|w64|static', 'windows|w64|static|udpsrv', False),
+    ('all_os|w32|w64|static|udpsrv', 'windows|w64|static|udpsrv', True),
+    ('all_os|w32|w64|static', 'macos', True),
+    ('windows|w32|static', 'ubuntu', False),
+])
+def test_contains(self_str, other_str, expected):
+    bt = BuildType.from_str(self_str)
+    other = BuildType.from_str(other_str)
+    assert bt.contains(other) is expected
+    assert bt.contains(other_str) is expected
+    # second lookup comes from the table
+    assert bt.contains(other) is bt._contains(other) is expected
+
+
+# The cached paths must be used after the first lookup. Timings are reported
+# for reference only since they are unreliable on shared runners.
+
+NUMBER = 2000
+
+def test_from_str_cached(bench_report):
+    parse = COMMON_MODULE._parse_build_type
+    s = 'windows|w64|static|udpsrv'
+    t = BuildType.from_str(s)
+    info = parse.cache_info()
+    assert BuildType.from_str(s) is t
+    new_info = parse.cache_info()
+    assert new_info.hits == info.hits + 1
+    assert new_info.misses == info.misses
+
+    t_cached = min(timeit.repeat(lambda: BuildType.from_str(s), number=NUMBER, repeat=3))
+    t_uncached = min(timeit.repeat(lambda: parse.__wrapped__(s), number=NUMBER, repeat=3))
+    bench_report('from_str', cached_us=t_cached/NUMBER*1e6, uncached_us=t_uncached/NUMBER*1e6)
+
+def test_contains_cached(monkeypatch, bench_report):
+    bt = BuildType.from_str('all_os|w32|w64|static')
+    other = BuildType.from_str('windows|w64|static')
+    key = (bt.value, other.value)
+    monkeypatch.delitem(COMMON_MODULE._contains_table, key, raising=False)
+    calls = []
+    orig_contains = BuildType._contains
+    def _contains(self, other):
+        calls.append(other)
+        return orig_contains(self, other)
+    monkeypatch.setattr(BuildType, '_contains', _contains)
+    assert bt.contains(other) is True
+    assert bt.contains(other) is True
+    assert bt.contains('windows|w64|static') is True
+    assert calls == [other]
+    assert COMMON_MODULE._contains_table[key] is True
+    monkeypatch.undo()
+
+    t_cached = min(timeit.repeat(lambda: bt.contains(other), number=NUMBER, repeat=3))
+    t_uncached = min(timeit.repeat(lambda: bt._contains(other), number=NUMBER, repeat=3))
+    bench_report('contains', cached_us=t_cached/NUMBER*1e6, uncached_us=t_uncached/NUMBER*1e6)
+
+def test_filter_options_cached(bench_report):
+    bt = BuildType.from_str('all_os|w32|w64|static')
+    assert bt.filter_options() == BuildType.from_str('w32|w64|static|source')
+    # Only cached parsing is used
+    misses = COMMON_MODULE._parse_build_type.cache_info().misses
+    bt.filter_options()
+    assert COMMON_MODULE._parse_build_type.cache_info().misses == misses
+    t = min(timeit.repeat(bt.filter_options, number=NUMBER, repeat=3))
+    bench_report('filter_options', us=t/NUMBER*1e6)
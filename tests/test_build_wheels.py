@@ -0,0 +1,54 @@
+import zipfile
+import pytest
+
+from conftest import import_tool
+
+
+@pytest.fixture
+def build_wheels():
+    pytest.importorskip('click')
+    return import_tool('build_wheels')
+
+
+def make_wheel(tmp_path, tag, meta_tag=None):
+    fn = tmp_path / f'pyrtlsdrlib-0.0.5-{tag}.whl'
+    meta_tag = tag if meta_tag is None else meta_tag
+    with zipfile.ZipFile(fn, 'w') as zf:
+        zf.writestr(
+            'pyrtlsdrlib-0.0.5.dist-info/WHEEL',
+            f'Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: {meta_tag}\n',
+        )
+    return fn
+
+
+@pytest.mark.parametrize('os_type,tag', [
+    ('macos', 'py3-none-macosx_10_0_x86_64'),
+    ('win32', 'py3-none-win32'),
+    ('win64', 'py3-none-win_amd64'),
+    ('linux', 'py3-none-linux_x86_64'),
+])
+def test_check_wheel_tag(build_wheels, tmp_path, os_type, tag):
+    assert build_wheels.check_wheel_tag(os_type, make_wheel(tmp_path, tag)) == tag
+
+
+@pytest.mark.parametrize('os_type,tag,meta_tag', [
+    ('win32', 'py3-none-win_amd64', None),
+    ('linux', 'py3-none-any', None),
+    ('linux', 'py3-cp311-linux_x86_64', None),
+    ('linux', 'py3-none-linux_x86_64', 'py3-none-any'),
+])
+def test_check_wheel_tag_invalid(build_wheels, tmp_path, os_type, tag, meta_tag):
+    with pytest.raises(build_wheels.WheelTagError):
+        build_wheels.check_wheel_tag(os_type, make_wheel(tmp_path, tag, meta_tag))
+
+
+def test_stage_source(build_wheels, tmp_path):
+    dest = tmp_path / 'tree'
+    dest.mkdir()
+    (dest / 'stale').touch()
+    build_wheels.stage_source(dest)
+    assert not (dest / 'stale').exists()
+    assert (dest / 'setup.py').exists()
+    assert (dest / 'src' / 'pyrtlsdrlib' / 'lib' / '__init__.py').exists()
+    assert not list(dest.rglob('__pycache__'))
+    assert not (dest / 'tests').exists()
@@ -0,0 +1,86 @@
+import timeit
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pyrtlsdrlib import convert
+
+
+@pytest.fixture
+def samples():
+    return np.arange(512, dtype=np.uint16).astype(np.uint8)
+
+
+def test_cf32(samples):
+    out = np.empty(256, dtype=np.complex64)
+    r = convert.to_cf32(samples, out)
+    assert r is out
+    x = (samples.astype(np.float64) - 127.5) / 127.5
+    expected = x[0::2] + 1j * x[1::2]
+    assert np.allclose(out, expected)
+    f = out.view(np.float32)
+    assert f.max() == 1 and f.min() == -1
+
+def test_ci16(samples):
+    out = convert.to_ci16(samples)
+    assert out.dtype == np.int16
+    expected = (2 * samples.astype(np.int32) - 255) * 128
+    assert np.array_equal(out, expected)
+    cf = convert.to_cf32(samples)
+    assert np.allclose(out[0::2] / 32640, cf.real)
+
+def test_cs8(samples):
+    out = convert.to_cs8(bytes(samples))
+    assert out.dtype == np.int8
+    assert np.array_equal(out, samples.astype(np.int16) - 128)
+
+@pytest.mark.parametrize('fmt', ['cf32', 'ci16', 'cs8'])
+def test_batched(samples, fmt):
+    batch = np.stack([samples, samples[::-1]])
+    out = convert.convert(batch, fmt)
+    assert out.shape == convert.get_output_shape(batch.shape, fmt)
+    assert np.array_equal(out[1], convert.convert(samples[::-1].copy(), fmt))
+
+def test_output_validation(samples):
+    with pytest.raises(TypeError):
+        convert.to_cf32(samples, np.empty(256, dtype=np.complex128))
+    with pytest.raises(ValueError):
+        convert.to_cf32(samples, np.empty(512, dtype=np.complex64))
+    with pytest.raises(ValueError):
+        convert.to_cf32(samples[:-1])
+    with pytest.raises(ValueError):
+        convert.convert(samples, 'foo')
+
+def test_converter(samples):
+    conv = convert.Converter('cf32', 256, batch_size=2)
+    r1 = conv(samples)
+    r2 = conv(samples)
+    assert r1 is r2 is conv.out
+    assert r1.shape == (2, 128)
+
+
+# Benchmark against the common expression `(x - 127.5) / 127.5`
+
+def naive_cf32(x):
+    y = (x - 127.5) / 127.5
+    return (y[0::2] + 1j * y[1::2]).astype(np.complex64)
+
+@pytest.mark.parametrize('num_samples', [1 << 18, 1 << 21])
+def test_bench_cf32(num_samples, bench_report):
+    x = np.random.randint(0, 256, 2 * num_samples, dtype=np.uint8)
+    out = np.empty(num_samples, dtype=np.complex64)
+    number = 5
+    t_naive = min(timeit.repeat(lambda: naive_cf32(x), number=number, repeat=3)) / number
+    t_conv = min(timeit.repeat(lambda: convert.to_cf32(x, out), number=number, repeat=3)) / number
+    assert np.allclose(out, naive_cf32(x))
+    bench_report(f'cf32 ({num_samples} samples)', naive_ms=t_naive*1e3, convert_ms=t_conv*1e3)
+    assert t_conv < t_naive
+
+@pytest.mark.parametrize('fmt', ['ci16', 'cs8'])
+def test_bench_int(fmt, bench_report):
+    num_samples = 1 << 21
+    x = np.random.randint(0, 256, 2 * num_samples, dtype=np.uint8)
+    conv = convert.Converter(fmt, x.size)
+    number = 5
+    t = min(timeit.repeat(lambda: conv(x), number=number, repeat=3)) / number
+    bench_report(f'{fmt} ({num_samples} samples)', ms=t*1e3, mb_per_s=x.size / t / 1e6)
@@ -1,7 +1,8 @@
 from pathlib import Path
 import pytest
 
-from pyrtlsdrlib.lib import get_library_files, load_librtlsdr
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib.lib import get_library_files, get_udpsrv_library_files, load_librtlsdr
 
 from conftest import HAS_CUSTOM_BUILD
 
@@ -20,3 +21,17 @@ def test_custom_build_loads(custom_lib_root):
     assert dll is not None
     dll_file = Path(dll._name)
     assert dll_file.parent == custom_lib_root
+
+def test_udpsrv_build_loads(custom_lib_root, monkeypatch):
+    udpsrv_dir = custom_lib_root / LIB_MODULE.UDPSRV_DIRNAME
+    if not any(p.parent == udpsrv_dir for p in get_udpsrv_library_files()):
+        pytest.skip('No udpsrv build')
+    monkeypatch.setenv('PYRTLSDRLIB_UDPSRV', '1')
+    try:
+        dll = LIB_MODULE.reload()
+        assert dll is not None
+        assert Path(dll._name).parent == udpsrv_dir
+        assert hasattr(dll, 'rtlsdr_open')
+    finally:
+        monkeypatch.delenv('PYRTLSDRLIB_UDPSRV')
+        LIB_MODULE.reload()
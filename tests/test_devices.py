@@ -0,0 +1,155 @@
+import time
+import ctypes
+import threading
+from ctypes import CFUNCTYPE, POINTER, c_int, c_uint32, c_void_p
+import pytest
+
+from pyrtlsdrlib.devices import DeviceRegistry
+
+
+class FakeDeviceLib:
+    """Stand-in for the device functions of librtlsdr
+
+    ``rtlsdr_open`` sleeps for *open_delay* seconds to simulate tuner init.
+    """
+    def __init__(self, serials, open_delay=0., fail_serials=()):
+        self.serials = serials
+        self.open_delay = open_delay
+        self.fail_serials = set(fail_serials)
+        self.open_devs = set()
+        self.count_calls = 0
+        self.open_calls = 0
+        self._names = [ctypes.create_string_buffer(b'Generic RTL2832U OEM') for _ in serials]
+        self.rtlsdr_get_device_count = CFUNCTYPE(c_uint32)(self._get_device_count)
+        self.rtlsdr_get_device_name = CFUNCTYPE(c_void_p, c_uint32)(self._get_device_name)
+        self.rtlsdr_get_device_usb_strings = CFUNCTYPE(
+            c_int, c_uint32, c_void_p, c_void_p, c_void_p,
+        )(self._get_device_usb_strings)
+        self.rtlsdr_open = CFUNCTYPE(c_int, POINTER(c_void_p), c_uint32)(self._open)
+        self.rtlsdr_close = CFUNCTYPE(c_int, c_void_p)(self._close)
+
+    def _get_device_count(self):
+        self.count_calls += 1
+        return len(self.serials)
+
+    def _get_device_name(self, index):
+        return ctypes.addressof(self._names[index])
+
+    def _get_device_usb_strings(self, index, m, p, s):
+        for addr, value in [(m, 'Realtek'), (p, 'RTL2838UHIDIR'), (s, self.serials[index])]:
+            value = value.encode() + b'\0'
+            ctypes.memmove(addr, value, len(value))
+        return 0
+
+    def _open(self, dev_p, index):
+        self.open_calls += 1
+        time.sleep(self.open_delay)
+        if self.serials[index] in self.fail_serials:
+            return -1
+        dev_p[0] = index + 1
+        self.open_devs.add(index + 1)
+        return 0
+
+    def _close(self, dev):
+        self.open_devs.remove(dev)
+        return 0
+
+
+SERIALS = [f'{i:08d}' for i in range(8)]
+
+
+def test_enumerate_cached():
+    lib = FakeDeviceLib(SERIALS)
+    reg = DeviceRegistry(dll=lib)
+    devices = reg.enumerate()
+    assert [d.serial for d in devices] == SERIALS
+    assert devices[0].manufacturer == 'Realtek'
+    assert devices[0].name == 'Generic RTL2832U OEM'
+    assert reg.enumerate() is devices
+    assert lib.count_calls == 1
+    reg.enumerate(refresh=True)
+    assert lib.count_calls == 2
+
+def test_open_concurrent():
+    lib = FakeDeviceLib(SERIALS, open_delay=.1)
+    with DeviceRegistry(dll=lib) as reg:
+        start_ts = time.monotonic()
+        handles = reg.open()
+        elapsed = time.monotonic() - start_ts
+        assert list(handles) == SERIALS
+        assert [h.value for h in handles.values()] == list(range(1, 9))
+        assert len(lib.open_devs) == 8
+        # Serial opening would take 0.8 seconds
+        assert elapsed < .5
+        assert reg.open_device(SERIALS[0]) is handles[SERIALS[0]]
+    assert not len(lib.open_devs)
+
+def test_open_errors():
+    lib = FakeDeviceLib(SERIALS, fail_serials=[SERIALS[2]])
+    reg = DeviceRegistry(dll=lib)
+    with pytest.raises(OSError):
+        reg.open()
+    assert not len(lib.open_devs)
+    assert not len(reg.handles)
+    handles = reg.open(ignore_errors=True)
+    assert SERIALS[2] not in handles
+    assert len(handles) == 7
+    reg.close(SERIALS[0])
+    assert len(lib.open_devs) == 6
+    reg.close_all()
+
+def test_duplicate_serials():
+    lib = FakeDeviceLib(['00000001', '00000001', '00000002'])
+    with DeviceRegistry(dll=lib) as reg:
+        assert reg.keys == [0, 1, '00000002']
+        # Devices sharing a serial are keyed by index
+        handles = reg.open()
+        assert list(handles) == [0, 1, '00000002']
+        assert len(lib.open_devs) == 3
+        assert reg.open_device(1) is handles[1]
+        with pytest.raises(ValueError):
+            reg.open(['00000001'])
+        with pytest.raises(KeyError):
+            reg.get_info('foo')
+        with pytest.raises(KeyError):
+            reg.get_info(5)
+        reg.close(0)
+        assert list(reg.handles) == [1, '00000002']
+    assert not len(lib.open_devs)
+
+def test_concurrent_open_same_device():
+    lib = FakeDeviceLib(SERIALS[:2], open_delay=.1)
+    reg = DeviceRegistry(dll=lib)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(reg.open_device(SERIALS[0])))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert lib.open_calls == 1
+    assert len(results) == 4
+    assert all(h is results[0] for h in results)
+    reg.close_all()
+    assert not len(lib.open_devs)
+
+def test_open_waits_for_failed_open():
+    lib = FakeDeviceLib(SERIALS[:2], open_delay=.1, fail_serials=[SERIALS[0]])
+    reg = DeviceRegistry(dll=lib)
+    errors = []
+    def open_one():
+        try:
+            reg.open_device(SERIALS[0])
+        except OSError as exc:
+            errors.append(exc)
+    threads = [threading.Thread(target=open_one) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # The second call retries once the first one has failed
+    assert len(errors) == 2
+    assert lib.open_calls == 2
+    assert not len(reg._pending)
@@ -0,0 +1,149 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from conftest import import_tool
+
+
+@pytest.fixture
+def download_mod():
+    return import_tool('download')
+
+
+def test_download(download_mod, http_server, tmp_path):
+    data = os.urandom(3 * download_mod.CHUNK_SIZE + 123)
+    http_server.files['/asset.zip'] = data
+    result = download_mod.download(http_server.url('/asset.zip'), tmp_path / 'asset.zip')
+    assert result.nbytes == len(data)
+    assert (tmp_path / 'asset.zip').read_bytes() == data
+
+    with pytest.raises(Exception):
+        download_mod.download(http_server.url('/missing.zip'), tmp_path / 'missing.zip')
+
+def test_session_shared(download_mod):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sessions = list(executor.map(lambda _: download_mod.get_session(), range(8)))
+    assert all(s is sessions[0] for s in sessions)
+
+def test_bench_concurrent(download_mod, http_server, tmp_path, bench_report):
+    num_files = 8
+    data = os.urandom(4 << 20)
+    for i in range(num_files):
+        http_server.files[f'/asset{i}.zip'] = data
+
+    def fetch(i):
+        return download_mod.download(http_server.url(f'/asset{i}.zip'), tmp_path / f'asset{i}.zip')
+
+    start_ts = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_files) as executor:
+        results = list(executor.map(fetch, range(num_files)))
+    elapsed = time.perf_counter() - start_ts
+    assert all(r.nbytes == len(data) for r in results)
+    rate = num_files * len(data) / elapsed / 1e6
+    bench_report('concurrent download throughput', mb_per_s=rate)
+
+    # The previous 128 byte chunk size, for comparison
+    start_ts = time.perf_counter()
+    download_mod.download(http_server.url('/asset0.zip'), tmp_path / 'small.zip', chunk_size=128)
+    small_rate = len(data) / (time.perf_counter() - start_ts) / 1e6
+    bench_report('128 byte chunks', mb_per_s=small_rate)
+    assert rate > small_rate
+
+
+@pytest.fixture
+def cache(download_mod, tmp_path):
+    return download_mod.DownloadCache(tmp_path / 'cache')
+
+
+def test_cache_revalidate(cache, http_server, tmp_path):
+    url = http_server.url('/asset.zip')
+    http_server.files['/asset.zip'] = b'a' * 1000
+    dest = tmp_path / 'asset.zip'
+    result = cache.fetch('asset-1', url, dest)
+    assert not result.cached
+    assert dest.read_bytes() == b'a' * 1000
+    assert cache.get_object_filename(result.sha256).exists()
+
+    result = cache.fetch('asset-1', url, dest)
+    assert result.cached
+    assert dest.read_bytes() == b'a' * 1000
+    path, headers = http_server.requests[-1]
+    assert 'If-None-Match' in headers
+
+    # Changed on the server
+    http_server.files['/asset.zip'] = b'b' * 1000
+    result = cache.fetch('asset-1', url, dest)
+    assert not result.cached
+    assert dest.read_bytes() == b'b' * 1000
+    assert cache.get_entry('asset-1')['sha256'] == result.sha256
+
+def test_cache_content_addressed(cache, http_server, tmp_path):
+    http_server.files['/a.zip'] = http_server.files['/b.zip'] = b'x' * 100
+    r1 = cache.fetch('a', http_server.url('/a.zip'), tmp_path / 'a.zip')
+    r2 = cache.fetch('b', http_server.url('/b.zip'), tmp_path / 'b.zip')
+    assert r1.sha256 == r2.sha256
+    assert len(list(cache.objects_dir.iterdir())) == 1
+
+def test_cache_offline(download_mod, cache, http_server, tmp_path):
+    url = http_server.url('/asset.zip')
+    http_server.files['/asset.zip'] = b'a' * 1000
+    cache.fetch('asset-1', url, tmp_path / 'asset.zip')
+    http_server.close()
+
+    offline = download_mod.DownloadCache(cache.root, offline=True)
+    result = offline.fetch('asset-1', url, tmp_path / 'asset2.zip')
+    assert result.cached
+    assert (tmp_path / 'asset2.zip').read_bytes() == b'a' * 1000
+    with pytest.raises(FileNotFoundError):
+        offline.fetch('asset-2', http_server.url('/other.zip'), tmp_path / 'other.zip')
+
+
+def test_resume(download_mod, http_server, tmp_path):
+    data = os.urandom(2 * download_mod.CHUNK_SIZE + 123)
+    http_server.files['/asset.zip'] = data
+    http_server.fail_after['/asset.zip'] = download_mod.CHUNK_SIZE
+    url = http_server.url('/asset.zip')
+    result = download_mod.download(url, tmp_path / 'asset.zip', expected_size=len(data))
+    assert (tmp_path / 'asset.zip').read_bytes() == data
+    assert result.resumed_from > 0
+    assert 'Range' not in http_server.requests[0][1]
+    assert http_server.requests[1][1]['Range'] == f'bytes={result.resumed_from}-'
+    assert not list(tmp_path.glob('*.partial*'))
+
+def test_resume_changed(download_mod, http_server, tmp_path):
+    # Leave a partial download behind
+    old_data = os.urandom(download_mod.CHUNK_SIZE * 2)
+    http_server.files['/asset.zip'] = old_data
+    http_server.fail_after['/asset.zip'] = download_mod.CHUNK_SIZE
+    url = http_server.url('/asset.zip')
+    with pytest.raises(Exception):
+        download_mod.download(url, tmp_path / 'asset.zip', retries=0)
+    assert (tmp_path / 'asset.zip.partial').exists()
+
+    # The If-Range validator no longer matches so the server sends everything
+    data = os.urandom(download_mod.CHUNK_SIZE * 2)
+    http_server.files['/asset.zip'] = data
+    result = download_mod.download(url, tmp_path / 'asset.zip')
+    assert 'If-Range' in http_server.requests[-1][1]
+    assert result.resumed_from == 0
+    assert (tmp_path / 'asset.zip').read_bytes() == data
+
+def test_verify(download_mod, http_server, cache, tmp_path):
+    import hashlib
+    data = os.urandom(1000)
+    http_server.files['/asset.zip'] = data
+    url = http_server.url('/asset.zip')
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    result = download_mod.download(url, tmp_path / 'a.zip', expected_size=1000, expected_sha256=sha256)
+    assert result.sha256 == sha256
+
+    with pytest.raises(download_mod.VerificationError):
+        download_mod.download(url, tmp_path / 'b.zip', expected_size=999)
+    with pytest.raises(download_mod.VerificationError):
+        cache.fetch('asset', url, tmp_path / 'c.zip', expected_sha256='0' * 64)
+    assert not (tmp_path / 'b.zip').exists()
+    assert not (tmp_path / 'c.zip').exists()
+    assert not list(tmp_path.glob('*.partial*'))
+    assert cache.get_entry('asset') is None
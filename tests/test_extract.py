@@ -0,0 +1,125 @@
+import io
+import os
+import stat
+import tarfile
+import zipfile
+import pytest
+
+from conftest import import_tool
+
+
+@pytest.fixture
+def extract_mod():
+    return import_tool('extract')
+
+
+def add_tar_file(tf, name, data, mode=0o644):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    tf.addfile(info, io.BytesIO(data))
+
+def add_tar_symlink(tf, name, target):
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.SYMTYPE
+    info.linkname = target
+    tf.addfile(info)
+
+
+@pytest.fixture
+def nested_archive(tmp_path):
+    """A zip containing a tar.gz, as used for the macos and ubuntu assets
+    """
+    lib_data = os.urandom(100000)
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+        add_tar_symlink(tf, './librtlsdr.so', 'librtlsdr.so.0')
+        add_tar_symlink(tf, './librtlsdr.so.0', 'librtlsdr.so.0.6.0')
+        add_tar_file(tf, './librtlsdr.so.0.6.0', lib_data)
+        add_tar_file(tf, './rtl_test', b'rtl_test', mode=0o755)
+        add_tar_file(tf, './README', b'readme')
+        add_tar_file(tf, './include/rtl-sdr.h', b'header')
+    archive_file = tmp_path / 'librtlsdr-ubuntu.zip'
+    with zipfile.ZipFile(archive_file, 'w') as zf:
+        zf.writestr('librtlsdr-ubuntu.tar.gz', buf.getvalue())
+    return archive_file, lib_data
+
+
+def test_nested(extract_mod, nested_archive, tmp_path):
+    archive_file, lib_data = nested_archive
+    lib_dir, bin_dir = tmp_path / 'lib', tmp_path / 'bin'
+    for p in [lib_dir, bin_dir]:
+        p.mkdir()
+
+    def select(name):
+        if name.startswith('lib'):
+            return lib_dir
+        elif name.startswith('rtl_'):
+            return bin_dir
+
+    results = extract_mod.extract_selected(archive_file, select)
+    by_name = {f.filename.name: f for f in results}
+    assert set(by_name) == {'librtlsdr.so', 'librtlsdr.so.0', 'librtlsdr.so.0.6.0', 'rtl_test'}
+    assert sorted(p.name for p in lib_dir.iterdir()) == ['librtlsdr.so', 'librtlsdr.so.0', 'librtlsdr.so.0.6.0']
+    assert [p.name for p in bin_dir.iterdir()] == ['rtl_test']
+    assert not (tmp_path / 'README').exists()
+
+    # Symlinks point directly at the real file
+    for name in ['librtlsdr.so', 'librtlsdr.so.0']:
+        f = by_name[name]
+        assert f.is_symlink
+        assert f.symlink_target == 'librtlsdr.so.0.6.0'
+        assert os.readlink(lib_dir / name) == 'librtlsdr.so.0.6.0'
+        assert (lib_dir / name).read_bytes() == lib_data
+    assert not by_name['librtlsdr.so.0.6.0'].is_symlink
+    assert os.stat(bin_dir / 'rtl_test').st_mode & stat.S_IXUSR
+
+
+def test_zip(extract_mod, tmp_path):
+    archive_file = tmp_path / 'librtlsdr-w64.zip'
+    with zipfile.ZipFile(archive_file, 'w') as zf:
+        zf.writestr('librtlsdr.dll', b'dll')
+        zf.writestr('rtl_test.exe', b'exe')
+        zf.writestr('rtl-sdr.h', b'header')
+        zf.writestr('bin/', b'')
+    dest_dir = tmp_path / 'dest'
+    dest_dir.mkdir()
+    def select(name):
+        if name.endswith(('.dll', '.exe')):
+            return dest_dir
+    results = extract_mod.extract_selected(archive_file, select)
+    assert sorted(f.filename.name for f in results) == ['librtlsdr.dll', 'rtl_test.exe']
+    assert (dest_dir / 'librtlsdr.dll').read_bytes() == b'dll'
+    assert sorted(p.name for p in dest_dir.iterdir()) == ['librtlsdr.dll', 'rtl_test.exe']
+
+
+def test_asset_extract_to(nested_archive, http_server, monkeypatch, tmp_path):
+    pytest.importorskip('github')
+    get_releases = import_tool('get_releases')
+    download_mod = import_tool('download')
+    from pyrtlsdrlib import BuildType, FileType
+
+    archive_file, lib_data = nested_archive
+    http_server.files['/ubuntu.zip'] = archive_file.read_bytes()
+
+    class FakeAsset(get_releases.AssetBase):
+        def _get_name(self):
+            return 'librtlsdr-ubuntu.zip'
+        def _get_type(self):
+            return BuildType.from_str('ubuntu')
+        def _get_download_url(self):
+            return http_server.url('/ubuntu.zip')
+
+    monkeypatch.setattr(download_mod, '_download_cache', download_mod.DownloadCache(tmp_path / 'cache'))
+    monkeypatch.setattr(download_mod, '_download_cache_set', True)
+    dest_root = tmp_path / 'build'
+    dest_root.mkdir()
+    files = FakeAsset().extract_to(dest_root)
+    by_name = {f.filename.name: f for f in files}
+    assert by_name['rtl_test'].file_type == FileType.bin
+    assert by_name['librtlsdr.so'].is_symlink
+    assert str(by_name['librtlsdr.so'].symlink_target) == 'librtlsdr.so.0.6.0'
+    lib_dir = dest_root / 'ubuntu' / 'lib'
+    assert (lib_dir / 'librtlsdr.so').read_bytes() == lib_data
+    # The archive is read from the cache in place
+    assert not list((tmp_path / 'cache' / 'tmp').iterdir())
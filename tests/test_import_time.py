@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+import pyrtlsdrlib
+
+PKG_ROOT = Path(pyrtlsdrlib.__file__).resolve().parent.parent
+
+# Cumulative import time allowed for `import pyrtlsdrlib` (in microseconds).
+# The eager import took roughly 45ms on a typical machine.
+IMPORT_BUDGET_US = int(os.environ.get('PYRTLSDRLIB_IMPORT_BUDGET_US', '20000'))
+
+SCRIPT = '''
+import sys, json
+before = set(sys.modules)
+import pyrtlsdrlib
+after = set(sys.modules)
+print(json.dumps(sorted(after - before)))
+'''
+
+def run_import(*args):
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join([str(PKG_ROOT), env.get('PYTHONPATH', '')])
+    return subprocess.run(
+        [sys.executable, *args, '-c', SCRIPT],
+        env=env, check=True, capture_output=True, text=True,
+    )
+
+def test_import_is_lazy():
+    p = run_import()
+    new_modules = json.loads(p.stdout)
+    assert new_modules == ['pyrtlsdrlib']
+
+def test_import_time():
+    # Warm up so bytecode compilation isn't measured
+    run_import()
+    p = run_import('-X', 'importtime')
+    cumulative = None
+    for line in p.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = [f.strip() for f in line.split(':', 1)[1].split('|')]
+        if fields[2] == 'pyrtlsdrlib':
+            cumulative = int(fields[1])
+    assert cumulative is not None
+    assert cumulative < IMPORT_BUDGET_US
+
+def test_lazy_attrs():
+    from pyrtlsdrlib import common, lib
+    assert pyrtlsdrlib.BuildType is common.BuildType
+    assert pyrtlsdrlib.BuildFile is common.BuildFile
+    assert pyrtlsdrlib.load_librtlsdr is lib.load_librtlsdr
+    assert 'load_librtlsdr' in dir(pyrtlsdrlib)
+
+def test_version_checked_on_load(monkeypatch):
+    from pyrtlsdrlib import lib
+    calls = []
+    monkeypatch.setattr(pyrtlsdrlib, '_version_checked', False)
+    monkeypatch.setattr(pyrtlsdrlib, 'check_pyrtlsdr_version', lambda: calls.append(1))
+    monkeypatch.setattr(lib, '_librtlsdr', None)
+    monkeypatch.setattr(lib, '_load_librtlsdr', lambda: None)
+    lib.load_librtlsdr()
+    lib.load_librtlsdr()
+    assert calls == [1]
+
+def test_lazy_submodules():
+    # Run in a new interpreter since the submodules are already imported here
+    script = '''
+import pyrtlsdrlib
+assert pyrtlsdrlib.lib.load_librtlsdr is pyrtlsdrlib.load_librtlsdr
+assert pyrtlsdrlib.common.BuildType is pyrtlsdrlib.BuildType
+assert callable(pyrtlsdrlib.platform.get_os_type)
+'''
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join([str(PKG_ROOT), env.get('PYTHONPATH', '')])
+    subprocess.run([sys.executable, '-c', script], env=env, check=True)
+    assert 'lib' in dir(pyrtlsdrlib)
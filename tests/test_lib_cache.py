@@ -0,0 +1,90 @@
+import threading
+from pathlib import Path
+import pytest
+
+from pyrtlsdrlib import lib as LIB_MODULE
+
+
+class FakeCDLL:
+    opened = []
+    def __init__(self, name):
+        self._name = name
+        self.opened.append(name)
+
+
+@pytest.fixture
+def fake_cdll(monkeypatch, tmp_path):
+    monkeypatch.setenv('PYRTLSDRLIB_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('PYRTLSDRLIB_NO_CACHE', raising=False)
+    monkeypatch.setattr(LIB_MODULE, 'CDLL', FakeCDLL)
+    FakeCDLL.opened = []
+    LIB_MODULE.invalidate_cache()
+    yield FakeCDLL
+    LIB_MODULE.invalidate_cache()
+
+
+def test_load_is_memoized(fake_cdll):
+    if not len(LIB_MODULE.get_library_files()):
+        pytest.skip('No library files for this platform')
+    dll = LIB_MODULE.load_librtlsdr()
+    assert dll is not None
+    assert LIB_MODULE.load_librtlsdr() is dll
+    assert len(fake_cdll.opened) == 1
+
+
+def test_load_threaded(fake_cdll):
+    if not len(LIB_MODULE.get_library_files()):
+        pytest.skip('No library files for this platform')
+    results = []
+    barrier = threading.Barrier(8)
+    def worker():
+        barrier.wait()
+        results.append(LIB_MODULE.load_librtlsdr())
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+    assert len(fake_cdll.opened) == 1
+
+
+def test_disk_cache(fake_cdll, monkeypatch):
+    if not len(LIB_MODULE.get_library_files()):
+        pytest.skip('No library files for this platform')
+    dll = LIB_MODULE.load_librtlsdr()
+    assert LIB_MODULE.get_cache_filename().exists()
+
+    # Simulate a new process: discovery should not be needed
+    LIB_MODULE._librtlsdr = None
+    def fail_discovery():
+        raise AssertionError('Discovery should be skipped')
+    monkeypatch.setattr(LIB_MODULE, '_iter_load_candidates', fail_discovery)
+    dll2 = LIB_MODULE.load_librtlsdr()
+    assert dll2 is not dll
+    assert dll2._name == dll._name
+    # Only the cached file was opened
+    assert fake_cdll.opened == [dll._name, dll._name]
+
+
+def test_reload(fake_cdll):
+    if not len(LIB_MODULE.get_library_files()):
+        pytest.skip('No library files for this platform')
+    dll = LIB_MODULE.load_librtlsdr()
+    dll2 = LIB_MODULE.reload()
+    assert dll2 is not dll
+    assert LIB_MODULE.load_librtlsdr() is dll2
+    LIB_MODULE.invalidate_cache()
+    assert not LIB_MODULE.get_cache_filename().exists()
+
+
+def test_stale_disk_cache(fake_cdll):
+    if not len(LIB_MODULE.get_library_files()):
+        pytest.skip('No library files for this platform')
+    LIB_MODULE.load_librtlsdr()
+    cache_fn = LIB_MODULE.get_cache_filename()
+    cache_fn.write_text('{"key": {}, "filename": "/nonexistent"}')
+    LIB_MODULE._librtlsdr = None
+    dll = LIB_MODULE.load_librtlsdr()
+    assert Path(dll._name).exists()
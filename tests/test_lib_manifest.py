@@ -0,0 +1,131 @@
+import json
+import pytest
+
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib.platform import get_machine, set_os_type, CPU_VARIANTS
+
+
+class FakeCDLL:
+    opened = []
+    def __init__(self, name):
+        self._name = name
+        self.opened.append(name)
+
+
+@pytest.fixture
+def manifest_lib_dir(monkeypatch, tmp_path):
+    key = LIB_MODULE.get_platform_key()
+    if key is None:
+        pytest.skip('No library files for this platform')
+    lib_dir = tmp_path / 'lib'
+    lib_dir.mkdir()
+    monkeypatch.setenv('PYRTLSDRLIB_NO_CACHE', '1')
+    monkeypatch.delenv('PYRTLSDRLIB_CPU_VARIANT', raising=False)
+    monkeypatch.setattr(LIB_MODULE, '_lib_dirs', (lib_dir,))
+    monkeypatch.setattr(LIB_MODULE, 'CDLL', FakeCDLL)
+    FakeCDLL.opened = []
+    LIB_MODULE.invalidate_cache()
+    yield lib_dir, key
+    LIB_MODULE.invalidate_cache()
+
+
+def test_package_manifest(package_lib_root):
+    manifest = LIB_MODULE.read_manifest(package_lib_root)
+    assert manifest is not None
+    for entries in manifest['platforms'].values():
+        for entry in entries:
+            assert (package_lib_root / entry['file']).exists()
+            assert not (package_lib_root / entry['file']).is_symlink()
+
+
+def test_manifest_resolution(manifest_lib_dir):
+    lib_dir, key = manifest_lib_dir
+    lib_glob = LIB_MODULE.BUILD_TYPE_LIB_GLOBS[key]
+    names = [lib_glob.replace('*', suffix) for suffix in ['.other-arch', '.1', '.unlisted']]
+    for name in names:
+        (lib_dir / name).touch()
+    manifest = dict(format=LIB_MODULE.MANIFEST_FORMAT, platforms={
+        key.to_str(): [
+            dict(file=names[0], aliases=[], archs=['not-a-machine'], requires_glibc=False),
+            dict(file=names[1], aliases=[], archs=[get_machine()], requires_glibc=False),
+        ],
+        'unknown': [dict(file='other', aliases=[], archs=None, requires_glibc=False)],
+    })
+    (lib_dir / LIB_MODULE.MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+    # Listed in manifest order; files not in the manifest are ignored
+    assert LIB_MODULE.get_library_files() == [lib_dir / names[0], lib_dir / names[1]]
+
+    # Incompatible entries are skipped without being opened
+    dll = LIB_MODULE.load_librtlsdr()
+    assert FakeCDLL.opened == [str(lib_dir / names[1])]
+    assert dll._name == str(lib_dir / names[1])
+
+
+def test_no_manifest(manifest_lib_dir):
+    lib_dir, key = manifest_lib_dir
+    fn = lib_dir / LIB_MODULE.BUILD_TYPE_LIB_GLOBS[key].replace('*', '.0')
+    fn.touch()
+    assert LIB_MODULE.read_manifest(lib_dir) is None
+    assert LIB_MODULE.get_library_files() == [fn]
+
+    (lib_dir / LIB_MODULE.MANIFEST_FILENAME).write_text('{"format": -1}')
+    LIB_MODULE.invalidate_cache()
+    assert LIB_MODULE.read_manifest(lib_dir) is None
+
+    for platforms in [None, [], 'linux']:
+        manifest = dict(format=LIB_MODULE.MANIFEST_FORMAT, platforms=platforms)
+        if platforms is None:
+            del manifest['platforms']
+        (lib_dir / LIB_MODULE.MANIFEST_FILENAME).write_text(json.dumps(manifest))
+        LIB_MODULE.invalidate_cache()
+        assert LIB_MODULE.read_manifest(lib_dir) is None
+        assert LIB_MODULE.get_library_files() == [fn]
+
+
+@pytest.mark.parametrize('supported', [True, False])
+def test_cpu_variant_dispatch(manifest_lib_dir, monkeypatch, supported):
+    lib_dir, key = manifest_lib_dir
+    variants = [name for name, (machine, _) in CPU_VARIANTS.items() if machine == get_machine()]
+    if not variants:
+        pytest.skip('No CPU variants for this machine')
+    variant = variants[-1]
+    features = ' '.join(CPU_VARIANTS[variant][1]) if supported else 'none'
+    monkeypatch.setenv('PYRTLSDRLIB_CPU_FEATURES', features)
+    set_os_type(None)
+    try:
+        name = LIB_MODULE.BUILD_TYPE_LIB_GLOBS[key].replace('*', '.0')
+        (lib_dir / variant).mkdir()
+        (lib_dir / variant / name).touch()
+        (lib_dir / name).touch()
+        manifest = dict(format=LIB_MODULE.MANIFEST_FORMAT, platforms={
+            key.to_str(): [
+                dict(file=f'{variant}/{name}', aliases=[], archs=None, requires_glibc=False, cpu=variant),
+                dict(file=name, aliases=[], archs=None, requires_glibc=False, cpu=None),
+            ],
+        })
+        (lib_dir / LIB_MODULE.MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+        dll = LIB_MODULE.load_librtlsdr()
+        expected = lib_dir / variant / name if supported else lib_dir / name
+        assert FakeCDLL.opened == [str(expected)]
+        assert dll._name == str(expected)
+    finally:
+        set_os_type(None)
+
+
+def test_resolve_alias(manifest_lib_dir):
+    lib_dir, key = manifest_lib_dir
+    lib_glob = LIB_MODULE.BUILD_TYPE_LIB_GLOBS[key]
+    name, alias = lib_glob.replace('*', '.0.8'), lib_glob.replace('*', '.0')
+    (lib_dir / name).touch()
+    manifest = dict(format=LIB_MODULE.MANIFEST_FORMAT, platforms={
+        key.to_str(): [dict(file=name, aliases=[alias], archs=None, requires_glibc=False)],
+    })
+    (lib_dir / LIB_MODULE.MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+    # The alias is resolved without existing on disk
+    assert not (lib_dir / alias).exists()
+    assert LIB_MODULE.resolve_library_file(alias) == lib_dir / name
+    assert LIB_MODULE.resolve_library_file(name) == lib_dir / name
+    assert LIB_MODULE.resolve_library_file('librtlsdr.missing') is None
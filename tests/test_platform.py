@@ -0,0 +1,122 @@
+import platform
+import pytest
+
+from pyrtlsdrlib import BuildType
+from pyrtlsdrlib import platform as PLATFORM_MODULE
+from pyrtlsdrlib.platform import (
+    get_os_type, set_os_type, get_machine, get_binary_archs, is_library_compatible,
+    get_cpu_variants, requires_glibc, CPU_VARIANTS,
+)
+
+
+@pytest.fixture
+def clean_platform(monkeypatch):
+    monkeypatch.delenv('PYRTLSDRLIB_OS_TYPE', raising=False)
+    monkeypatch.delenv('PYRTLSDRLIB_LIBC', raising=False)
+    monkeypatch.delenv('PYRTLSDRLIB_CPU_FEATURES', raising=False)
+    monkeypatch.delenv('PYRTLSDRLIB_CPU_VARIANT', raising=False)
+    set_os_type(None)
+    yield
+    set_os_type(None)
+
+
+def test_os_type_memoized(clean_platform, monkeypatch):
+    calls = []
+    orig_uname = platform.uname
+    def uname():
+        calls.append(1)
+        return orig_uname()
+    monkeypatch.setattr(PLATFORM_MODULE.platform, 'uname', uname)
+    t = get_os_type()
+    assert get_os_type() is t
+    assert len(calls) == 1
+
+def test_os_type_env_override(clean_platform, monkeypatch):
+    monkeypatch.setenv('PYRTLSDRLIB_OS_TYPE', 'linux|aarch64')
+    def uname():
+        raise AssertionError('Platform should not be probed')
+    monkeypatch.setattr(PLATFORM_MODULE.platform, 'uname', uname)
+    assert get_os_type() == BuildType.linux | BuildType.aarch64
+    assert get_machine() == 'aarch64'
+
+def test_os_type_api_override(clean_platform):
+    set_os_type('windows|w32')
+    assert get_os_type() == BuildType.from_str('windows|w32')
+    assert get_machine() == 'x86'
+    set_os_type(None)
+    assert get_os_type() != BuildType.from_str('windows|w32')
+
+@pytest.mark.parametrize('filename,arch', [
+    ('librtlsdr.so.0.8git', 'x86_64'),
+    ('librtlsdr.0.8git.dylib', 'x86_64'),
+    ('librtlsdr_w32_static.dll', 'x86'),
+    ('librtlsdr_w64_static.dll', 'x86_64'),
+])
+def test_binary_archs(package_lib_root, filename, arch):
+    p = package_lib_root / filename
+    if not p.exists():
+        pytest.skip(f'{filename} not present')
+    assert get_binary_archs(p) == {arch}
+
+def test_library_compatible(clean_platform, package_lib_root, tmp_path):
+    p = package_lib_root / 'librtlsdr_w64_static.dll'
+    if not p.exists():
+        pytest.skip(f'{p.name} not present')
+    set_os_type('windows|w64')
+    assert is_library_compatible(p)
+    set_os_type('linux|aarch64')
+    assert not is_library_compatible(p)
+    unknown = tmp_path / 'librtlsdr.so'
+    unknown.write_bytes(b'not a binary')
+    assert is_library_compatible(unknown)
+
+@pytest.mark.parametrize('head', [
+    b'\x7fELF',
+    b'\x7fELF\x02\x01' + bytes(8),
+    b'\xcf\xfa\xed\xfe',
+    b'\xca\xfe\xba\xbe\x00\x00\x00\x02' + bytes(20),
+    b'MZ' + bytes(16),
+])
+def test_truncated_header(clean_platform, tmp_path, head):
+    fn = tmp_path / 'librtlsdr.so'
+    fn.write_bytes(head)
+    assert not is_library_compatible(fn)
+
+def test_musl_rejects_glibc(clean_platform, monkeypatch, package_lib_root):
+    p = package_lib_root / 'librtlsdr.so.0.8git'
+    if not p.exists():
+        pytest.skip(f'{p.name} not present')
+    assert requires_glibc(p)
+    set_os_type('linux|x86_64')
+    monkeypatch.setenv('PYRTLSDRLIB_LIBC', 'musl')
+    assert not is_library_compatible(p)
+    monkeypatch.setenv('PYRTLSDRLIB_LIBC', 'glibc 2.28')
+    PLATFORM_MODULE._libc = False
+    assert is_library_compatible(p)
+
+
+def test_cpu_variants(clean_platform, monkeypatch):
+    monkeypatch.setenv('PYRTLSDRLIB_OS_TYPE', 'linux|x86_64')
+    v3_flags = ' '.join(CPU_VARIANTS['x86_64_v3'][1])
+    monkeypatch.setenv('PYRTLSDRLIB_CPU_FEATURES', f'fpu {v3_flags}')
+    assert get_cpu_variants() == ('x86_64_v3', 'x86_64_v2')
+
+    monkeypatch.setenv('PYRTLSDRLIB_CPU_VARIANT', 'x86_64_v2')
+    set_os_type(None)
+    assert get_cpu_variants() == ('x86_64_v2',)
+
+    monkeypatch.setenv('PYRTLSDRLIB_CPU_VARIANT', 'generic')
+    set_os_type(None)
+    assert get_cpu_variants() == ()
+
+    # Variants for other machines are never selected
+    monkeypatch.delenv('PYRTLSDRLIB_CPU_VARIANT')
+    monkeypatch.setenv('PYRTLSDRLIB_OS_TYPE', 'linux|aarch64')
+    monkeypatch.setenv('PYRTLSDRLIB_CPU_FEATURES', f'{v3_flags} atomics asimdrdm dcpop')
+    set_os_type(None)
+    assert get_cpu_variants() == ('armv8_2a',)
+
+def test_cpu_features_detect(clean_platform, monkeypatch):
+    text = 'processor\t: 0\nflags\t\t: fpu sse4_2 avx2\n\nprocessor\t: 1\n'
+    monkeypatch.setattr(PLATFORM_MODULE.Path, 'read_text', lambda self: text)
+    assert PLATFORM_MODULE.get_cpu_features() == frozenset({'fpu', 'sse4_2', 'avx2'})
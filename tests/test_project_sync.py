@@ -0,0 +1,86 @@
+import os
+import json
+import pytest
+
+from conftest import import_tool
+
+
+@pytest.fixture
+def get_releases():
+    pytest.importorskip('github')
+    return import_tool('get_releases')
+
+
+def make_build(get_releases, build_dir, tag_name, lib_data):
+    from pyrtlsdrlib import BuildType, FileType, BuildFile
+    lib_dir = build_dir / 'ubuntu' / 'lib'
+    lib_dir.mkdir(parents=True, exist_ok=True)
+    for p in lib_dir.iterdir():
+        p.unlink()
+    real_fn = lib_dir / 'librtlsdr.so.0.6.0'
+    real_fn.write_bytes(lib_data)
+    (lib_dir / 'librtlsdr.so.0').symlink_to(real_fn.name)
+    build_type = BuildType.from_str('ubuntu')
+    build_files = [
+        BuildFile(build_type=build_type, file_type=FileType.lib, filename=real_fn),
+        BuildFile(
+            build_type=build_type, file_type=FileType.lib, filename=lib_dir / 'librtlsdr.so.0',
+            is_symlink=True, symlink_target=real_fn.name,
+        ),
+    ]
+    get_releases.write_build_meta(build_dir, {
+        'ubuntu.zip': dict(tag_name=tag_name, build_files=build_files),
+    })
+
+
+def test_copy_builds_to_project(get_releases, tmp_path):
+    build_dir, dest_dir = tmp_path / 'build', tmp_path / 'project'
+    dest_dir.mkdir()
+    real_fn = dest_dir / 'librtlsdr.so.0.6.0'
+    link_fn = dest_dir / 'librtlsdr.so.0'
+
+    make_build(get_releases, build_dir, 'v0.8.0', b'lib-v1')
+    get_releases.copy_builds_to_project(build_dir, dest_dir)
+    assert real_fn.read_bytes() == b'lib-v1'
+    assert os.readlink(link_fn) == real_fn.name
+    meta = get_releases.read_build_meta(dest_dir)['ubuntu.zip']
+    assert meta[real_fn.name]['sha256'] == get_releases.get_file_sha256(real_fn)
+    assert sorted(p.name for p in dest_dir.iterdir()) == [
+        'build-meta.json', 'lib-manifest.json', link_fn.name, real_fn.name,
+    ]
+
+    manifest = json.loads((dest_dir / 'lib-manifest.json').read_text())
+    assert manifest['platforms']['ubuntu'] == [dict(
+        file=real_fn.name, aliases=[link_fn.name], archs=None, requires_glibc=False, cpu=None,
+    )]
+
+    # Same content under a new tag: only the metadata changes
+    ino = real_fn.stat().st_ino
+    make_build(get_releases, build_dir, 'v0.9.0', b'lib-v1')
+    get_releases.copy_builds_to_project(build_dir, dest_dir)
+    assert real_fn.stat().st_ino == ino
+    meta = get_releases.read_build_meta(dest_dir)['ubuntu.zip']
+    assert meta[real_fn.name]['tag_name'] == 'v0.9.0'
+
+    # Rebuild of the same tag with new content: the file is replaced
+    make_build(get_releases, build_dir, 'v0.9.0', b'lib-v2')
+    get_releases.copy_builds_to_project(build_dir, dest_dir)
+    assert real_fn.read_bytes() == b'lib-v2'
+    assert link_fn.read_bytes() == b'lib-v2'
+    assert real_fn.stat().st_ino != ino
+    assert not [p for p in dest_dir.iterdir() if p.name.startswith('.staging')]
+
+
+def test_clone_file(get_releases, tmp_path):
+    src = tmp_path / 'src'
+    src.write_bytes(b'data')
+    dest = tmp_path / 'dest'
+    method = get_releases.clone_file(src, dest)
+    assert method in ('reflink', 'copy')
+    assert dest.read_bytes() == b'data'
+    assert dest.stat().st_ino != src.stat().st_ino
+
+    # Build trees are modified in place by incremental builds
+    with open(src, 'r+b') as fd:
+        fd.write(b'DATA')
+    assert dest.read_bytes() == b'data'
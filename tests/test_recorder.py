@@ -0,0 +1,72 @@
+import os
+import json
+import mmap
+import time
+import pytest
+
+from pyrtlsdrlib.recorder import IQRecorder
+from pyrtlsdrlib.stream import AsyncReader
+
+from conftest import FakeAsyncLib
+
+
+def test_write_across_windows(tmp_path):
+    fn = tmp_path / 'capture.sigmf-data'
+    window_size = mmap.ALLOCATIONGRANULARITY * 2
+    chunks = [os.urandom(n) for n in [100, window_size, window_size * 3 + 7, 1]]
+    with IQRecorder(fn, sample_rate=2.4e6, center_freq=100e6, window_size=window_size) as rec:
+        assert rec.meta_filename.exists()
+        for chunk in chunks:
+            rec.write(chunk)
+        assert fn.stat().st_size >= rec.num_bytes
+    expected = b''.join(chunks)
+    assert rec.num_bytes == len(expected)
+    assert rec.num_samples == len(expected) // 2
+    assert fn.read_bytes() == expected
+    with pytest.raises(ValueError):
+        rec.write(b'foo')
+
+def test_metadata(tmp_path):
+    fn = tmp_path / 'capture.sigmf-data'
+    with IQRecorder(fn, 2.048e6, 433.92e6, metadata={'core:hw': 'rtl-sdr'}) as rec:
+        rec.write(b'\x80' * 1024)
+    meta = json.loads(rec.meta_filename.read_text())
+    assert rec.meta_filename == tmp_path / 'capture.sigmf-meta'
+    assert meta['global']['core:datatype'] == 'cu8'
+    assert meta['global']['core:sample_rate'] == 2.048e6
+    assert meta['global']['core:hw'] == 'rtl-sdr'
+    capture = meta['captures'][0]
+    assert capture['core:frequency'] == 433.92e6
+    assert capture['core:datetime'].endswith('Z')
+
+def test_empty(tmp_path):
+    fn = tmp_path / 'capture.sigmf-data'
+    IQRecorder(fn, 2.4e6, 100e6).close()
+    assert fn.stat().st_size == 0
+
+def test_fed_from_reader(tmp_path):
+    lib = FakeAsyncLib(num_blocks=64, buf_len=16384)
+    fn = tmp_path / 'capture.sigmf-data'
+    reader = AsyncReader(1, dll=lib)
+    with IQRecorder(fn, 2.4e6, 100e6, window_size=1 << 18) as rec:
+        reader.add_consumer(rec)
+        reader.run()
+    data = fn.read_bytes()
+    assert len(data) == 64 * 16384
+    for i in range(64):
+        assert data[i * 16384] == i
+
+def test_bench_write(tmp_path, bench_report):
+    block = os.urandom(262144)
+    num_blocks = 256
+    fn = tmp_path / 'capture.sigmf-data'
+    start_ts = time.perf_counter()
+    with IQRecorder(fn, 2.4e6, 100e6) as rec:
+        t = time.perf_counter()
+        for _ in range(num_blocks):
+            rec.write(block)
+        t_write = time.perf_counter() - t
+    elapsed = time.perf_counter() - start_ts
+    nbytes = len(block) * num_blocks
+    bench_report('recorder', callback_mb_per_s=nbytes / t_write / 1e6, total_mb_per_s=nbytes / elapsed / 1e6)
+    assert fn.stat().st_size == nbytes
@@ -0,0 +1,115 @@
+"""Benchmarks using the simulated librtlsdr (see the ``sim_lib`` fixture)
+
+Timings are reported through the ``bench_report`` fixture. Only the results
+(block counts and dropped buffers) are asserted, since wall-clock thresholds
+would fail on slow or loaded machines.
+"""
+import time
+from ctypes import c_uint64, c_void_p
+import pytest
+
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib.stream import AsyncReader
+from pyrtlsdrlib.bindings import bind_function, get_bindings
+
+BUF_LEN = 16384
+
+
+def get_dropped(dll, dev) -> int:
+    return bind_function(dll, 'rtlsdr_sim_get_dropped', (c_uint64, (c_void_p,)))(dev)
+
+
+def read_blocks(dll, dev, num_blocks, consumer=None, buf_num=4):
+    """Read *num_blocks* blocks and return the elapsed time
+    """
+    reader = AsyncReader(dev, dll=dll, buf_num=buf_num, buf_len=BUF_LEN)
+    def on_block(block):
+        if consumer is not None:
+            consumer(block)
+        if reader.blocks_read >= num_blocks:
+            reader.cancel()
+    reader.add_consumer(on_block)
+    start_ts = time.perf_counter()
+    reader.run()
+    elapsed = time.perf_counter() - start_ts
+    assert reader.blocks_read >= num_blocks
+    return elapsed, reader.blocks_read
+
+
+def test_sim_symbols(sim_lib, sim_dev):
+    lib = get_bindings(sim_lib)
+    assert not len(lib.missing)
+    assert lib.rtlsdr_get_device_count() == 1
+    assert lib.rtlsdr_set_sample_rate(sim_dev, 2400000) == 0
+    assert lib.rtlsdr_get_sample_rate(sim_dev) == 2400000
+    assert lib.rtlsdr_set_sample_rate(sim_dev, 500000) < 0
+    assert lib.rtlsdr_get_tuner_gains(sim_dev, None) == 29
+
+
+def test_bench_load_time(sim_lib_dir, monkeypatch, tmp_path, bench_report):
+    monkeypatch.setenv('PYRTLSDRLIB_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('PYRTLSDRLIB_NO_CACHE', raising=False)
+    monkeypatch.setattr(LIB_MODULE, '_lib_dirs', (sim_lib_dir,))
+    try:
+        LIB_MODULE.invalidate_cache()
+        start_ts = time.perf_counter()
+        assert LIB_MODULE.load_librtlsdr() is not None
+        cold = time.perf_counter() - start_ts
+        assert LIB_MODULE.get_cache_filename().exists()
+
+        # New process with a populated disk cache
+        LIB_MODULE._librtlsdr = None
+        start_ts = time.perf_counter()
+        assert LIB_MODULE.load_librtlsdr() is not None
+        disk_cached = time.perf_counter() - start_ts
+
+        n = 10000
+        start_ts = time.perf_counter()
+        for _ in range(n):
+            LIB_MODULE.load_librtlsdr()
+        memoized = (time.perf_counter() - start_ts) / n
+    finally:
+        LIB_MODULE.invalidate_cache()
+    bench_report('load time', cold_us=cold*1e6, disk_cached_us=disk_cached*1e6, memoized_us=memoized*1e6)
+
+
+def test_bench_callback_throughput(sim_lib, sim_dev, monkeypatch, bench_report):
+    monkeypatch.setenv('RTLSDR_SIM_RATE', '0')
+    elapsed, num_blocks = read_blocks(sim_lib, sim_dev, 2000)
+    rate = num_blocks * BUF_LEN / elapsed / 1e6
+    bench_report('callback throughput', mb_per_s=rate, us_per_block=elapsed/num_blocks*1e6)
+    assert num_blocks >= 2000
+    assert get_dropped(sim_lib, sim_dev) == 0
+
+
+def test_bench_conversion_throughput(sim_lib, sim_dev, monkeypatch, bench_report):
+    np = pytest.importorskip('numpy')
+    from pyrtlsdrlib.convert import Converter
+    monkeypatch.setenv('RTLSDR_SIM_RATE', '0')
+    conv = Converter('cf32', BUF_LEN)
+    results = []
+    def consumer(block):
+        results.append(conv(block.view)[0])
+    elapsed, num_blocks = read_blocks(sim_lib, sim_dev, 1000, consumer)
+    rate = num_blocks * BUF_LEN / 2 / elapsed / 1e6
+    bench_report('cf32 conversion throughput', ms_per_s=rate)
+    assert len(results) == num_blocks
+    assert np.abs(np.abs(conv.out) - 100 / 127.5).max() < .02
+    assert get_dropped(sim_lib, sim_dev) == 0
+
+
+def test_dropped_buffers(sim_lib, sim_dev, monkeypatch, bench_report):
+    monkeypatch.delenv('RTLSDR_SIM_RATE', raising=False)
+    buf_duration = BUF_LEN / 2 / 2048000
+
+    # A consumer which keeps up should not cause drops
+    read_blocks(sim_lib, sim_dev, 50, buf_num=16)
+    assert get_dropped(sim_lib, sim_dev) == 0
+
+    # One which takes longer than the driver's buffers can absorb should
+    def slow_consumer(block):
+        time.sleep(buf_duration * 8)
+    read_blocks(sim_lib, sim_dev, 8, slow_consumer, buf_num=4)
+    dropped = get_dropped(sim_lib, sim_dev)
+    bench_report('slow consumer', dropped_buffers=dropped)
+    assert dropped > 0
@@ -0,0 +1,79 @@
+import time
+import ctypes
+import pytest
+
+from pyrtlsdrlib.stream import AsyncReader, SampleBlock
+
+from conftest import FakeAsyncLib
+
+
+def test_blocks_delivered(fake_async_lib):
+    reader = AsyncReader(1, dll=fake_async_lib)
+    received = []
+    def consumer(block):
+        assert isinstance(block, SampleBlock)
+        assert block.view.readonly
+        received.append((block.index, block.nbytes, block.view[0]))
+    reader.add_consumer(consumer)
+    reader.run()
+    assert received == [(i, 16384, i) for i in range(8)]
+    assert reader.blocks_read == 8
+
+def test_block_released_after_callback(fake_async_lib):
+    reader = AsyncReader(1, dll=fake_async_lib)
+    blocks = []
+    reader.add_consumer(blocks.append)
+    reader.run()
+    with pytest.raises(ValueError):
+        blocks[0].view
+
+def test_retain(fake_async_lib):
+    reader = AsyncReader(1, dll=fake_async_lib)
+    retained = []
+    reader.add_consumer(lambda block: retained.append(block.retain()))
+    reader.run()
+    assert [bytes(b.view[:2]) for b in retained] == [bytes([i, i]) for i in range(8)]
+
+def test_as_array_requires_retain(fake_async_lib):
+    np = pytest.importorskip('numpy')
+    reader = AsyncReader(1, dll=fake_async_lib)
+    arrays = []
+    def consumer(block):
+        with pytest.raises(ValueError):
+            block.as_array()
+        retained = block.retain()
+        arr = retained.as_array()
+        assert arr.dtype == np.uint8
+        assert arr.size == block.nbytes
+        # Views the retained copy
+        assert arr.__array_interface__['data'][0] != ctypes.addressof(fake_async_lib.buffers[0])
+        arrays.append(arr)
+        retained.release()
+    reader.add_consumer(consumer)
+    reader.run()
+    # Still valid after the driver buffers were reused and the blocks released
+    assert [int(arr[0]) for arr in arrays] == list(range(8))
+
+def test_consumer_exception_cancels():
+    lib = FakeAsyncLib(num_blocks=None)
+    reader = AsyncReader(1, dll=lib)
+    def consumer(block):
+        if block.index == 3:
+            raise KeyError('foo')
+    reader.add_consumer(consumer)
+    with pytest.raises(KeyError):
+        reader.run()
+    assert lib.cancelled
+    assert reader.blocks_read == 4
+
+def test_start_stop():
+    lib = FakeAsyncLib(num_blocks=None)
+    reader = AsyncReader(1, dll=lib)
+    count = []
+    reader.add_consumer(lambda block: count.append(block.index))
+    t = reader.start()
+    while len(count) < 10:
+        time.sleep(.001)
+    reader.stop(timeout=5)
+    assert not t.is_alive()
+    assert lib.cancelled
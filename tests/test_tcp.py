@@ -0,0 +1,146 @@
+import time
+import struct
+import asyncio
+import pytest
+
+from pyrtlsdrlib.tcp import Command, DongleInfo, RtlTcpClient
+
+
+class FakeRtlTcpServer:
+    """Stand-in for rtl_tcp which streams a counter pattern
+
+    Byte *i* of the stream is ``i & 0xff``. Data is written in chunks of
+    *chunk_size* (which need not align with the client's blocks).
+    """
+    def __init__(self, num_bytes: int|None = 1 << 20, chunk_size: int = 1000, magic: bytes = b'RTL0'):
+        self.num_bytes = num_bytes
+        self.chunk_size = chunk_size
+        self.magic = magic
+        self.commands = []
+        self.commands_received = asyncio.Event()
+        self.server = None
+        self.port = None
+        self._pattern = bytes(range(256)) * (chunk_size // 256 + 2)
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *args):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        writer.write(struct.pack('>4sII', self.magic, 5, 29))
+        cmd_task = asyncio.create_task(self._read_commands(reader))
+        pos = 0
+        try:
+            while self.num_bytes is None or pos < self.num_bytes:
+                n = self.chunk_size
+                if self.num_bytes is not None:
+                    n = min(n, self.num_bytes - pos)
+                offset = pos % 256
+                writer.write(self._pattern[offset:offset+n])
+                pos += n
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            cmd_task.cancel()
+            writer.close()
+
+    async def _read_commands(self, reader):
+        while True:
+            data = await reader.readexactly(5)
+            self.commands.append(struct.unpack('>BI', data))
+            self.commands_received.set()
+
+
+def test_stream():
+    async def run():
+        async with FakeRtlTcpServer(num_bytes=100000) as server:
+            async with RtlTcpClient(port=server.port, block_size=4096, num_buffers=2) as client:
+                assert client.dongle_info == DongleInfo(tuner_type=5, gain_count=29)
+                blocks = []
+                async for block in client:
+                    blocks.append((block.index, bytes(block.view)))
+        return blocks
+    blocks = asyncio.run(run())
+    assert [i for i, _ in blocks] == list(range(len(blocks)))
+    assert [len(b) for _, b in blocks] == [4096] * 24 + [100000 - 4096 * 24]
+    data = b''.join(b for _, b in blocks)
+    assert data == bytes(i & 0xff for i in range(100000))
+
+def test_blocks_released_on_reuse():
+    async def run():
+        async with FakeRtlTcpServer() as server:
+            async with RtlTcpClient(port=server.port, block_size=1024, num_buffers=2) as client:
+                b0 = await client.read_block()
+                retained = b0.retain()
+                b1 = await client.read_block()
+                b0.view
+                b2 = await client.read_block()
+                with pytest.raises(ValueError):
+                    b0.view
+                assert b1.view[0] == 0
+                assert retained.view[1] == 1
+                with pytest.raises(TypeError):
+                    b2.view[0] = 1
+            with pytest.raises(ValueError):
+                b2.view
+    asyncio.run(run())
+
+def test_commands():
+    async def run():
+        async with FakeRtlTcpServer(num_bytes=None) as server:
+            async with RtlTcpClient(port=server.port) as client:
+                await client.set_center_freq(1_090_000_000)
+                await client.set_sample_rate(2_400_000)
+                await client.set_gain_mode(True)
+                await client.set_gain(496)
+                await client.set_freq_correction(-5)
+                await client.set_if_gain(2, 30)
+                await client.set_bias_tee(True)
+                while len(server.commands) < 7:
+                    server.commands_received.clear()
+                    await asyncio.wait_for(server.commands_received.wait(), 5)
+        return server.commands
+    commands = asyncio.run(run())
+    assert commands == [
+        (Command.SET_FREQUENCY, 1_090_000_000),
+        (Command.SET_SAMPLE_RATE, 2_400_000),
+        (Command.SET_GAIN_MODE, 1),
+        (Command.SET_GAIN, 496),
+        (Command.SET_FREQ_CORRECTION, 0xfffffffb),
+        (Command.SET_IF_GAIN, (2 << 16) | 30),
+        (Command.SET_BIAS_TEE, 1),
+    ]
+
+def test_invalid_header():
+    async def run():
+        async with FakeRtlTcpServer(magic=b'FOO0') as server:
+            client = RtlTcpClient(port=server.port)
+            with pytest.raises(ValueError):
+                await client.connect()
+            assert not client.connected
+    asyncio.run(run())
+
+def test_bench_throughput(bench_report):
+    block_size = 262144
+    num_bytes = 256 * block_size
+    async def run():
+        async with FakeRtlTcpServer(num_bytes=num_bytes, chunk_size=65536) as server:
+            async with RtlTcpClient(port=server.port, block_size=block_size) as client:
+                start_ts = time.perf_counter()
+                nbytes = 0
+                async for block in client:
+                    nbytes += block.nbytes
+                elapsed = time.perf_counter() - start_ts
+        return nbytes, elapsed
+    nbytes, elapsed = asyncio.run(run())
+    assert nbytes == num_bytes
+    rate = nbytes / elapsed / 1e6
+    bench_report('rtl_tcp client throughput', mb_per_s=rate)
+    # One dongle at 2.4 MS/s produces 4.8 MB/s
+    assert rate > 4.8 * 4
@@ -0,0 +1,159 @@
+import time
+import socket
+from ctypes import byref, c_int, c_uint32, c_void_p
+import pytest
+
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib.bindings import bind_function
+from pyrtlsdrlib.udp import UdpControlClient, format_command
+
+from conftest import import_tool
+
+
+class FakeCDLL:
+    opened = []
+    def __init__(self, name):
+        self._name = name
+        self.opened.append(name)
+
+
+@pytest.fixture
+def udpsrv_lib_dir(monkeypatch, tmp_path):
+    lib_glob = LIB_MODULE._get_lib_glob()
+    if lib_glob is None:
+        pytest.skip('No library files for this platform')
+    monkeypatch.setattr(LIB_MODULE, '_lib_dirs', (tmp_path,))
+    monkeypatch.setattr(LIB_MODULE, 'is_library_compatible', lambda p: True)
+    monkeypatch.setattr(LIB_MODULE, 'CDLL', FakeCDLL)
+    monkeypatch.setenv('PYRTLSDRLIB_NO_CACHE', '1')
+    monkeypatch.delenv('PYRTLSDRLIB_UDPSRV', raising=False)
+    FakeCDLL.opened = []
+    LIB_MODULE.invalidate_cache()
+    yield tmp_path, lib_glob.replace('*', '.0')
+    LIB_MODULE.invalidate_cache()
+
+
+# The simulated librtlsdr built with its UDP server (see tools/simlib)
+@pytest.fixture(scope='session')
+def sim_udpsrv_lib_dir(tmp_path_factory):
+    import shutil
+    import sys
+    if sys.platform == 'win32':
+        pytest.skip('The simulated UDP server is POSIX only')
+    if shutil.which('cmake') is None or shutil.which('make') is None:
+        pytest.skip('cmake and make are required to build the simulated library')
+    SimBuilder = import_tool('build_from_source').SimBuilder
+    lib_dest = tmp_path_factory.mktemp('sim_udpsrv_lib')
+    with SimBuilder(lib_dest, udpsrv=True) as builder:
+        builder.build()
+    return lib_dest
+
+
+@pytest.fixture
+def udpsrv_dev(sim_udpsrv_lib_dir, monkeypatch):
+    monkeypatch.setattr(LIB_MODULE, '_lib_dirs', (sim_udpsrv_lib_dir,))
+    monkeypatch.setenv('PYRTLSDRLIB_NO_CACHE', '1')
+    monkeypatch.setenv('PYRTLSDRLIB_UDPSRV', '1')
+    # Let the server pick a free port
+    monkeypatch.setenv('RTLSDR_SIM_UDP_PORT', '0')
+    dll = LIB_MODULE.reload()
+    assert dll is not None
+    dev = c_void_p()
+    assert bind_function(dll, 'rtlsdr_open')(byref(dev), 0) == 0
+    get_port = bind_function(dll, 'rtlsdr_sim_get_udp_port', (c_int, (c_void_p,)))
+    port = get_port(dev)
+    assert port > 0
+    yield dll, dev, port
+    bind_function(dll, 'rtlsdr_close')(dev)
+    monkeypatch.delenv('PYRTLSDRLIB_UDPSRV')
+    LIB_MODULE.invalidate_cache()
+
+
+def test_format_command():
+    assert format_command('f', 100e6) == b'f 100000000'
+    assert format_command('s', 0x05, 0x10, 0xf0) == b's 5 16 240'
+    with pytest.raises(ValueError):
+        format_command('x', 1)
+
+def test_commands(udpsrv_dev):
+    dll, dev, port = udpsrv_dev
+    get_center_freq = bind_function(dll, 'rtlsdr_get_center_freq')
+    get_if_freq = bind_function(dll, 'rtlsdr_sim_get_if_freq', (c_uint32, (c_void_p,)))
+    with UdpControlClient(port=port) as ctrl:
+        ctrl.set_center_freq(101_100_000)
+        ctrl.set_if_freq(3_570_000)
+        ctrl.set_register(0x05, 0xa5)
+        # Commands are handled in order, so the reply means the ones
+        # before it have been applied
+        assert ctrl.get_register(0x05) == 0xa5
+        assert get_center_freq(dev) == 101_100_000
+        assert get_if_freq(dev) == 3_570_000
+
+        ctrl.set_register(0x05, 0x0f, 0x3c)
+        assert ctrl.get_register(0x05) == 0xa5 & ~0x3c | 0x0f & 0x3c
+        assert ctrl.get_register(0x06) == 0
+
+        with pytest.raises(ValueError):
+            ctrl.request('g', 256)
+        # The error reply to an unanswered command must not be taken
+        # as the reply to the next request
+        ctrl.set_register(256, 0)
+        assert ctrl.get_register(0x05) == 0xa5 & ~0x3c | 0x0f & 0x3c
+    with pytest.raises(ValueError):
+        ctrl.set_center_freq(1)
+
+def test_request_timeout():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind(('127.0.0.1', 0))
+        with UdpControlClient(port=silent.getsockname()[1], timeout=.1) as ctrl:
+            with pytest.raises(TimeoutError):
+                ctrl.get_register(0)
+
+def test_bench_retune(udpsrv_dev, bench_report):
+    n = 500
+    dll, dev, port = udpsrv_dev
+    get_center_freq = bind_function(dll, 'rtlsdr_get_center_freq')
+    batch_size = 100
+    elapsed = 0
+    with UdpControlClient(port=port) as ctrl:
+        for batch_start in range(0, n, batch_size):
+            start_ts = time.perf_counter()
+            for i in range(batch_start, batch_start + batch_size):
+                ctrl.set_center_freq(100_000_000 + i * 1000)
+            elapsed += time.perf_counter() - start_ts
+            # Wait for the server to catch up so its receive buffer can't overflow
+            ctrl.get_register(0)
+    assert get_center_freq(dev) == 100_000_000 + (n-1) * 1000
+    bench_report('udp retune', us_per_command=elapsed / n * 1e6)
+
+def test_udpsrv_library_files(udpsrv_lib_dir):
+    lib_dir, lib_name = udpsrv_lib_dir
+    assert LIB_MODULE.get_udpsrv_library_files() == []
+    udpsrv_dir = lib_dir / LIB_MODULE.UDPSRV_DIRNAME
+    udpsrv_dir.mkdir()
+    fn = udpsrv_dir / lib_name
+    fn.touch()
+    (lib_dir / lib_name).touch()
+    # Symlinks to the versioned library are skipped
+    (udpsrv_dir / lib_name.replace('.0', '')).symlink_to(fn.name)
+    assert LIB_MODULE.get_udpsrv_library_files() == [fn]
+    assert LIB_MODULE.get_library_files() == [lib_dir / lib_name]
+
+def test_load_udpsrv(udpsrv_lib_dir, monkeypatch):
+    lib_dir, lib_name = udpsrv_lib_dir
+    (lib_dir / lib_name).touch()
+    assert LIB_MODULE.load_librtlsdr()._name == str(lib_dir / lib_name)
+
+    monkeypatch.setenv('PYRTLSDRLIB_UDPSRV', '1')
+    assert LIB_MODULE.reload() is None
+
+    udpsrv_dir = lib_dir / LIB_MODULE.UDPSRV_DIRNAME
+    udpsrv_dir.mkdir()
+    (udpsrv_dir / lib_name).touch()
+    assert LIB_MODULE.reload()._name == str(udpsrv_dir / lib_name)
+
+def test_udpsrv_cache_key(monkeypatch):
+    monkeypatch.delenv('PYRTLSDRLIB_UDPSRV', raising=False)
+    key = LIB_MODULE._get_cache_key()
+    monkeypatch.setenv('PYRTLSDRLIB_UDPSRV', '1')
+    assert LIB_MODULE._get_cache_key() != key
@@ -0,0 +1,98 @@
+import shutil
+import zlib
+import pytest
+
+from pyrtlsdrlib import BuildType
+from pyrtlsdrlib import lib as LIB_MODULE
+from pyrtlsdrlib import platform as PLATFORM_MODULE
+
+from conftest import import_tool
+
+# Maximum compressed size (bytes) of the libraries packaged in each wheel
+SIZE_BUDGETS = {
+    'macos': 64_000,
+    'win32': 192_000,
+    'win64': 192_000,
+    'linux': 80_000,
+}
+
+MANIFEST_KEYS = {
+    'macos': BuildType.macos,
+    'win32': BuildType.windows | BuildType.w32,
+    'win64': BuildType.windows | BuildType.w64,
+    'linux': BuildType.linux,
+}
+
+
+@pytest.fixture(scope='module')
+def build_wheels():
+    pytest.importorskip('click')
+    return import_tool('build_wheels')
+
+
+@pytest.fixture(scope='module')
+def staged_tree(build_wheels, tmp_path_factory):
+    tree_dir = tmp_path_factory.mktemp('wheel-size') / 'tree'
+    build_wheels.stage_source(tree_dir)
+    return tree_dir
+
+
+@pytest.fixture(scope='module')
+def setup_mod(build_wheels, staged_tree):
+    return build_wheels.load_setup_module(staged_tree)
+
+
+@pytest.mark.parametrize('os_type', list(SIZE_BUDGETS))
+def test_one_file_per_library(setup_mod, staged_tree, package_lib_root, os_type):
+    manifest = LIB_MODULE.read_manifest(package_lib_root)
+    entries = manifest['platforms'].get(MANIFEST_KEYS[os_type].to_str(), [])
+    # The package data used by setup.py for the wheel
+    lib_files = setup_mod.get_package_lib_files(os_type, staged_tree)['pyrtlsdrlib.lib']
+    assert sorted(lib_files) == sorted(entry['file'] for entry in entries)
+    aliases = {alias for entry in entries for alias in entry['aliases']}
+    assert not aliases & set(lib_files)
+
+
+def test_wheel_lib_files(build_wheels, setup_mod, tmp_path):
+    tree_dir = tmp_path / 'tree'
+    platform_fn = tree_dir / 'src' / 'pyrtlsdrlib' / 'platform.py'
+    platform_fn.parent.mkdir(parents=True)
+    shutil.copy2(setup_mod.__file__, tree_dir / 'setup.py')
+    shutil.copy2(PLATFORM_MODULE.__file__, platform_fn)
+    custom_dir = tree_dir / 'src' / 'pyrtlsdrlib' / 'lib' / 'custom_build'
+    expected = [
+        custom_dir.parent / 'librtlsdr.so.0.8',
+        custom_dir.parent / 'x86_64_v3' / 'librtlsdr.so.0.8',
+        custom_dir / 'librtlsdr.so.0.8',
+        custom_dir / 'udpsrv' / 'librtlsdr.so.0.8',
+        custom_dir / 'x86_64_v3' / 'librtlsdr.so.0.8',
+    ]
+    for fn in expected:
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        fn.touch()
+    (custom_dir.parent / 'librtlsdr.so.0').symlink_to('librtlsdr.so.0.8')
+    (custom_dir / 'other' / 'librtlsdr.so.0.8').parent.mkdir()
+    (custom_dir / 'other' / 'librtlsdr.so.0.8').touch()
+
+    # Each file once (custom_build is not searched again from lib/)
+    lib_files = list(build_wheels.iter_wheel_lib_files(tree_dir, 'linux'))
+    assert sorted(lib_files) == sorted(expected)
+
+
+@pytest.mark.parametrize('os_type', list(SIZE_BUDGETS))
+def test_size_budget(build_wheels, staged_tree, tmp_path, os_type, bench_report):
+    lib_files = list(build_wheels.iter_wheel_lib_files(staged_tree, os_type))
+    if not len(lib_files):
+        pytest.skip(f'No {os_type} libraries')
+    total = 0
+    for lib_file in lib_files:
+        fn = tmp_path / lib_file.name
+        shutil.copy2(lib_file, fn)
+        if build_wheels.find_objcopy(build_wheels.get_binary_format(fn)) is None:
+            pytest.skip(f'No objcopy available to strip {fn.name}')
+        debug_fn = tmp_path / f'{fn.name}.debug'
+        assert build_wheels.strip_library(fn, debug_fn)
+        assert fn.stat().st_size <= lib_file.stat().st_size
+        total += len(zlib.compress(fn.read_bytes(), 6))
+    bench_report(f'{os_type} wheel libraries', compressed_kb=total/1e3, budget_kb=SIZE_BUDGETS[os_type]/1e3)
+    assert total <= SIZE_BUDGETS[os_type]
@@ -1,30 +1,178 @@
 from __future__ import annotations
 import typing as tp
 import os
+import time
 import shutil
+import filecmp
 import tempfile
 from pathlib import Path
 import subprocess
 import shlex
 from loguru import logger
+import click
 
 from pyrtlsdrlib import BuildType, FileType, BuildFile
-from pyrtlsdrlib.platform import get_os_type
+from pyrtlsdrlib.platform import CPU_VARIANTS, get_os_type, get_machine
+from pyrtlsdrlib.lib import UDPSRV_DIRNAME
 
 from common import *
+from manifest import write_manifest
 
 OS_TYPE = get_os_type()
+SIM_SOURCE_DIR = Path(__file__).resolve().parent / 'simlib'
+SIM_LIB_DIR = ROOT_DIR / 'build' / 'simlib'
+"""Default destination of the simulated library. This is kept out of
+``custom_build`` so it can't shadow a real build or be packaged in wheels
+"""
+COMPILER_LAUNCHERS = ['ccache', 'sccache']
+CONFIGURE_STAMP = '.pyrtlsdrlib-configure'
+
+CPU_VARIANT_FLAGS = {
+    'x86_64_v2': '-march=x86-64-v2',
+    'x86_64_v3': '-march=x86-64-v3',
+    'x86_64_v4': '-march=x86-64-v4',
+    'armv8_2a': '-march=armv8.2-a',
+}
+"""Compiler flags (gcc/clang) for each of the CPU variants"""
+
+SOURCE_STAMP = 'source-sha256'
 
 def sh(cmd_str, check=True, **kwargs):
     logger.debug(f'$ {cmd_str}')
     return subprocess.run(shlex.split(cmd_str), check=check, **kwargs)
 
+def get_num_jobs() -> int:
+    """Number of CPUs available to this process
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+def get_default_generator() -> str|None:
+    """``"Ninja"`` if ninja is installed, otherwise ``None`` (the cmake default)
+    """
+    if shutil.which('ninja') is not None:
+        return 'Ninja'
+    return None
+
+def get_default_compiler_launcher() -> str|None:
+    for name in COMPILER_LAUNCHERS:
+        if shutil.which(name) is not None:
+            return name
+    return None
+
+def get_host_cpu_variants(names: tp.Iterable[str]) -> tp.List[str]:
+    """Filter the :data:`~pyrtlsdrlib.platform.CPU_VARIANTS` *names* to those
+    which can be built for the host machine
+
+    Raises :class:`click.UsageError` if any are given on a non-Linux host.
+    CPU features are only detected on Linux
+    (see :func:`~pyrtlsdrlib.platform.get_cpu_variants`), so variants built
+    for other platforms would never be loaded.
+    """
+    names = list(names)
+    if len(names) and not OS_TYPE & 'linux':
+        raise click.UsageError('CPU variants can only be built on Linux')
+    machine = get_machine()
+    result = []
+    for name in names:
+        if CPU_VARIANTS[name][0] != machine:
+            logger.warning(f'Skipping CPU variant "{name}" (not a {machine} variant)')
+            continue
+        result.append(name)
+    return result
+
+def sync_tree(src: Path, dest: Path) -> int:
+    """Make *dest* a copy of *src*, leaving identical files untouched
+
+    Unchanged files keep their timestamps, so a build in a persistent build
+    directory only recompiles what actually changed.
+
+    Returns the number of files copied or removed.
+    """
+    num_changed = 0
+    dest.mkdir(parents=True, exist_ok=True)
+    src_names = {p.name for p in src.iterdir()}
+    for p in dest.iterdir():
+        if p.name not in src_names:
+            if p.is_dir() and not p.is_symlink():
+                shutil.rmtree(p)
+            else:
+                p.unlink()
+            num_changed += 1
+    for src_p in src.iterdir():
+        dest_p = dest / src_p.name
+        if src_p.is_dir() and not src_p.is_symlink():
+            if dest_p.exists() and not dest_p.is_dir():
+                dest_p.unlink()
+            num_changed += sync_tree(src_p, dest_p)
+        elif dest_p.is_file() and not dest_p.is_symlink() and filecmp.cmp(src_p, dest_p, shallow=False):
+            continue
+        else:
+            if dest_p.is_dir() and not dest_p.is_symlink():
+                shutil.rmtree(dest_p)
+            shutil.copy2(src_p, dest_p, follow_symlinks=False)
+            num_changed += 1
+    return num_changed
+
 class Builder:
-    def __init__(self, release, asset, lib_dest: Path, macos_arch: str|None = None):
+    """Builds librtlsdr from a source release asset
+
+    Arguments:
+        release: The :class:`~get_releases.Release`
+        asset: The source asset (see :class:`~get_releases.SourceAsset`)
+        lib_dest: Directory to copy the built libraries to
+        macos_arch: Architecture for macOS builds (``CMAKE_OSX_ARCHITECTURES``)
+        udpsrv: Build with the UDP control server
+        build_cache_dir: If given, the source and build trees are kept in a
+            subdirectory of this directory (one per build variant) so later
+            builds are incremental. Building the same source tarball again is
+            a no-op
+        generator: The cmake generator. Defaults to ``"Ninja"`` if available
+        jobs: Number of parallel compile jobs. Defaults to :func:`get_num_jobs`
+        compiler_launcher: Used for ``CMAKE_C_COMPILER_LAUNCHER``. Defaults to
+            ``ccache`` or ``sccache`` if installed. Use ``""`` to disable
+        cpu_variant: Name of a :data:`~pyrtlsdrlib.platform.CPU_VARIANTS` item
+            to build an optimized (``-march`` and LTO) library for. It is
+            placed in a subdirectory of *lib_dest* named for the variant and
+            tagged with the matching :class:`~pyrtlsdrlib.BuildType`
+
+    Attributes:
+        timings: Duration in seconds of each build step from the last build
+
+    """
+    def __init__(
+        self, release, asset, lib_dest: Path, macos_arch: str|None = None, udpsrv: bool = False,
+        build_cache_dir: Path|None = None,
+        generator: str|None = None,
+        jobs: int|None = None,
+        compiler_launcher: str|None = None,
+        cpu_variant: str|None = None,
+    ):
         self.release = release
         self.asset = asset
+        self.udpsrv = udpsrv
+        if cpu_variant is not None and cpu_variant not in CPU_VARIANTS:
+            raise ValueError(f'Unknown CPU variant: "{cpu_variant}"')
+        self.cpu_variant = cpu_variant
+        if udpsrv:
+            # The library filenames are the same as the standard build
+            lib_dest = lib_dest / UDPSRV_DIRNAME
+        if cpu_variant is not None:
+            lib_dest = lib_dest / cpu_variant
         self.lib_dest = lib_dest
         self.macos_arch = macos_arch
+        self.build_cache_dir = build_cache_dir
+        if generator is None:
+            generator = get_default_generator()
+        self.generator = generator
+        if jobs is None:
+            jobs = get_num_jobs()
+        self.jobs = jobs
+        if compiler_launcher is None:
+            compiler_launcher = get_default_compiler_launcher()
+        self.compiler_launcher = compiler_launcher
+        self.timings: tp.Dict[str, float] = {}
         self.tmpdir = None
         self.source_dir = None
         self.cmake_build_dir = None
@@ -51,42 +199,131 @@ class Builder:
         self._orig_cwd = None
 
     def build(self) -> tp.List[BuildFile]:
+        self.timings = {}
+        start_ts = time.monotonic()
         try:
             return self._build()
         except Exception as exc:
             logger.exception(exc)
             raise
+        finally:
+            self.timings['total'] = time.monotonic() - start_ts
+            logger.info('Build timings: ' + ', '.join(
+                f'{key}={value:.2f}s' for key, value in self.timings.items()
+            ))
+
+    @property
+    def variant_name(self) -> str:
+        """Name of the build variant, used for the persistent build directory
+        """
+        parts = ['udpsrv' if self.udpsrv else 'default', self.macos_arch or 'native']
+        if self.cpu_variant is not None:
+            parts.append(self.cpu_variant)
+        generator = self.generator or 'default'
+        parts.append(generator.lower().replace(' ', '-'))
+        return '-'.join(parts)
+
+    def get_variant_dir(self) -> Path|None:
+        if self.build_cache_dir is None:
+            return None
+        return Path(self.build_cache_dir) / self.variant_name
 
     def _build(self) -> tp.List[BuildFile]:
         with tempfile.TemporaryDirectory() as tmpdir:
             logger.info(f'Building source asset: {self.asset}')
             tmpdir = self.tmpdir = Path(tmpdir)
+            start_ts = time.monotonic()
             tar_fn = self.asset.download_to(tmpdir)
-            logger.debug(f'unpacking {tar_fn} to {tmpdir}')
-            shutil.unpack_archive(tar_fn, tmpdir)
-            src_dir = [p for p in tmpdir.iterdir() if p.is_dir() and p != tar_fn]
-            logger.debug(f'{src_dir=}')
-            assert len(src_dir) == 1
-            self.source_dir = src_dir[0]
+            self.timings['download'] = time.monotonic() - start_ts
+            start_ts = time.monotonic()
+            self.source_dir = self.prepare_source(tar_fn)
+            self.timings['unpack'] = time.monotonic() - start_ts
             self.do_cmake()
             build_files = self.copy_builds_to_project()
             logger.success('Build complete')
             return build_files
 
-    def do_cmake(self):
-        logger.info('Running cmake')
-        assert self.source_dir is not None
-        self.cmake_build_dir = self.source_dir / 'build'
-        self.cmake_build_dir.mkdir()
+    def prepare_source(self, tar_fn: Path) -> Path:
+        """Unpack the source tarball and return the source directory
+
+        With a :attr:`build_cache_dir`, the source is synced into the
+        persistent source tree (skipped entirely if the tarball hash matches
+        the last build) and the persistent build tree is used.
+        """
+        assert self.tmpdir is not None
+        variant_dir = self.get_variant_dir()
+        if variant_dir is None:
+            return self._unpack(tar_fn, self.tmpdir)
+        source_dir = variant_dir / 'src'
+        self.cmake_build_dir = variant_dir / 'build'
+        stamp_fn = variant_dir / SOURCE_STAMP
+        sha256 = get_file_sha256(tar_fn)
+        if source_dir.exists() and stamp_fn.exists() and stamp_fn.read_text() == sha256:
+            logger.info(f'Source unchanged, using {source_dir}')
+            return source_dir
+        stamp_fn.unlink(missing_ok=True)
+        unpack_dir = self.tmpdir / 'unpacked'
+        unpack_dir.mkdir()
+        num_changed = sync_tree(self._unpack(tar_fn, unpack_dir), source_dir)
+        logger.info(f'Synced source to {source_dir} ({num_changed} files changed)')
+        stamp_fn.write_text(sha256)
+        return source_dir
+
+    def _unpack(self, tar_fn: Path, dest_dir: Path) -> Path:
+        logger.debug(f'unpacking {tar_fn} to {dest_dir}')
+        shutil.unpack_archive(tar_fn, dest_dir)
+        src_dir = [p for p in dest_dir.iterdir() if p.is_dir() and p != tar_fn]
+        logger.debug(f'{src_dir=}')
+        assert len(src_dir) == 1
+        return src_dir[0]
+
+    def get_cmake_args(self) -> str:
         cmake_args = ''
+        if self.generator is not None:
+            cmake_args = f'{cmake_args} -G "{self.generator}"'
+        if self.compiler_launcher:
+            cmake_args = f'{cmake_args} -DCMAKE_C_COMPILER_LAUNCHER={self.compiler_launcher}'
         if OS_TYPE == BuildType.macos and self.macos_arch is not None:
             logger.success('adding OSX_ARCHITECTURES')
             cmake_args = f'{cmake_args} -DCMAKE_OSX_ARCHITECTURES="{self.macos_arch}"'
-        sh(f'cmake {cmake_args} -S {self.source_dir} -B {self.cmake_build_dir}')
-        logger.debug(f'chdir to {self.cmake_build_dir}')
-        os.chdir(self.cmake_build_dir)
-        assert Path.cwd().samefile(self.cmake_build_dir)
-        sh('make -j 4')
+        if self.udpsrv:
+            cmake_args = f'{cmake_args} -DPROVIDE_UDP_SERVER=ON'
+        if self.cpu_variant is not None:
+            cflags = f'{CPU_VARIANT_FLAGS[self.cpu_variant]} -O3'
+            cmake_args = ' '.join([
+                cmake_args,
+                '-DCMAKE_BUILD_TYPE=Release',
+                f'-DCMAKE_C_FLAGS="{cflags}"',
+                '-DCMAKE_INTERPROCEDURAL_OPTIMIZATION=ON',
+                '-DCMAKE_POLICY_DEFAULT_CMP0069=NEW',
+            ])
+        return cmake_args
+
+    def do_cmake(self):
+        logger.info('Running cmake')
+        assert self.source_dir is not None
+        if self.cmake_build_dir is None:
+            self.cmake_build_dir = self.source_dir / 'build'
+        self.cmake_build_dir.mkdir(parents=True, exist_ok=True)
+        cmake_args = self.get_cmake_args()
+        configure_cmd = f'cmake {cmake_args} -S {self.source_dir} -B {self.cmake_build_dir}'
+
+        # An existing build tree regenerates itself when the CMakeLists
+        # change, so configuring is only needed if the arguments did
+        stamp_fn = self.cmake_build_dir / CONFIGURE_STAMP
+        cache_fn = self.cmake_build_dir / 'CMakeCache.txt'
+        start_ts = time.monotonic()
+        if cache_fn.exists() and stamp_fn.exists() and stamp_fn.read_text() == configure_cmd:
+            logger.info('Build tree already configured')
+        else:
+            stamp_fn.unlink(missing_ok=True)
+            sh(configure_cmd)
+            stamp_fn.write_text(configure_cmd)
+        self.timings['configure'] = time.monotonic() - start_ts
+
+        start_ts = time.monotonic()
+        sh(f'cmake --build {self.cmake_build_dir} --parallel {self.jobs}')
+        self.timings['compile'] = time.monotonic() - start_ts
         logger.success('cmake complete')
 
     def copy_builds_to_project(self) -> tp.List[BuildFile]:
@@ -94,6 +331,12 @@ class Builder:
         src = self.cmake_build_dir / 'src'
         src = src.resolve()
         logger.info(f'Copying builds from {src} to {self.lib_dest}')
+        self.lib_dest.mkdir(parents=True, exist_ok=True)
+        build_type = BuildType.source
+        if self.udpsrv:
+            build_type |= BuildType.udpsrv
+        if self.cpu_variant is not None:
+            build_type |= self.cpu_variant
 
         source_filenames = set(src.glob('librtlsdr*'))
         symlinks = []
@@ -104,7 +347,7 @@ class Builder:
             linked_file = src_fn.resolve().relative_to(src)
             bf = BuildFile(
                 file_type=FileType.lib,
-                build_type=BuildType.source,
+                build_type=build_type,
                 filename=self.lib_dest / src_fn.name,
                 is_symlink=True,
                 symlink_target=self.lib_dest / linked_file.name,
@@ -119,7 +362,7 @@ class Builder:
             shutil.copy2(src_fn, dest_fn)
             bf = BuildFile(
                 file_type=FileType.lib,
-                build_type=BuildType.source,
+                build_type=build_type,
                 filename=dest_fn,
             )
             build_files.append(bf)
@@ -136,3 +379,105 @@ class Builder:
             build_files.append(bf)
 
         return build_files
+
+
+class SimBuilder(Builder):
+    """Builds the simulated librtlsdr from :data:`SIM_SOURCE_DIR`
+
+    The resulting library exports the librtlsdr API and generates synthetic
+    samples, so it can be placed in ``custom_build`` to test and benchmark
+    without hardware.  See ``tools/simlib/rtlsdr_sim.c`` for the environment
+    variables it accepts.
+    """
+    def __init__(self, lib_dest: Path, macos_arch: str|None = None, **kwargs):
+        super().__init__(None, None, lib_dest, macos_arch, **kwargs)
+
+    @property
+    def variant_name(self) -> str:
+        return f'sim-{super().variant_name}'
+
+    def _build(self) -> tp.List[BuildFile]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger.info('Building simulated librtlsdr')
+            tmpdir = self.tmpdir = Path(tmpdir)
+            self.source_dir = SIM_SOURCE_DIR
+            # Keep build output out of the source tree
+            variant_dir = self.get_variant_dir()
+            if variant_dir is not None:
+                self.cmake_build_dir = variant_dir / 'build'
+            else:
+                self.cmake_build_dir = tmpdir / 'build'
+            self.do_cmake()
+            build_files = self.copy_builds_to_project()
+            logger.success('Build complete')
+            return build_files
+
+
+def build_options(f):
+    """Click options for the :class:`Builder` keyword arguments
+    """
+    f = click.option(
+        '--build-cache-dir', type=click.Path(file_okay=False), default=None,
+        help='Keep source and build trees here for incremental rebuilds',
+    )(f)
+    f = click.option('--cmake-generator', default=None, help='Defaults to Ninja if available')(f)
+    f = click.option('--build-jobs', type=int, default=None, help='Defaults to the number of CPUs')(f)
+    f = click.option(
+        '--compiler-launcher', default=None,
+        help='Defaults to ccache or sccache if available ("" to disable)',
+    )(f)
+    return f
+
+def get_builder_kwargs(build_cache_dir, cmake_generator, build_jobs, compiler_launcher):
+    return dict(
+        build_cache_dir=Path(build_cache_dir) if build_cache_dir is not None else None,
+        generator=cmake_generator,
+        jobs=build_jobs,
+        compiler_launcher=compiler_launcher,
+    )
+
+
+@click.group()
+def cli():
+    pass
+
+@cli.command()
+@click.option(
+    '--lib-dest', type=click.Path(file_okay=False), default=SIM_LIB_DIR, show_default=True,
+)
+@click.option(
+    '--macos-arch',
+    type=click.Choice(['x86_64', 'arm64']),
+    required=False,
+)
+@click.option(
+    '--cpu-variant', 'cpu_variants', type=click.Choice(list(CPU_VARIANTS)), multiple=True,
+    help='Also build CPU-optimized variants (Linux only)',
+)
+@click.option(
+    '--udpsrv/--no-udpsrv', default=False, show_default=True,
+    help='Also build the variant with the UDP control server',
+)
+@build_options
+def sim(lib_dest, macos_arch, cpu_variants, udpsrv, **kwargs):
+    """Build the simulated librtlsdr into LIB_DEST
+
+    To load it with ``load_librtlsdr()``, use the ``custom_build`` directory
+    as LIB_DEST. It then replaces any real build there and is included in
+    wheels, so only do this in a scratch checkout.
+    """
+    lib_dest = Path(lib_dest)
+    builder_kw = get_builder_kwargs(**kwargs)
+    with SimBuilder(lib_dest, macos_arch, **builder_kw) as builder:
+        build_files = builder.build()
+    for cpu_variant in get_host_cpu_variants(cpu_variants):
+        with SimBuilder(lib_dest, macos_arch, cpu_variant=cpu_variant, **builder_kw) as builder:
+            build_files.extend(builder.build())
+    if udpsrv:
+        with SimBuilder(lib_dest, macos_arch, udpsrv=True, **builder_kw) as builder:
+            build_files.extend(builder.build())
+    write_build_meta(lib_dest, build_files)
+    write_manifest(lib_dest)
+
+if __name__ == '__main__':
+    cli()
@@ -1,25 +1,372 @@
 #! /usr/bin/env python3
+"""Build the platform wheels
+
+Each platform is built from its own copy of the source tree (with separate
+``build`` and ``dist`` directories) so the builds can run concurrently.
+Debug symbols are stripped from the staged libraries and can optionally be
+kept in a separate ``<wheel>.debug.zip`` archive.
+"""
+from __future__ import annotations
+import typing as tp
 import os
+import re
+import sys
+import time
+import types
 import subprocess
-import shlex
+import importlib.util
+import zipfile
 from pathlib import Path
 import shutil
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from loguru import logger
+import click
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 BUILD_DIR = PROJECT_ROOT / 'build'
+STAGING_DIR = BUILD_DIR / 'wheels'
+DIST_DIR = PROJECT_ROOT / 'dist'
 PLATFORMS = ['macos', 'win32', 'win64', 'linux']
 
-def main():
-    def build_wheel(os_type):
-        env = os.environ.copy()
-        if os_type != 'any':
-            env['PYRTLSDRLIB_PLATFORM'] = os_type
-        cmd_str = 'python -m build -w'
-        if BUILD_DIR.exists():
-            shutil.rmtree(BUILD_DIR)
-        subprocess.run(shlex.split(cmd_str), env=env, check=True)
-    for os_type in PLATFORMS:
-        build_wheel(os_type)
+SOURCE_ITEMS = ['src', 'setup.py', 'pyproject.toml', 'MANIFEST.in', 'README.rst', 'LICENSE']
+"""Files and directories copied into each staging directory"""
+
+MACHO_MAGICS = {
+    b'\xfe\xed\xfa\xce', b'\xce\xfa\xed\xfe', b'\xfe\xed\xfa\xcf',
+    b'\xcf\xfa\xed\xfe', b'\xca\xfe\xba\xbe',
+}
+
+PLATFORM_ENV: tp.Dict[str, tp.Dict[str, str]] = {
+    # Without these `bdist_wheel_half_pure.get_tag` uses the host machine,
+    # which tags win32 wheels as win_amd64 on 64-bit hosts
+    'win32': {'PYRTLSDRLIB_ARCH': 'win32'},
+    'win64': {'PYRTLSDRLIB_ARCH': 'win64'},
+}
+"""Default environment variables (if not already set) for each platform"""
+
+if sys.platform != 'darwin':
+    # Needed to produce a macosx tag when cross-building
+    PLATFORM_ENV['macos'] = {'MACOSX_DEPLOYMENT_TARGET': '10.9'}
+
+PLATFORM_TAGS: tp.Dict[str, re.Pattern] = {
+    'macos': re.compile(r'macosx_\d+_0_(x86_64|arm64|universal2)'),
+    'win32': re.compile(r'win32'),
+    'win64': re.compile(r'win_amd64'),
+    'linux': re.compile(r'linux_\w+'),
+}
+"""Expected platform tag (as produced by ``bdist_wheel_half_pure.get_tag``)
+for each platform
+"""
+
+
+class WheelTagError(ValueError):
+    """Raised if a wheel was not tagged for the platform it was built for
+    """
+
+
+@dataclass
+class WheelResult:
+    """A built wheel
+
+    Attributes:
+        os_type: The platform name (one of :data:`PLATFORMS`)
+        filename: Path of the wheel in the dist directory
+        tag: The wheel tag (``py3-none-<platform>``)
+        duration: Build time in seconds
+        size: Size of the wheel in bytes
+        debug_filename: Path of the debug symbol archive (if created)
+    """
+    os_type: str
+    filename: Path
+    tag: str
+    duration: float
+    size: int
+    debug_filename: Path|None = None
+
+
+def stage_source(dest: Path) -> None:
+    """Copy the items in :data:`SOURCE_ITEMS` into *dest* (removing any
+    previous contents)
+    """
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    ignore = shutil.ignore_patterns('__pycache__', '*.pyc', '*.egg-info')
+    for name in SOURCE_ITEMS:
+        src = PROJECT_ROOT / name
+        if src.is_dir():
+            shutil.copytree(src, dest / name, symlinks=True, ignore=ignore)
+        elif src.exists():
+            shutil.copy2(src, dest / name)
+
+
+def load_setup_module(tree_dir: Path) -> types.ModuleType:
+    """Import the ``setup.py`` in *tree_dir* without running ``setup()``
+    """
+    spec = importlib.util.spec_from_file_location('_pyrtlsdrlib_setup', tree_dir / 'setup.py')
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def iter_wheel_lib_files(tree_dir: Path, os_type: str) -> tp.Iterator[Path]:
+    """Iterate over the library files in *tree_dir* which are packaged in
+    the wheel for *os_type*
+
+    The files are taken from ``get_package_lib_files`` in the ``setup.py``
+    of *tree_dir*, so they match the package data of the wheel.
+    """
+    setup_mod = load_setup_module(tree_dir)
+    lib_files = setup_mod.get_package_lib_files(os_type, tree_dir)
+    for pkg_name, filenames in lib_files.items():
+        pkg_dir = tree_dir.joinpath('src', *pkg_name.split('.'))
+        for filename in filenames:
+            yield pkg_dir / filename
+
+
+def get_binary_format(filename: Path) -> str|None:
+    """Get the format of a library (``"elf"``, ``"pe"`` or ``"macho"``)
+    """
+    with filename.open('rb') as fd:
+        magic = fd.read(4)
+    if magic == b'\x7fELF':
+        return 'elf'
+    elif magic[:2] == b'MZ':
+        return 'pe'
+    elif magic in MACHO_MAGICS:
+        return 'macho'
+    return None
+
+
+def find_objcopy(binary_format: str) -> str|None:
+    """Find an ``objcopy`` which can handle the given binary format
+
+    GNU objcopy is preferred for ELF and PE. Mach-O files need llvm-objcopy.
+    """
+    names = ['llvm-objcopy'] if binary_format == 'macho' else ['objcopy', 'llvm-objcopy']
+    for name in names:
+        path = shutil.which(name)
+        if path is not None:
+            return path
+    return None
+
+
+def strip_library(filename: Path, debug_filename: Path|None = None) -> bool:
+    """Strip debug symbols from a library in place
+
+    If *debug_filename* is given, the debug symbols are first copied to it
+    (for ELF and PE files). ELF files are also given a ``.gnu_debuglink``
+    to it so debuggers can locate the symbols.
+
+    Returns ``False`` (leaving the file unchanged) if no suitable objcopy
+    was found or it failed.
+    """
+    binary_format = get_binary_format(filename)
+    objcopy = None if binary_format is None else find_objcopy(binary_format)
+    if objcopy is None:
+        logger.warning(f'Cannot strip {filename.name}: no objcopy for format "{binary_format}"')
+        return False
+    tmp_fn = filename.with_name(f'{filename.name}.stripped')
+    try:
+        if debug_filename is not None and binary_format != 'macho':
+            debug_filename.parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                [objcopy, '--only-keep-debug', str(filename), str(debug_filename)],
+                check=True, capture_output=True,
+            )
+        else:
+            debug_filename = None
+        subprocess.run(
+            [objcopy, '--strip-debug', str(filename), str(tmp_fn)],
+            check=True, capture_output=True,
+        )
+        if debug_filename is not None and binary_format == 'elf':
+            subprocess.run(
+                [objcopy, f'--add-gnu-debuglink={debug_filename}', str(tmp_fn)],
+                check=True, capture_output=True,
+            )
+    except subprocess.CalledProcessError as exc:
+        logger.warning(f'Could not strip {filename.name}: {exc.stderr.decode().strip()}')
+        tmp_fn.unlink(missing_ok=True)
+        return False
+    shutil.copymode(filename, tmp_fn)
+    os.replace(tmp_fn, filename)
+    return True
+
+
+def strip_wheel_libs(tree_dir: Path, os_type: str, debug_dir: Path|None = None) -> tp.List[Path]:
+    """Strip the libraries packaged for *os_type* in the staged *tree_dir*
+
+    Debug symbols are written to *debug_dir* (if given) as ``<filename>.debug``
+    using the paths relative to *tree_dir*.
+
+    Returns:
+        The debug symbol files written
+    """
+    debug_files = []
+    for lib_file in iter_wheel_lib_files(tree_dir, os_type):
+        debug_fn = None
+        if debug_dir is not None:
+            rel_fn = lib_file.relative_to(tree_dir)
+            debug_fn = debug_dir / rel_fn.with_name(f'{rel_fn.name}.debug')
+        orig_size = lib_file.stat().st_size
+        if not strip_library(lib_file, debug_fn):
+            continue
+        logger.debug(f'Stripped {lib_file.name}: {orig_size} -> {lib_file.stat().st_size} bytes')
+        if debug_fn is not None and debug_fn.exists():
+            debug_files.append(debug_fn)
+    return debug_files
+
+
+def check_wheel_tag(os_type: str, wheel_fn: Path) -> str:
+    """Check that the wheel built for *os_type* has the expected tag
+
+    The filename tag must match the ``Tag`` in the wheel metadata and its
+    platform must match :data:`PLATFORM_TAGS`.
+
+    Returns:
+        The wheel tag
+
+    Raises:
+        WheelTagError: If the tag is incorrect
+    """
+    name, version, py_tag, abi_tag, plat_tag = wheel_fn.stem.split('-')
+    tag = f'{py_tag}-{abi_tag}-{plat_tag}'
+    with zipfile.ZipFile(wheel_fn) as zf:
+        wheel_meta = zf.read(f'{name}-{version}.dist-info/WHEEL').decode()
+    meta_tags = [
+        line.partition(':')[2].strip() for line in wheel_meta.splitlines()
+        if line.startswith('Tag:')
+    ]
+    if meta_tags != [tag]:
+        raise WheelTagError(f'{wheel_fn.name}: metadata tags {meta_tags} do not match "{tag}"')
+    if (py_tag, abi_tag) != ('py3', 'none'):
+        raise WheelTagError(f'{wheel_fn.name}: expected a "py3-none" wheel')
+    if not PLATFORM_TAGS[os_type].fullmatch(plat_tag):
+        raise WheelTagError(f'{wheel_fn.name}: "{plat_tag}" is not a valid tag for {os_type}')
+    return tag
+
+
+def build_wheel(
+    os_type: str, dist_dir: Path, no_isolation: bool = False, debug_symbols: bool = False,
+) -> WheelResult:
+    """Build the wheel for *os_type* in its own staging directory and move
+    it into *dist_dir*
+
+    The packaged libraries are stripped (see :func:`strip_wheel_libs`). If
+    *debug_symbols* is True, their debug symbols are archived in *dist_dir*
+    alongside the wheel. The build output is written to ``build.log`` in the staging directory.
+
+    Raises:
+        subprocess.CalledProcessError: If the build failed
+        WheelTagError: If the wheel was tagged incorrectly
+    """
+    start_ts = time.monotonic()
+    staging_dir = STAGING_DIR / os_type
+    tree_dir, out_dir = staging_dir / 'tree', staging_dir / 'dist'
+    debug_dir = staging_dir / 'debug'
+    stage_source(tree_dir)
+    for p in [out_dir, debug_dir]:
+        if p.exists():
+            shutil.rmtree(p)
+    debug_files = strip_wheel_libs(tree_dir, os_type, debug_dir if debug_symbols else None)
+
+    env = os.environ.copy()
+    env['PYRTLSDRLIB_PLATFORM'] = os_type
+    for key, val in PLATFORM_ENV.get(os_type, {}).items():
+        env.setdefault(key, val)
+    cmd = [sys.executable, '-m', 'build', '-w', '--outdir', str(out_dir)]
+    if no_isolation:
+        cmd.append('--no-isolation')
+    cmd.append(str(tree_dir))
+    log_fn = staging_dir / 'build.log'
+    with log_fn.open('w') as fd:
+        try:
+            subprocess.run(cmd, env=env, stdout=fd, stderr=subprocess.STDOUT, check=True)
+        except subprocess.CalledProcessError:
+            logger.error(f'{os_type} build failed, see {log_fn}')
+            raise
+
+    wheel_fn, = out_dir.glob('*.whl')
+    tag = check_wheel_tag(os_type, wheel_fn)
+    dist_dir.mkdir(parents=True, exist_ok=True)
+    dest = dist_dir / wheel_fn.name
+    shutil.move(wheel_fn, dest)
+    debug_dest = None
+    if len(debug_files):
+        debug_dest = dist_dir / f'{wheel_fn.stem}.debug.zip'
+        with zipfile.ZipFile(debug_dest, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for fn in debug_files:
+                zf.write(fn, fn.relative_to(debug_dir).as_posix())
+    return WheelResult(
+        os_type=os_type, filename=dest, tag=tag,
+        duration=time.monotonic() - start_ts, size=dest.stat().st_size,
+        debug_filename=debug_dest,
+    )
+
+
+def format_report(results: tp.Sequence[WheelResult], wall_time: float) -> str:
+    """Format a table of build times and sizes
+    """
+    lines = [f'{"platform":<8} {"time":>8} {"size":>10}  wheel']
+    for r in sorted(results, key=lambda r: r.os_type):
+        lines.append(f'{r.os_type:<8} {r.duration:>7.1f}s {r.size/1e3:>8.1f}kB  {r.filename.name}')
+    total = sum(r.duration for r in results)
+    lines.append(f'wall time: {wall_time:.1f}s (sum of builds: {total:.1f}s)')
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.option(
+    '--platform', 'platforms', type=click.Choice(PLATFORMS), multiple=True,
+    help='Platforms to build (defaults to all)',
+)
+@click.option(
+    '-j', '--jobs', type=int,
+    help='Number of concurrent builds (defaults to one per platform)',
+)
+@click.option(
+    '--outdir', type=click.Path(file_okay=False), default=str(DIST_DIR), show_default=True,
+)
+@click.option(
+    '--no-isolation', is_flag=True,
+    help='Build in the current environment (passed to "python -m build")',
+)
+@click.option(
+    '--debug-symbols', is_flag=True,
+    help='Save the stripped debug symbols to a "<wheel>.debug.zip" for each wheel',
+)
+def main(platforms, jobs, outdir, no_isolation, debug_symbols):
+    """Build the platform wheels concurrently
+    """
+    platforms = list(platforms) if len(platforms) else PLATFORMS
+    dist_dir = Path(outdir).resolve()
+    # Regenerate the library manifests so they match the packaged files
+    subprocess.run([sys.executable, str(PROJECT_ROOT / 'tools' / 'manifest.py')], check=True)
+
+    start_ts = time.monotonic()
+    results, failed = [], []
+    with ProcessPoolExecutor(max_workers=jobs or len(platforms)) as executor:
+        futures = {
+            executor.submit(build_wheel, os_type, dist_dir, no_isolation, debug_symbols): os_type
+            for os_type in platforms
+        }
+        for fut in as_completed(futures):
+            os_type = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as exc:
+                logger.error(f'{os_type}: {exc}')
+                failed.append(os_type)
+                continue
+            logger.success(f'Built {result.filename.name} in {result.duration:.1f}s')
+            results.append(result)
+    click.echo(format_report(results, time.monotonic() - start_ts))
+    if len(failed):
+        raise click.ClickException(f'Failed builds: {", ".join(sorted(failed))}')
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,10 @@
 from __future__ import annotations
 import typing as tp
+import os
+import sys
+import json
+import shutil
+import hashlib
 from pathlib import Path
 import enum
 import datetime
@@ -12,7 +17,8 @@ from pyrtlsdrlib.lib import resource_filename
 
 __all__ = (
     'REPO_NAME', 'ROOT_DIR', 'BUILD_DIR', 'PROJECT_LIB_DIR', 'CUSTOM_LIB_DIR',
-    'BUILD_DEFAULT', 'DT_FMT', 'get_meta_filename', 'read_build_meta', 'write_build_meta',
+    'BUILD_DEFAULT', 'DT_FMT', 'META_FORMAT', 'get_meta_filename', 'dumps_build_meta',
+    'loads_build_meta', 'read_build_meta', 'write_build_meta', 'get_file_sha256', 'clone_file',
 )
 
 REPO_NAME = 'librtlsdr/librtlsdr'
@@ -33,13 +39,137 @@ def get_meta_filename(dir_or_filename: Path) -> Path:
         fn = dir_or_filename
     return fn
 
+META_FORMAT = 2
+"""Version of the flat build metadata format (see :func:`dumps_build_meta`)"""
+
+def _is_project_meta(data) -> bool:
+    if not isinstance(data, dict) or not len(data):
+        return False
+    for asset_data in data.values():
+        if not isinstance(asset_data, dict):
+            return False
+        for entry in asset_data.values():
+            if not isinstance(entry, dict) or not isinstance(entry.get('build_file'), BuildFile):
+                return False
+    return True
+
+def _is_build_file_list(data) -> bool:
+    return isinstance(data, list) and all(isinstance(bf, BuildFile) for bf in data)
+
+def dumps_build_meta(data) -> str:
+    """Serialize build metadata
+
+    Project metadata (``{asset_name: {proj_file: entry}}``) and lists of
+    :class:`~pyrtlsdrlib.BuildFile` use a flat format with one row per file
+    (see :meth:`BuildFile.to_row <pyrtlsdrlib.BuildFile.to_row>`)::
+
+        {"format": 2, "kind": "project", "rows": [
+            [asset_name, proj_file, tag_name, sha256, build_type, file_type, filename, symlink_target],
+            ...
+        ]}
+
+    Anything else is written in the ``jsonfactory`` format.
+    """
+    if _is_project_meta(data):
+        rows = []
+        for asset_name, asset_data in data.items():
+            for entry in asset_data.values():
+                rows.append([
+                    asset_name, str(entry['proj_file']), entry['tag_name'], entry.get('sha256'),
+                    *entry['build_file'].to_row(),
+                ])
+        kind = 'project'
+    elif _is_build_file_list(data) and len(data):
+        rows = [bf.to_row() for bf in data]
+        kind = 'files'
+    else:
+        return jsonfactory.dumps(data, indent=2)
+    # One row per line keeps diffs readable
+    lines = ',\n'.join(json.dumps(row, separators=(',', ':')) for row in rows)
+    return f'{{"format":{META_FORMAT},"kind":"{kind}","rows":[\n{lines}\n]}}\n'
+
+def loads_build_meta(s: str):
+    """Deserialize build metadata written by :func:`dumps_build_meta`
+
+    The previous (``jsonfactory``) format is also accepted.
+    """
+    data = json.loads(s)
+    if not isinstance(data, dict) or data.get('format') != META_FORMAT:
+        return jsonfactory.loads(s)
+    from_row = BuildFile.from_row
+    kind = data['kind']
+    if kind == 'files':
+        return [from_row(row) for row in data['rows']]
+    assert kind == 'project'
+    result: tp.Dict[str, tp.Dict[str, tp.Any]] = {}
+    for asset_name, proj_file, tag_name, sha256, *bf_row in data['rows']:
+        entry = dict(
+            tag_name=tag_name,
+            build_file=from_row(bf_row),
+            proj_file=Path(proj_file),
+        )
+        if sha256 is not None:
+            entry['sha256'] = sha256
+        asset_data = result.get(asset_name)
+        if asset_data is None:
+            asset_data = result[asset_name] = {}
+        asset_data[proj_file] = entry
+    return result
+
 def read_build_meta(dir_or_filename: Path):
     fn = get_meta_filename(dir_or_filename)
-    return jsonfactory.loads(fn.read_text())
+    return loads_build_meta(fn.read_text())
 
 def write_build_meta(dir_or_filename: Path, data):
     fn = get_meta_filename(dir_or_filename)
-    fn.write_text(jsonfactory.dumps(data, indent=2))
+    fn.write_text(dumps_build_meta(data))
+
+
+def get_file_sha256(filename: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with filename.open('rb') as fd:
+        while True:
+            chunk = fd.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _reflink(src: Path, dest: Path):
+    if sys.platform == 'linux':
+        import fcntl
+        FICLONE = 0x40049409
+        with src.open('rb') as sfd, dest.open('wb') as dfd:
+            fcntl.ioctl(dfd.fileno(), FICLONE, sfd.fileno())
+        shutil.copystat(src, dest)
+    elif sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dest), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    else:
+        raise OSError(f'reflink not supported on {sys.platform}')
+
+
+def clone_file(src: Path, dest: Path) -> str:
+    """Create *dest* with the contents of *src*, sharing storage if possible
+
+    A reflink (copy-on-write clone) is tried first, falling back to a regular
+    copy. Hard links are not used: *src* is usually in a persistent build
+    tree which incremental builds modify in place, and that would change
+    *dest* along with it.
+
+    Returns the method used (``'reflink'`` or ``'copy'``).
+    """
+    try:
+        _reflink(src, dest)
+        return 'reflink'
+    except OSError:
+        dest.unlink(missing_ok=True)
+    shutil.copy2(src, dest)
+    return 'copy'
 
 
 @jsonfactory.register
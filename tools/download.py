@@ -0,0 +1,501 @@
+from __future__ import annotations
+import typing as tp
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+
+from loguru import logger
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError
+
+from pyrtlsdrlib.lib import get_cache_dir
+
+__all__ = (
+    'CHUNK_SIZE', 'MAX_WORKERS', 'VerificationError', 'DownloadResult', 'DownloadCache',
+    'get_session', 'download', 'fetch_partial', 'get_default_cache_root', 'get_download_cache',
+    'set_download_cache',
+)
+
+CHUNK_SIZE = 1 << 20
+"""Size of each chunk read from the response body"""
+
+MAX_WORKERS = 8
+"""Default number of concurrent downloads (and HTTP connections per host)"""
+
+PROGRESS_INTERVAL = 2.
+"""Minimum number of seconds between progress log messages"""
+
+RETRIES = 5
+"""Number of times an interrupted download is resumed before giving up"""
+
+TIMEOUT = 30
+"""Connect and read timeout in seconds"""
+
+PARTIAL_SUFFIX = '.partial'
+
+_session: requests.Session|None = None
+_session_lock = threading.Lock()
+_download_cache: DownloadCache|None = None
+_download_cache_set = False
+
+
+class VerificationError(Exception):
+    """Raised when a downloaded file does not match its expected size or digest
+    """
+
+
+@dataclass
+class DownloadResult:
+    filename: Path
+    nbytes: int
+    elapsed: float
+    sha256: str|None = None
+    cached: bool = False
+    """True if the file was served from a :class:`DownloadCache`"""
+    resumed_from: int = 0
+    """Number of bytes already present from an interrupted download"""
+
+    @property
+    def rate(self) -> float:
+        """Download rate in MB/s"""
+        if self.elapsed <= 0:
+            return 0
+        return (self.nbytes - self.resumed_from) / self.elapsed / 1e6
+
+    def __str__(self):
+        if self.cached:
+            return f'{self.nbytes / 1e6:.2f} MB from cache'
+        s = f'{self.nbytes / 1e6:.2f} MB in {self.elapsed:.2f}s ({self.rate:.2f} MB/s)'
+        if self.resumed_from:
+            s = f'{s}, resumed at {self.resumed_from / 1e6:.2f} MB'
+        return s
+
+
+def get_session() -> requests.Session:
+    """Get the :class:`requests.Session` shared by all downloads
+
+    The connection pool is sized for :data:`MAX_WORKERS` so concurrent
+    downloads from the same host reuse connections.
+    """
+    global _session
+    s = _session
+    if s is not None:
+        return s
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            s.mount('https://', adapter)
+            s.mount('http://', adapter)
+            _session = s
+        return _session
+
+
+def download(
+    url: str,
+    dest_filename: Path,
+    session: requests.Session|None = None,
+    chunk_size: int = CHUNK_SIZE,
+    label: str|None = None,
+    expected_size: int|None = None,
+    expected_sha256: str|None = None,
+    retries: int = RETRIES,
+) -> DownloadResult:
+    """Download *url* to *dest_filename*, logging progress and timing
+
+    Data is written to ``<dest_filename>.partial`` (see :func:`fetch_partial`)
+    and renamed once complete and verified.
+    """
+    if session is None:
+        session = get_session()
+    if label is None:
+        label = dest_filename.name
+    start_ts = time.monotonic()
+    partial_fn = dest_filename.with_name(f'{dest_filename.name}{PARTIAL_SUFFIX}')
+    fetched = fetch_partial(
+        session, url, partial_fn, chunk_size=chunk_size, label=label,
+        expected_size=expected_size, expected_sha256=expected_sha256, retries=retries,
+    )
+    assert fetched is not None
+    fetched.commit(dest_filename)
+    result = DownloadResult(
+        filename=dest_filename, nbytes=fetched.size, elapsed=time.monotonic() - start_ts,
+        sha256=fetched.sha256, resumed_from=fetched.resumed_from,
+    )
+    logger.success(f'Downloaded {label}: {result}')
+    return result
+
+
+@dataclass
+class _Fetched:
+    partial_fn: Path
+    size: int
+    sha256: str
+    etag: str|None
+    last_modified: str|None
+    resumed_from: int
+
+    def commit(self, dest_filename: Path):
+        os.replace(self.partial_fn, dest_filename)
+        _get_partial_meta_filename(self.partial_fn).unlink(missing_ok=True)
+
+
+def _get_partial_meta_filename(partial_fn: Path) -> Path:
+    return partial_fn.with_name(f'{partial_fn.name}.json')
+
+
+def _discard_partial(partial_fn: Path):
+    partial_fn.unlink(missing_ok=True)
+    _get_partial_meta_filename(partial_fn).unlink(missing_ok=True)
+
+
+def _get_resume_validator(url: str, partial_fn: Path) -> str|None:
+    """Get the validator to send with ``If-Range`` if *partial_fn* can be resumed
+    """
+    if not partial_fn.exists():
+        return None
+    try:
+        meta = json.loads(_get_partial_meta_filename(partial_fn).read_text())
+    except (OSError, ValueError):
+        return None
+    if meta.get('url') != url:
+        return None
+    return meta.get('etag') or meta.get('last_modified')
+
+
+def _hash_file(filename: Path, chunk_size: int = CHUNK_SIZE) -> 'hashlib._Hash':
+    h = hashlib.sha256()
+    with filename.open('rb') as fd:
+        while True:
+            chunk = fd.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h
+
+
+def fetch_partial(
+    session: requests.Session,
+    url: str,
+    partial_fn: Path,
+    headers: tp.Dict[str, str]|None = None,
+    chunk_size: int = CHUNK_SIZE,
+    label: str|None = None,
+    expected_size: int|None = None,
+    expected_sha256: str|None = None,
+    retries: int = RETRIES,
+) -> _Fetched|None:
+    """Download *url* into *partial_fn*, resuming any previous attempt
+
+    If *partial_fn* exists from an interrupted download of the same url and
+    the server provided a validator (``ETag`` or ``Last-Modified``), only
+    the remaining bytes are requested (using ``Range`` with ``If-Range``).
+    Connection errors are retried up to *retries* times, resuming each time.
+
+    Returns ``None`` if the server responded with ``304 Not Modified`` to
+    conditional *headers*.
+
+    Raises:
+        VerificationError: If the size or digest of the result does not match
+            *expected_size* or *expected_sha256*. The partial file is removed
+
+    """
+    if label is None:
+        label = partial_fn.name
+    meta_fn = _get_partial_meta_filename(partial_fn)
+    attempt = 0
+    resumed_from = 0
+    while True:
+        validator = _get_resume_validator(url, partial_fn)
+        if validator is None:
+            _discard_partial(partial_fn)
+            offset = 0
+        else:
+            offset = partial_fn.stat().st_size
+        req_headers = dict(headers or {})
+        if offset:
+            req_headers['Range'] = f'bytes={offset}-'
+            req_headers['If-Range'] = validator
+        try:
+            with session.get(url, stream=True, headers=req_headers, timeout=TIMEOUT) as r:
+                if r.status_code == 304:
+                    return None
+                if r.status_code == 416 and offset:
+                    # Either already complete or no longer valid
+                    if expected_size is not None and offset == expected_size:
+                        etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+                        break
+                    logger.info(f'{label}: range not satisfiable, restarting')
+                    _discard_partial(partial_fn)
+                    continue
+                r.raise_for_status()
+                if r.status_code == 206:
+                    if _content_range_start(r) != offset:
+                        logger.info(f'{label}: unexpected Content-Range, restarting')
+                        _discard_partial(partial_fn)
+                        continue
+                    logger.info(f'{label}: resuming at {offset / 1e6:.1f} MB')
+                    resumed_from = offset
+                    mode = 'ab'
+                else:
+                    # The file changed (If-Range did not match) or the server
+                    # does not support ranges
+                    offset = 0
+                    mode = 'wb'
+                etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+                if mode == 'wb':
+                    meta_fn.write_text(json.dumps(dict(
+                        url=url, etag=etag, last_modified=last_modified,
+                    )))
+                total = int(r.headers.get('Content-Length', 0)) or None
+                if total is not None:
+                    total += offset
+                last_log = time.monotonic()
+                nbytes = offset
+                with partial_fn.open(mode) as fd:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        fd.write(chunk)
+                        nbytes += len(chunk)
+                        now = time.monotonic()
+                        if now - last_log >= PROGRESS_INTERVAL:
+                            last_log = now
+                            _log_progress(label, nbytes, total)
+            break
+        except (requests.ConnectionError, requests.Timeout, ChunkedEncodingError) as exc:
+            attempt += 1
+            if attempt > retries:
+                raise
+            logger.warning(f'{label}: {exc!r}. Retrying ({attempt}/{retries})')
+
+    size = partial_fn.stat().st_size
+    # Hashed in a separate pass so resumed downloads don't need the hash
+    # state of the previous attempt
+    sha256 = _hash_file(partial_fn).hexdigest()
+    if expected_size is not None and size != expected_size:
+        _discard_partial(partial_fn)
+        raise VerificationError(f'{label}: expected {expected_size} bytes, got {size}')
+    if expected_sha256 is not None and sha256 != expected_sha256.lower():
+        _discard_partial(partial_fn)
+        raise VerificationError(f'{label}: sha256 mismatch (expected {expected_sha256}, got {sha256})')
+    return _Fetched(
+        partial_fn=partial_fn, size=size, sha256=sha256,
+        etag=etag, last_modified=last_modified, resumed_from=resumed_from,
+    )
+
+
+def _content_range_start(r: requests.Response) -> int|None:
+    m = re.match(r'bytes (\d+)-', r.headers.get('Content-Range', ''))
+    if m is None:
+        return None
+    return int(m.group(1))
+
+
+def _log_progress(label: str, nbytes: int, total: int|None):
+    if total:
+        logger.info(f'{label}: {nbytes / 1e6:.1f} / {total / 1e6:.1f} MB ({nbytes / total:.0%})')
+    else:
+        logger.info(f'{label}: {nbytes / 1e6:.1f} MB')
+
+
+class DownloadCache:
+    """Persistent, content-addressed cache of downloaded files
+
+    File contents are stored once under ``objects/<sha256>``. Each cache key
+    (such as a release asset id) has an index entry in ``index/<key>.json``
+    with the digest and the ``ETag`` / ``Last-Modified`` headers of the
+    response, which are used to revalidate the entry with a conditional
+    request.
+
+    Arguments:
+        root: The cache directory
+        offline: If True, cached files are used without contacting the
+            server and uncached keys raise :class:`FileNotFoundError`
+
+    """
+    def __init__(self, root: Path, offline: bool = False):
+        self.root = Path(root)
+        self.offline = offline
+        self.objects_dir = self.root / 'objects'
+        self.index_dir = self.root / 'index'
+        self.tmp_dir = self.root / 'tmp'
+        for p in [self.objects_dir, self.index_dir, self.tmp_dir]:
+            p.mkdir(parents=True, exist_ok=True)
+        self._locks: tp.Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def _safe_key(key: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+    def get_index_filename(self, key: str) -> Path:
+        return self.index_dir / f'{self._safe_key(key)}.json'
+
+    def get_object_filename(self, sha256: str) -> Path:
+        return self.objects_dir / sha256
+
+    def get_entry(self, key: str) -> tp.Dict[str, tp.Any]|None:
+        """Get the index entry for *key* if its object exists
+        """
+        try:
+            entry = json.loads(self.get_index_filename(key).read_text())
+        except (OSError, ValueError):
+            return None
+        if not self.get_object_filename(entry['sha256']).exists():
+            return None
+        return entry
+
+    def _write_entry(self, key: str, entry: tp.Dict[str, tp.Any]):
+        fn = self.get_index_filename(key)
+        tmp_fn = fn.with_name(f'{fn.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp_fn.write_text(json.dumps(entry, indent=2))
+        os.replace(tmp_fn, fn)
+
+    def fetch(
+        self,
+        key: str,
+        url: str,
+        dest_filename: Path|None,
+        session: requests.Session|None = None,
+        chunk_size: int = CHUNK_SIZE,
+        label: str|None = None,
+        expected_size: int|None = None,
+        expected_sha256: str|None = None,
+        retries: int = RETRIES,
+    ) -> DownloadResult:
+        """Place the contents of *url* at *dest_filename*, using the cache
+        entry for *key* if it is still valid
+
+        If *dest_filename* is ``None`` the cached object is used in place
+        (as :attr:`DownloadResult.filename`) and must not be modified.
+
+        Interrupted downloads are resumed from ``tmp/<key>.partial`` (see
+        :func:`fetch_partial`).
+        """
+        if session is None:
+            session = get_session()
+        if label is None:
+            label = key if dest_filename is None else dest_filename.name
+        start_ts = time.monotonic()
+        entry = self.get_entry(key)
+        if entry is not None and entry.get('url') != url:
+            # The key was reused for a different url
+            entry = None
+        if entry is not None and expected_sha256 is not None:
+            if entry['sha256'] != expected_sha256.lower():
+                entry = None
+        if self.offline:
+            if entry is None:
+                raise FileNotFoundError(f'"{label}" is not cached (offline mode)')
+            return self._use_entry(entry, dest_filename, label)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        partial_fn = self.tmp_dir / f'{self._safe_key(key)}{PARTIAL_SUFFIX}'
+        with self._get_key_lock(key):
+            fetched = fetch_partial(
+                session, url, partial_fn, headers=headers, chunk_size=chunk_size,
+                label=label, expected_size=expected_size, expected_sha256=expected_sha256,
+                retries=retries,
+            )
+            if fetched is None:
+                assert entry is not None
+                logger.info(f'{label}: not modified')
+                return self._use_entry(entry, dest_filename, label)
+            obj_fn = self.get_object_filename(fetched.sha256)
+            fetched.commit(obj_fn)
+            entry = dict(
+                url=url,
+                sha256=fetched.sha256,
+                size=fetched.size,
+                etag=fetched.etag,
+                last_modified=fetched.last_modified,
+            )
+            self._write_entry(key, entry)
+        if dest_filename is None:
+            dest_filename = obj_fn
+        else:
+            self._link(obj_fn, dest_filename)
+        result = DownloadResult(
+            filename=dest_filename, nbytes=fetched.size, elapsed=time.monotonic() - start_ts,
+            sha256=fetched.sha256, resumed_from=fetched.resumed_from,
+        )
+        logger.success(f'Downloaded {label}: {result}')
+        return result
+
+    def _get_key_lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _use_entry(self, entry: tp.Dict[str, tp.Any], dest_filename: Path|None, label: str) -> DownloadResult:
+        obj_fn = self.get_object_filename(entry['sha256'])
+        if dest_filename is None:
+            dest_filename = obj_fn
+        else:
+            self._link(obj_fn, dest_filename)
+        result = DownloadResult(
+            filename=dest_filename, nbytes=entry['size'], elapsed=0,
+            sha256=entry['sha256'], cached=True,
+        )
+        logger.success(f'Using cached {label}: {result}')
+        return result
+
+    @staticmethod
+    def _link(src: Path, dest: Path):
+        # Hard link where possible so no data is copied. Objects are never
+        # modified in place, so sharing the inode is safe
+        if dest.exists() or dest.is_symlink():
+            dest.unlink()
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+
+
+def get_default_cache_root() -> Path:
+    """The ``PYRTLSDRLIB_DOWNLOAD_CACHE`` environment variable if set, otherwise
+    the ``downloads`` subdirectory of :func:`pyrtlsdrlib.lib.get_cache_dir`
+    """
+    root = os.environ.get('PYRTLSDRLIB_DOWNLOAD_CACHE')
+    return Path(root) if root else get_cache_dir() / 'downloads'
+
+
+def get_download_cache() -> DownloadCache|None:
+    """Get the :class:`DownloadCache` used for release assets
+
+    Unless set by :func:`set_download_cache`, the cache is stored in
+    :func:`get_default_cache_root`. Setting ``PYRTLSDRLIB_OFFLINE=1`` enables
+    offline mode and ``PYRTLSDRLIB_NO_DOWNLOAD_CACHE=1`` disables the cache.
+    """
+    global _download_cache, _download_cache_set
+    with _session_lock:
+        if not _download_cache_set:
+            _download_cache_set = True
+            if os.environ.get('PYRTLSDRLIB_NO_DOWNLOAD_CACHE') in ['1', 'true']:
+                _download_cache = None
+            else:
+                offline = os.environ.get('PYRTLSDRLIB_OFFLINE') in ['1', 'true']
+                _download_cache = DownloadCache(get_default_cache_root(), offline=offline)
+        return _download_cache
+
+
+def set_download_cache(cache: DownloadCache|None):
+    """Set the :class:`DownloadCache` to use (``None`` disables caching)
+    """
+    global _download_cache, _download_cache_set
+    with _session_lock:
+        _download_cache = cache
+        _download_cache_set = True
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import typing as tp
+import os
+import stat
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from dataclasses import dataclass
+
+from loguru import logger
+
+__all__ = ('CHUNK_SIZE', 'ExtractedFile', 'extract_selected')
+
+CHUNK_SIZE = 1 << 20
+"""Size of each chunk copied from an archive member"""
+
+Selector = tp.Callable[[str], tp.Optional[Path]]
+"""Called with the name of each top-level archive member. Returns the
+directory to place it in or ``None`` to skip it
+"""
+
+
+@dataclass
+class ExtractedFile:
+    filename: Path
+    """Path of the file in its destination directory"""
+    symlink_target: str|None = None
+    """For symlinks, the name of the file linked to (in the same directory)"""
+
+    @property
+    def is_symlink(self) -> bool:
+        return self.symlink_target is not None
+
+
+class _Extraction:
+    def __init__(self, select: Selector, chunk_size: int):
+        self.select = select
+        self.chunk_size = chunk_size
+        self.files: tp.Dict[str, ExtractedFile] = {}
+        self.symlinks: tp.Dict[str, str] = {}
+
+    @staticmethod
+    def _get_name(member_name: str) -> str|None:
+        # Only top-level members are used (matching the archive layouts of
+        # the librtlsdr releases)
+        parts = [p for p in PurePosixPath(member_name).parts if p != '.']
+        if len(parts) != 1:
+            return None
+        return parts[0]
+
+    def add_file(self, member_name: str, fileobj: tp.BinaryIO, mode: int|None):
+        name = self._get_name(member_name)
+        if name is None:
+            return
+        dest_dir = self.select(name)
+        if dest_dir is None:
+            logger.debug(f'Skipping {member_name}')
+            return
+        filename = dest_dir / name
+        logger.info(f'Adding {name} to {dest_dir}')
+        if filename.is_symlink():
+            filename.unlink()
+        with filename.open('wb') as fd:
+            shutil.copyfileobj(fileobj, fd, self.chunk_size)
+        if mode:
+            os.chmod(filename, mode & 0o777)
+        self.files[name] = ExtractedFile(filename)
+
+    def add_symlink(self, member_name: str, target: str):
+        name = self._get_name(member_name)
+        if name is None:
+            return
+        self.symlinks[name] = PurePosixPath(target).name
+
+    def extract_zip(self, archive: zipfile.ZipFile):
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            mode = info.external_attr >> 16
+            with archive.open(info) as fd:
+                if stat.S_ISLNK(mode):
+                    self.add_symlink(info.filename, fd.read().decode())
+                elif info.filename.endswith('.tar.gz'):
+                    logger.debug(f'Extracting packed archive {info.filename}')
+                    with tarfile.open(fileobj=fd, mode='r|gz') as tf:
+                        self.extract_tar(tf)
+                else:
+                    self.add_file(info.filename, fd, mode)
+
+    def extract_tar(self, archive: tarfile.TarFile):
+        # Read as a stream, so each member must be consumed before the next
+        for member in archive:
+            if member.issym():
+                self.add_symlink(member.name, member.linkname)
+            elif member.isfile():
+                fd = archive.extractfile(member)
+                assert fd is not None
+                self.add_file(member.name, fd, member.mode)
+
+    def link_symlinks(self) -> tp.List[ExtractedFile]:
+        """Create the symlinks found, each pointing directly at the file it
+        resolves to
+        """
+        results = []
+        for name, target in self.symlinks.items():
+            seen = {name}
+            while target in self.symlinks:
+                if target in seen:
+                    raise ValueError(f'Symlink loop for {name}')
+                seen.add(target)
+                target = self.symlinks[target]
+            dest_dir = self.select(name)
+            if dest_dir is None:
+                continue
+            target_file = self.files.get(target)
+            assert target_file is not None, f'Target of {name} ({target}) not extracted'
+            assert target_file.filename.parent == dest_dir
+            filename = dest_dir / name
+            logger.debug(f'Linking {filename} -> {target}')
+            if filename.exists() or filename.is_symlink():
+                filename.unlink()
+            filename.symlink_to(target)
+            results.append(ExtractedFile(filename, symlink_target=target))
+        return results
+
+
+def extract_selected(
+    archive_file: Path,
+    select: Selector,
+    chunk_size: int = CHUNK_SIZE,
+) -> tp.List[ExtractedFile]:
+    """Extract the members of *archive_file* chosen by *select*
+
+    Members are streamed one at a time directly to their destination, so
+    nothing else is written to disk. A ``.tar.gz`` packed inside a zip
+    archive is streamed from the zip member and its contents handled the
+    same way.
+
+    Symlinks are created after all files are extracted and point directly
+    at the file they resolve to.
+
+    Returns the regular files followed by the symlinks.
+    """
+    ex = _Extraction(select, chunk_size)
+    logger.info(f'Extracting archive "{archive_file}"')
+    if zipfile.is_zipfile(archive_file):
+        with zipfile.ZipFile(archive_file) as zf:
+            ex.extract_zip(zf)
+    else:
+        with tarfile.open(archive_file, mode='r|*') as tf:
+            ex.extract_tar(tf)
+    results = list(ex.files.values())
+    results.extend(ex.link_symlinks())
+    return results
@@ -2,19 +2,20 @@
 from __future__ import annotations
 import typing as tp
 import os
+import time
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import dataclasses
 from contextlib import contextmanager
 import functools
+import hashlib
 
 from loguru import logger
 
 
 from pyrtlsdrlib import BuildType, FileType, BuildFile
-import requests
-import jsonfactory
 if tp.TYPE_CHECKING:
     from github.Repository import Repository as GitRepository
     from github.GitRelease import GitRelease
@@ -23,7 +24,16 @@ from github import Github
 import click
 
 from common import *
-from build_from_source import Builder
+from build_from_source import (
+    Builder, build_options, get_builder_kwargs, get_host_cpu_variants,
+)
+from pyrtlsdrlib.platform import CPU_VARIANTS
+from extract import extract_selected
+from manifest import write_manifest
+from download import (
+    MAX_WORKERS, DownloadCache, download, get_default_cache_root, get_download_cache,
+    set_download_cache,
+)
 
 
 def normalize_filenames_inplace(
@@ -286,18 +296,60 @@ class AssetBase(ObjBase):
             return 'source'
         raise ValueError('Could not determine dest_dirname')
 
+    @property
+    def cache_key(self) -> str:
+        """Key for the asset in the :class:`~download.DownloadCache`"""
+        return self._get_cache_key()
+
+    def _get_cache_key(self) -> str:
+        return hashlib.sha1(self.download_url.encode()).hexdigest()
+
+    def _get_expected_size(self) -> int|None:
+        return None
+
+    def _get_expected_sha256(self) -> str|None:
+        return None
+
+    def _get_download_kwargs(self) -> tp.Dict[str, tp.Any]:
+        return dict(
+            label=self.name,
+            expected_size=self._get_expected_size(),
+            expected_sha256=self._get_expected_sha256(),
+        )
+
     def download_to(self, dest_dir: Path) -> Path:
+        """Download the asset into *dest_dir*
+
+        Interrupted downloads are resumed and the result is checked against
+        the size and digest from the release metadata (where available).
+        """
         dest_filename = dest_dir / self.download_filename
         url = self.download_url
         logger.info(f'Downloading file to {dest_filename}, ({url=})')
-        r = requests.get(url, stream=True)
-        r.raise_for_status()
-        with dest_filename.open('wb') as fd:
-            for chunk in r.iter_content(chunk_size=128):
-                fd.write(chunk)
-        logger.success(f'Download complete: {dest_filename}')
+        cache = get_download_cache()
+        if cache is not None:
+            cache.fetch(self.cache_key, url, dest_filename, **self._get_download_kwargs())
+        else:
+            download(url, dest_filename, **self._get_download_kwargs())
         return dest_filename
 
+    @contextmanager
+    def open_archive(self) -> tp.Iterator[Path]:
+        """Context manager giving the filename of the downloaded asset
+
+        With a download cache the cached file is read in place, otherwise
+        it is downloaded to a temporary directory.
+        """
+        cache = get_download_cache()
+        if cache is not None:
+            result = cache.fetch(
+                self.cache_key, self.download_url, None, **self._get_download_kwargs(),
+            )
+            yield result.filename
+            return
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield self.download_to(Path(tmpdir))
+
     def extract_to(self, dest_root: Path) -> tp.List[BuildFile]:
         dest_dir = dest_root / self.get_dest_dirname()
         dest_dir.mkdir(exist_ok=True)
@@ -314,75 +366,21 @@ class AssetBase(ObjBase):
 
         results = self.build_files = []
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir = Path(tmpdir).resolve()
-            extract_dir = tmpdir / 'expanded'
-            extract_dir.mkdir()
-            archive_file = self.download_to(tmpdir)
-            logger.info(f'Extracting archive "{archive_file}" to {extract_dir}')
-            shutil.unpack_archive(archive_file, extract_dir)
-            tar_files = [f for f in extract_dir.glob('*.tar.gz')]
-            if len(tar_files):
-                assert len(tar_files) == 1
-                tf = tar_files[0]
-                new_tf = tmpdir / tf.name
-                logger.debug(f'Moving archive {tf} to {new_tf}')
-                tf = tf.rename(new_tf)
-                logger.debug(f'Extracting packed archive {tf}')
-                shutil.unpack_archive(tf, extract_dir)
-            logger.success(f'Archive extracted: {extract_dir}')
-
-            # find symlinks first to rebuild them later
-            symlinks = []
-            for filename in extract_dir.iterdir():
-                if not filename.is_symlink():
-                    continue
-                ftype = self._get_filetype(filename)
-                fdest_dir = dest_map.get(ftype)
-                if fdest_dir is None:
-                    continue
-                linked_file = filename.resolve().relative_to(extract_dir)
-                filename = fdest_dir / filename.name
+        def select(name: str) -> Path|None:
+            return dest_map.get(self._get_filetype(Path(name)))
+
+        with self.open_archive() as archive_file:
+            for f in extract_selected(archive_file, select):
                 build_file = BuildFile(
                     build_type=self.type,
-                    file_type=ftype,
-                    filename=filename,
-                    is_symlink=True,
-                    symlink_target=linked_file,
+                    file_type=self._get_filetype(f.filename),
+                    filename=f.filename,
+                    is_symlink=f.is_symlink,
+                    symlink_target=Path(f.symlink_target) if f.is_symlink else None,
                 )
-                symlinks.append(build_file)
-                logger.debug(f'found symlink: {build_file}')
-
-            # move files to `bin/` or `lib/`
-            for filename in extract_dir.iterdir():
-                logger.debug(f'Processing file: {filename}')
-                if filename.is_symlink():
-                    continue
-                assert filename.is_file()
-                ftype = self._get_filetype(filename)
-                logger.debug(f'{ftype=}, {filename.name=}')
-                fdest_dir = dest_map.get(ftype)
-                if fdest_dir is None:
-                    continue
-                logger.info(f'Adding {filename.name} to {fdest_dir}')
-                filename = filename.rename(fdest_dir / filename.name)
-                build_file = BuildFile(build_type=self.type, file_type=ftype, filename=filename)
-                results.append(build_file)
-
-            # rebuild any symlinks found earlier
-            for build_file in symlinks:
-                fn = build_file.filename.name
-                sym_fn = build_file.symlink_target.name
-                fdest_dir = build_file.filename.parent
-
-                symlink_target = fdest_dir / sym_fn
-                symlink_rel = symlink_target.relative_to(fdest_dir)
-                build_file.symlink_target = symlink_rel
-
-                logger.debug(f'Processing symlink: {build_file}')
-                assert symlink_target.exists()
-                build_file.filename.symlink_to(symlink_rel)
+                logger.debug(f'{build_file=}')
                 results.append(build_file)
+            logger.success(f'Archive extracted: {dest_dir}')
 
         logger.debug('Writing build metadata')
         self.files_updated = True
@@ -468,6 +466,19 @@ class Asset(AssetBase):
     def _get_download_url(self) -> str:
         return self.gh_asset.browser_download_url
 
+    def _get_cache_key(self) -> str:
+        return f'asset-{self.gh_asset.id}'
+
+    def _get_expected_size(self) -> int|None:
+        return self.gh_asset.size
+
+    def _get_expected_sha256(self) -> str|None:
+        # Only present for assets uploaded after GitHub began recording digests
+        digest = self.gh_asset.raw_data.get('digest')
+        if digest and digest.startswith('sha256:'):
+            return digest.split(':', 1)[1]
+        return None
+
 class SourceAsset(AssetBase):
     def __init__(self, src_url: str, **kwargs):
         self.src_url = src_url
@@ -485,11 +496,16 @@ class SourceAsset(AssetBase):
     def _get_download_filename(self) -> str:
         return 'source.tar.gz'
 
+    def _get_cache_key(self) -> str:
+        assert isinstance(self.parent, Release)
+        return f'source-{self.parent.gh_rel.id}'
+
 @logger.catch(reraise=True)
 def extract(
     dest_dir: Path = BUILD_DIR,
     repo_name: str = REPO_NAME,
     asset_types: BuildType = BUILD_DEFAULT,
+    max_workers: int = MAX_WORKERS,
 ) -> tp.Dict[str, tp.Any]:
 
     if asset_types & 'source':
@@ -498,144 +514,172 @@ def extract(
     repo = Repository(repo_name)
 
     results = {}
-    files_changed = []
 
-    changed = False
+    # Fetch the release attributes before they're read from multiple threads
+    repo.latest_release.get_build_meta()
 
+    assets = []
     for asset in repo.latest_release.assets.values():
         if not asset_types.contains(asset.type):
             logger.info(f'Skipping asset: {asset}')
             continue
+        assets.append(asset)
+
+    def process_asset(asset: AssetBase):
+        start_ts = time.monotonic()
         if not asset.needs_update(dest_dir):
             logger.info(f'No update needed for "{asset!r}"')
             assert asset.metadata_matches
-            meta = asset.update_metadata(dest_dir)
-            results[asset.name] = meta
-            continue
+            return asset.update_metadata(dest_dir)
         files = asset.extract_to(dest_dir)
         if len(files):
-            changed = True
-            files_changed.extend(files)
             meta = asset.get_build_meta()
         else:
             assert asset.metadata_matches
             meta = asset.update_metadata(dest_dir)
-        results[asset.name] = meta
+        logger.info(f'Processed "{asset}" in {time.monotonic() - start_ts:.2f}s')
+        return meta
+
+    start_ts = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {asset.name: executor.submit(process_asset, asset) for asset in assets}
+        for name, fut in futures.items():
+            results[name] = fut.result()
+    logger.success(f'Processed {len(assets)} assets in {time.monotonic() - start_ts:.2f}s')
 
     write_build_meta(dest_dir, results)
 
     return results
 
+def get_project_filename(f: BuildFile, dest_dir: Path) -> Path|None:
+    """Get the filename in *dest_dir* for a build file, or ``None`` if it is
+    not copied to the project
+    """
+    if f.file_type != FileType.lib:
+        return None
+    if f.build_type & 'macos':
+        if f.filename.suffix != '.dylib':
+            return None
+        dest_fn = f.filename.name
+    elif f.build_type & 'ubuntu':
+        if '.so' not in f.filename.suffixes:
+            return None
+        dest_fn = f.filename.name
+    elif f.build_type & 'windows':
+        dest_fn = [f.filename.stem]
+        for suffix in ['w32', 'w64', 'static', 'dlldep', 'udpsrv']:
+            if f.build_type & suffix:
+                dest_fn.append(suffix)
+        dest_fn = '_'.join(dest_fn)
+        dest_fn = f'{dest_fn}{f.filename.suffix}'
+    else:
+        raise RuntimeError(f'Unknown build type: {f.build_type}')
+    return dest_dir / dest_fn
+
+def _project_file_matches(proj_file: Path, entry: tp.Dict[str, tp.Any]|None, sha256: str) -> bool:
+    if proj_file.is_symlink() or not proj_file.exists():
+        return False
+    if entry is not None and entry.get('sha256') == sha256:
+        return True
+    # Metadata from before hashes were recorded (or a modified file)
+    return get_file_sha256(proj_file) == sha256
+
 @logger.catch(reraise=True)
 def copy_builds_to_project(build_dir: Path = BUILD_DIR, dest_dir: Path = PROJECT_LIB_DIR):
+    """Copy the libraries in *build_dir* to *dest_dir*
+
+    Files are compared by their content hash (stored for each ``proj_file``
+    in the project metadata), so only files that actually changed are
+    copied, regardless of the release tag.
+
+    Changed files are first staged within *dest_dir* (using a reflink
+    where possible) then moved into place with :func:`os.replace`,
+    so a library is never seen partially written.
+    """
     build_meta = read_build_meta(build_dir)
     try:
         project_meta = read_build_meta(dest_dir)
     except FileNotFoundError:
         project_meta = {}
 
-    updates_needed = {}
-
-    logger.info('Checking for project file updates...')
-    for asset_name, asset_data in build_meta.items():
-        if asset_name not in project_meta:
-            updates_needed[asset_name] = asset_data['build_files'].copy()
-            continue
-        build_files = asset_data['build_files']
-        build_files = {f.filename.name: f for f in build_files}
-        _updates = []
-        proj_asset = project_meta[asset_name]
-        for data in proj_asset.values():
-            needs_update = False
-            proj_file = dest_dir / data['proj_file']
-            if not proj_file.exists():
-                needs_update = True
-            elif data['tag_name'] != asset_data['tag_name']:
-                needs_update = True
-            if needs_update:
-                bf = build_files[data['build_file'].filename.name]
-                _updates.append(bf)
-        if len(_updates):
-            updates_needed[asset_name] = _updates
-
     meta_updates = {}
-
-    num_updates = 0
-    for asset_name, build_files in updates_needed.items():
-        logger.info(f'Updating files for "{asset_name}"')
-        asset_data = build_meta[asset_name]
-        _updates = {}
-        symlinks = []
-        build_files_rel = normalize_filenames_copy(build_files, build_dir)
-        for f, f_rel in zip(build_files, build_files_rel):
-            if f.file_type != FileType.lib:
-                continue
-            if f.build_type & 'macos':
-                if f.filename.suffix != '.dylib':
+    staged_files = []
+    staged_symlinks = []
+    staging_dir = Path(tempfile.mkdtemp(prefix='.staging-', dir=dest_dir))
+    try:
+        logger.info('Checking for project file updates...')
+        for asset_name, asset_data in build_meta.items():
+            proj_asset = project_meta.get(asset_name, {})
+            _updates = {}
+            symlinks = []
+            build_files = asset_data['build_files']
+            build_files_rel = normalize_filenames_copy(build_files, build_dir)
+            for f, f_rel in zip(build_files, build_files_rel):
+                dest_fn = get_project_filename(f, dest_dir)
+                if dest_fn is None:
                     continue
-                dest_fn = f.filename.name
-            elif f.build_type & 'ubuntu':
-                if '.so' not in f.filename.suffixes:
+                if f.is_symlink or f.filename.is_symlink():
+                    symlinks.append((f, f_rel, dest_fn))
                     continue
-                dest_fn = f.filename.name
-            elif f.build_type & 'windows':
-                dest_fn = [f.filename.stem]
-                for suffix in ['w32', 'w64', 'static', 'dlldep', 'udpsrv']:
-                    if f.build_type & suffix:
-                        dest_fn.append(suffix)
-                dest_fn = '_'.join(dest_fn)
-                dest_fn = f'{dest_fn}{f.filename.suffix}'
-            else:
-                raise RuntimeError(f'Unknown build type: {f.built_type}')
-            dest_fn = dest_dir / dest_fn
-            if f.is_symlink or f.filename.is_symlink():
-                symlinks.append((f, f_rel, dest_fn))
-                continue
-            logger.debug(f'copying {f.filename} to {dest_fn}')
-            shutil.copy2(f.filename, dest_fn)
-            dest_fn_rel = dest_fn.relative_to(dest_dir)
-            _updates[str(dest_fn_rel)] = dict(
-                tag_name=asset_data['tag_name'],
-                build_file=f_rel,
-                proj_file=dest_fn_rel,
-            )
-
-        for f, f_rel, dest_fn in symlinks:
-            sym_fn = f.symlink_target.name
-            symlink_target = dest_dir / sym_fn
-            symlink_rel = symlink_target.relative_to(dest_dir)
-            logger.debug(f'Symlinking {dest_fn} -> {symlink_target} ({symlink_rel})')
-            assert symlink_target.exists()
-            if dest_fn.exists():
-                dest_fn.unlink()
-            dest_fn.symlink_to(symlink_rel)
-            try:
-                assert dest_fn.resolve() == symlink_target != dest_fn
-            except AssertionError:
-                dest_fn.unlink()
-                raise
-            dest_fn_rel = dest_fn.relative_to(dest_dir)
-            _updates[str(dest_fn_rel)] = dict(
-                tag_name=asset_data['tag_name'],
-                build_file=f_rel,
-                proj_file=dest_fn_rel,
-            )
-        _num_updates = len(_updates)
-        if _num_updates:
-            meta_updates[asset_name] = _updates
-            logger.success(f'Updated {_num_updates} files for "{asset_name}"')
-        num_updates += _num_updates
-
-    if len(meta_updates):
-        logger.debug(f'Updating project_meta')
-        for asset_name, updates in meta_updates.items():
-            existing = project_meta.setdefault(asset_name, {})
-            existing.update(updates)
-        write_build_meta(dest_dir, project_meta)
-        logger.success(f'Updated {num_updates} total project files')
-    else:
-        logger.info('Project files up to date')
+                dest_fn_rel = dest_fn.relative_to(dest_dir)
+                entry = proj_asset.get(str(dest_fn_rel))
+                sha256 = get_file_sha256(f.filename)
+                if _project_file_matches(dest_fn, entry, sha256):
+                    logger.debug(f'{dest_fn_rel} is unchanged')
+                else:
+                    staged_fn = staging_dir / dest_fn_rel
+                    method = clone_file(f.filename, staged_fn)
+                    logger.debug(f'staged {f.filename} for {dest_fn} ({method})')
+                    staged_files.append((staged_fn, dest_fn))
+                _updates[str(dest_fn_rel)] = dict(
+                    tag_name=asset_data['tag_name'],
+                    build_file=f_rel,
+                    proj_file=dest_fn_rel,
+                    sha256=sha256,
+                )
 
+            for f, f_rel, dest_fn in symlinks:
+                sym_fn = f.symlink_target.name
+                symlink_target = dest_dir / sym_fn
+                assert symlink_target.exists() or (staging_dir / sym_fn).exists()
+                if dest_fn.is_symlink() and os.readlink(dest_fn) == sym_fn:
+                    logger.debug(f'{dest_fn.name} is unchanged')
+                else:
+                    staged_fn = staging_dir / dest_fn.name
+                    logger.debug(f'Staging symlink {dest_fn} -> {sym_fn}')
+                    staged_fn.symlink_to(sym_fn)
+                    staged_symlinks.append((staged_fn, dest_fn))
+                dest_fn_rel = dest_fn.relative_to(dest_dir)
+                _updates[str(dest_fn_rel)] = dict(
+                    tag_name=asset_data['tag_name'],
+                    build_file=f_rel,
+                    proj_file=dest_fn_rel,
+                )
+            _updates = {k:v for k,v in _updates.items() if proj_asset.get(k) != v}
+            if len(_updates):
+                meta_updates[asset_name] = _updates
+
+        # Swap in files before the symlinks pointing to them
+        for staged_fn, dest_fn in staged_files + staged_symlinks:
+            logger.debug(f'Replacing {dest_fn}')
+            os.replace(staged_fn, dest_fn)
+        num_updates = len(staged_files) + len(staged_symlinks)
+        if num_updates:
+            logger.success(f'Updated {num_updates} total project files')
+
+        if len(meta_updates):
+            logger.debug(f'Updating project_meta')
+            for asset_name, updates in meta_updates.items():
+                existing = project_meta.setdefault(asset_name, {})
+                existing.update(updates)
+            tmp_meta_fn = staging_dir / 'build-meta.json'
+            write_build_meta(tmp_meta_fn, project_meta)
+            os.replace(tmp_meta_fn, get_meta_filename(dest_dir))
+        if not num_updates:
+            logger.info('Project files up to date')
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    write_manifest(dest_dir)
 
 
 @contextmanager
@@ -667,11 +711,40 @@ def build_dir_maker(p: Path|None = None, use_tmp: bool = False, cleanup: bool =
     type=click.Choice(['x86_64', 'arm64']),
     required=False,
 )
-def main(build_dir, project_lib_dir, custom_lib_dir, repo_name, use_tmp, build_types, macos_arch):
+@click.option(
+    '--udpsrv/--no-udpsrv',
+    default=False,
+    help='Also build the source release with the UDP control server',
+)
+@click.option('--jobs', '-j', type=int, default=MAX_WORKERS, show_default=True)
+@click.option(
+    '--download-cache',
+    type=click.Path(file_okay=False),
+    help='Directory for the download cache',
+)
+@click.option('--no-download-cache', is_flag=True, help='Always download assets')
+@click.option('--offline', is_flag=True, help='Only use cached downloads')
+@click.option(
+    '--cpu-variant', 'cpu_variants', type=click.Choice(list(CPU_VARIANTS)), multiple=True,
+    help='Also build CPU-optimized variants of the source release (Linux only)',
+)
+@build_options
+def main(
+    build_dir, project_lib_dir, custom_lib_dir, repo_name, use_tmp, build_types, macos_arch,
+    udpsrv, jobs, download_cache, no_download_cache, offline, cpu_variants, **builder_opts,
+):
     build_types = BuildType.from_str('|'.join(build_types))
+    if no_download_cache:
+        set_download_cache(None)
+    elif download_cache is not None or offline:
+        root = Path(download_cache) if download_cache is not None else get_default_cache_root()
+        set_download_cache(DownloadCache(root, offline=offline))
 
     with build_dir_maker(build_dir, use_tmp) as real_build_dir:
-        extract(dest_dir=real_build_dir, repo_name=repo_name, asset_types=build_types)
+        extract(
+            dest_dir=real_build_dir, repo_name=repo_name, asset_types=build_types,
+            max_workers=jobs,
+        )
         copy_builds_to_project(build_dir=real_build_dir, dest_dir=project_lib_dir)
 
     repo = Repository(repo_name)
@@ -681,10 +754,21 @@ def main(build_dir, project_lib_dir, custom_lib_dir, repo_name, use_tmp, build_t
         src_asset = [a for a in release.assets.values() if a.type & 'source']
         assert len(src_asset) == 1
         src_asset = src_asset[0]
-        with Builder(release, src_asset, custom_lib_dir, macos_arch) as builder:
+        builder_kw = get_builder_kwargs(**builder_opts)
+        with Builder(release, src_asset, custom_lib_dir, macos_arch, **builder_kw) as builder:
             build_files = builder.build()
-        fn = custom_lib_dir / 'build-meta.json'
-        fn.write_text(jsonfactory.dumps(build_files, indent=2))
+        if udpsrv:
+            with Builder(
+                release, src_asset, custom_lib_dir, macos_arch, udpsrv=True, **builder_kw,
+            ) as builder:
+                build_files.extend(builder.build())
+        for cpu_variant in get_host_cpu_variants(cpu_variants):
+            with Builder(
+                release, src_asset, custom_lib_dir, macos_arch, cpu_variant=cpu_variant, **builder_kw,
+            ) as builder:
+                build_files.extend(builder.build())
+        write_build_meta(custom_lib_dir, build_files)
+        write_manifest(custom_lib_dir)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+"""Generate the library manifest read by :func:`pyrtlsdrlib.lib.read_manifest`
+"""
+from __future__ import annotations
+import typing as tp
+import os
+import json
+from pathlib import Path
+
+from loguru import logger
+import click
+
+from pyrtlsdrlib import BuildType, BuildFile
+from pyrtlsdrlib.lib import MANIFEST_FILENAME, MANIFEST_FORMAT, get_platform_key
+from pyrtlsdrlib.platform import CPU_VARIANTS, get_binary_archs, requires_glibc
+
+from common import *
+
+__all__ = ('get_platform_key_for', 'get_cpu_variant', 'build_manifest', 'write_manifest')
+
+
+def get_platform_key_for(build_type: BuildType) -> BuildType|None:
+    """Get the manifest platform key for libraries of the given build type
+
+    Source builds are made on the host, so they use the key of the
+    current platform.
+    """
+    if build_type & 'source':
+        return get_platform_key()
+    if build_type & 'macos':
+        return BuildType.macos
+    elif build_type & 'ubuntu':
+        return BuildType.linux
+    elif build_type & 'windows':
+        arch = build_type & 'w32|w64'
+        if not arch:
+            return None
+        return BuildType.windows | arch
+    return None
+
+
+def get_cpu_variant(build_type: BuildType) -> str|None:
+    """Get the :data:`~pyrtlsdrlib.platform.CPU_VARIANTS` name of a build type
+    (``None`` for generic builds)
+    """
+    for name in CPU_VARIANTS:
+        if build_type & name:
+            return name
+    return None
+
+
+def _iter_meta_files(lib_dir: Path) -> tp.Iterator[tp.Tuple[str, BuildFile]]:
+    """Yield the filename (relative to *lib_dir*) and :class:`BuildFile` of
+    each library recorded in the build metadata of *lib_dir*
+    """
+    meta = read_build_meta(lib_dir)
+    if isinstance(meta, dict):
+        # Written by `get_releases.copy_builds_to_project`
+        for asset_data in meta.values():
+            for data in asset_data.values():
+                yield str(data['proj_file']), data['build_file']
+    else:
+        # A list of BuildFiles from `build_from_source`
+        for bf in meta:
+            if bf.build_type & 'udpsrv':
+                # Placed in a subdirectory and found separately
+                continue
+            cpu_variant = get_cpu_variant(bf.build_type)
+            if cpu_variant is not None:
+                # Placed in a subdirectory named for the variant
+                yield f'{cpu_variant}/{bf.filename.name}', bf
+            else:
+                yield bf.filename.name, bf
+
+
+_CPU_VARIANT_RANKS = {name: i for i, name in enumerate(CPU_VARIANTS)}
+
+def _get_sort_key(build_type: BuildType, filename: str):
+    # Static builds have no dependencies on other dlls so are tried first.
+    # CPU-optimized builds go before the generic build in order of preference
+    cpu_variant = get_cpu_variant(build_type)
+    cpu_rank = len(CPU_VARIANTS) if cpu_variant is None else _CPU_VARIANT_RANKS[cpu_variant]
+    return (bool(build_type & 'udpsrv'), bool(build_type & 'dlldep'), cpu_rank, filename)
+
+
+def build_manifest(lib_dir: Path) -> tp.Dict[str, tp.Any]:
+    """Build the manifest for the libraries in *lib_dir* from its build metadata
+
+    For each platform, the entries are the real (non-symlink) library files
+    with any symlinks resolving to them listed as aliases. CPU-optimized
+    variants are stored in subdirectories named for the variant.
+    """
+    real_files: tp.Dict[str, BuildType] = {}
+    symlinks: tp.Dict[str, str] = {}
+    for filename, bf in _iter_meta_files(lib_dir):
+        fn = lib_dir / filename
+        if not fn.exists():
+            logger.warning(f'{fn} is listed in the build metadata but does not exist')
+            continue
+        if bf.is_symlink or fn.is_symlink():
+            # Keyed the same as `real_files` (relative to lib_dir)
+            target = Path(filename).parent / Path(os.readlink(fn)).name
+            symlinks[filename] = target.as_posix()
+        else:
+            real_files[filename] = bf.build_type
+
+    aliases: tp.Dict[str, tp.List[str]] = {filename: [] for filename in real_files}
+    for filename, target in symlinks.items():
+        seen = {filename}
+        while target in symlinks and target not in seen:
+            seen.add(target)
+            target = symlinks[target]
+        if target in aliases:
+            aliases[target].append(filename)
+
+    platforms: tp.Dict[str, tp.List[tp.Tuple[tp.Any, tp.Dict[str, tp.Any]]]] = {}
+    for filename, build_type in real_files.items():
+        key = get_platform_key_for(build_type)
+        if key is None:
+            continue
+        fn = lib_dir / filename
+        archs = get_binary_archs(fn)
+        entry = dict(
+            file=filename,
+            aliases=sorted(aliases[filename]),
+            archs=sorted(archs) if archs is not None else None,
+            requires_glibc=requires_glibc(fn),
+            cpu=get_cpu_variant(build_type),
+        )
+        platforms.setdefault(key.to_str(), []).append((_get_sort_key(build_type, filename), entry))
+    return dict(
+        format=MANIFEST_FORMAT,
+        platforms={
+            key: [entry for _, entry in sorted(entries, key=lambda t: t[0])]
+            for key, entries in sorted(platforms.items())
+        },
+    )
+
+
+def write_manifest(lib_dir: Path) -> tp.Dict[str, tp.Any]|None:
+    """Write the manifest for *lib_dir* (if it has build metadata)
+    """
+    try:
+        manifest = build_manifest(lib_dir)
+    except FileNotFoundError:
+        logger.info(f'No build metadata in {lib_dir}, skipping manifest')
+        return None
+    fn = lib_dir / MANIFEST_FILENAME
+    tmp_fn = fn.with_name(f'{fn.name}.{os.getpid()}.tmp')
+    tmp_fn.write_text(json.dumps(manifest, separators=(',', ':')))
+    os.replace(tmp_fn, fn)
+    logger.success(f'Wrote {fn}')
+    return manifest
+
+
+@click.command()
+@click.option('--lib-dir', type=click.Path(file_okay=False), multiple=True)
+def main(lib_dir):
+    """Write manifests for the project and custom build library directories
+    """
+    lib_dirs = [Path(p) for p in lib_dir] if len(lib_dir) else [PROJECT_LIB_DIR, CUSTOM_LIB_DIR]
+    for p in lib_dirs:
+        write_manifest(p)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,701 @@
+/*
+ * Simulated librtlsdr
+ *
+ * Exports the librtlsdr API without requiring hardware (or libusb).
+ * Devices deliver a constant tone at fs/64 and can be paced to the
+ * configured sample rate.
+ *
+ * Environment variables:
+ *
+ *   RTLSDR_SIM_DEVICES        Number of devices (default 1)
+ *   RTLSDR_SIM_RATE           Samples per second delivered by the read
+ *                             functions. "0" disables pacing. Defaults to
+ *                             the device sample rate.
+ *   RTLSDR_SIM_OPEN_DELAY_MS  Time taken by rtlsdr_open (default 0)
+ *   RTLSDR_SIM_UDP_PORT       Port of the UDP control server (default 32323,
+ *                             plus the device index). "0" picks a free port.
+ *
+ * In addition to the librtlsdr API, rtlsdr_sim_get_dropped() returns the
+ * number of buffers skipped because the async callback fell behind.
+ *
+ * When built with PROVIDE_UDP_SERVER, each open device listens on the
+ * loopback interface for the udpsrv control commands (one per datagram):
+ *
+ *   f <freq>                 Set the center frequency
+ *   i <freq>                 Set the IF frequency
+ *   s <reg> <value> [<mask>] Set the bits of a tuner register in mask
+ *                            (default 0xff)
+ *   g <reg>                  Get a tuner register, replying "! <value>"
+ *
+ * Invalid commands get a "? <message>" reply. rtlsdr_sim_get_udp_port()
+ * returns the port in use (-1 if the server is not running) and
+ * rtlsdr_sim_get_if_freq() the IF frequency last set.
+ */
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdio.h>
+#include <math.h>
+#include <errno.h>
+
+#ifndef M_PI
+#define M_PI 3.14159265358979323846
+#endif
+
+#ifdef _WIN32
+#include <windows.h>
+#define RTLSDR_API __declspec(dllexport)
+#else
+#include <time.h>
+#define RTLSDR_API __attribute__((visibility("default")))
+#endif
+
+#if defined(WITH_UDP_SERVER) && !defined(_WIN32)
+#define HAVE_UDP_SERVER 1
+#include <pthread.h>
+#include <unistd.h>
+#include <sys/socket.h>
+#include <sys/time.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+#define DEFAULT_UDP_PORT 32323
+#endif
+
+#define DEFAULT_BUF_NUMBER 15
+#define DEFAULT_BUF_LENGTH (16 * 32 * 512)
+#define DEFAULT_SAMPLE_RATE 2048000
+#define TONE_PERIOD 64
+
+enum rtlsdr_tuner {
+	RTLSDR_TUNER_UNKNOWN = 0,
+	RTLSDR_TUNER_E4000,
+	RTLSDR_TUNER_FC0012,
+	RTLSDR_TUNER_FC0013,
+	RTLSDR_TUNER_FC2580,
+	RTLSDR_TUNER_R820T,
+	RTLSDR_TUNER_R828D
+};
+
+enum async_status {
+	ASYNC_INACTIVE = 0,
+	ASYNC_RUNNING,
+	ASYNC_CANCELING
+};
+
+typedef void (*rtlsdr_read_async_cb_t)(unsigned char *buf, uint32_t len, void *ctx);
+
+typedef struct rtlsdr_dev {
+	uint32_t index;
+	uint32_t rtl_xtal;
+	uint32_t tun_xtal;
+	uint32_t center_freq;
+	uint32_t sample_rate;
+	uint32_t bandwidth;
+	int freq_correction;
+	int gain;
+	int gain_mode;
+	int if_gain;
+	int agc_mode;
+	int test_mode;
+	int direct_sampling;
+	int offset_tuning;
+	int bias_tee;
+	volatile int async_status;
+	volatile int async_cancel;
+	uint64_t dropped;
+	unsigned char eeprom[256];
+	uint32_t if_freq;
+	unsigned char tuner_regs[256];
+	int udp_port;
+#ifdef HAVE_UDP_SERVER
+	int udp_sock;
+	volatile int udp_stop;
+	pthread_t udp_thread;
+#endif
+} rtlsdr_dev_t;
+
+static const int r820t_gains[] = {
+	0, 9, 14, 27, 37, 77, 87, 125, 144, 157, 166, 197, 207, 229, 254,
+	280, 297, 328, 338, 364, 372, 386, 402, 421, 434, 439, 445, 480, 496
+};
+
+static unsigned char tone[TONE_PERIOD * 2];
+static int tone_ready = 0;
+
+static long env_long(const char *name, long default_value)
+{
+	const char *s = getenv(name);
+	if (!s || !*s)
+		return default_value;
+	return strtol(s, NULL, 10);
+}
+
+static double now_seconds(void)
+{
+#ifdef _WIN32
+	LARGE_INTEGER freq, count;
+	QueryPerformanceFrequency(&freq);
+	QueryPerformanceCounter(&count);
+	return (double)count.QuadPart / (double)freq.QuadPart;
+#else
+	struct timespec ts;
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec * 1e-9;
+#endif
+}
+
+static void sleep_seconds(double s)
+{
+	if (s <= 0)
+		return;
+#ifdef _WIN32
+	Sleep((DWORD)(s * 1000));
+#else
+	struct timespec ts;
+	ts.tv_sec = (time_t)s;
+	ts.tv_nsec = (long)((s - ts.tv_sec) * 1e9);
+	nanosleep(&ts, NULL);
+#endif
+}
+
+static void init_tone(void)
+{
+	int i;
+	if (tone_ready)
+		return;
+	for (i = 0; i < TONE_PERIOD; i++) {
+		double phase = 2 * M_PI * i / TONE_PERIOD;
+		tone[i * 2] = (unsigned char)(127.5 + 100 * cos(phase));
+		tone[i * 2 + 1] = (unsigned char)(127.5 + 100 * sin(phase));
+	}
+	tone_ready = 1;
+}
+
+static void fill_tone(unsigned char *buf, uint32_t len)
+{
+	uint32_t i;
+	init_tone();
+	for (i = 0; i < len; i++)
+		buf[i] = tone[i % sizeof(tone)];
+}
+
+static double get_rate(rtlsdr_dev_t *dev)
+{
+	return (double)env_long("RTLSDR_SIM_RATE", dev->sample_rate);
+}
+
+/* Device enumeration */
+
+RTLSDR_API uint32_t rtlsdr_get_device_count(void)
+{
+	long n = env_long("RTLSDR_SIM_DEVICES", 1);
+	return n < 0 ? 0 : (uint32_t)n;
+}
+
+RTLSDR_API const char *rtlsdr_get_device_name(uint32_t index)
+{
+	if (index >= rtlsdr_get_device_count())
+		return "";
+	return "Simulated RTL2832U";
+}
+
+RTLSDR_API int rtlsdr_get_device_usb_strings(uint32_t index, char *manufact,
+					     char *product, char *serial)
+{
+	if (index >= rtlsdr_get_device_count())
+		return -1;
+	if (manufact)
+		strcpy(manufact, "pyrtlsdrlib");
+	if (product)
+		strcpy(product, "RTL2838 Simulator");
+	if (serial)
+		snprintf(serial, 256, "SIM%05u", index);
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_index_by_serial(const char *serial)
+{
+	uint32_t i, count = rtlsdr_get_device_count();
+	char buf[256];
+	if (!serial)
+		return -1;
+	if (!count)
+		return -2;
+	for (i = 0; i < count; i++) {
+		rtlsdr_get_device_usb_strings(i, NULL, NULL, buf);
+		if (!strcmp(serial, buf))
+			return (int)i;
+	}
+	return -3;
+}
+
+RTLSDR_API int rtlsdr_set_center_freq(rtlsdr_dev_t *dev, uint32_t freq);
+
+#ifdef HAVE_UDP_SERVER
+
+/* Handle one command, returning the length of the reply written (0 for none) */
+static int udp_handle_command(rtlsdr_dev_t *dev, char *cmd, char *reply, size_t reply_len)
+{
+	long long args[3];
+	int nargs = 0;
+	char op, *end;
+	unsigned mask;
+
+	while (*cmd == ' ')
+		cmd++;
+	op = *cmd++;
+	while (nargs < 3) {
+		long long v = strtoll(cmd, &end, 0);
+		if (end == cmd)
+			break;
+		args[nargs++] = v;
+		cmd = end;
+	}
+	switch (op) {
+	case 'f':
+		if (nargs != 1 || args[0] < 0 || args[0] > UINT32_MAX)
+			break;
+		rtlsdr_set_center_freq(dev, (uint32_t)args[0]);
+		return 0;
+	case 'i':
+		if (nargs != 1 || args[0] < 0 || args[0] > UINT32_MAX)
+			break;
+		dev->if_freq = (uint32_t)args[0];
+		return 0;
+	case 's':
+		if (nargs < 2 || args[0] < 0 || args[0] > 0xff)
+			break;
+		mask = nargs > 2 ? (unsigned)args[2] & 0xff : 0xff;
+		dev->tuner_regs[args[0]] = (dev->tuner_regs[args[0]] & ~mask) | ((unsigned)args[1] & mask);
+		return 0;
+	case 'g':
+		if (nargs != 1 || args[0] < 0 || args[0] > 0xff)
+			break;
+		return snprintf(reply, reply_len, "! %u\n", dev->tuner_regs[args[0]]);
+	}
+	return snprintf(reply, reply_len, "? invalid command\n");
+}
+
+static void *udp_server_thread(void *arg)
+{
+	rtlsdr_dev_t *dev = arg;
+	char buf[256], reply[64];
+	struct sockaddr_in addr;
+	socklen_t addr_len;
+	ssize_t n;
+	int reply_len;
+
+	while (!dev->udp_stop) {
+		addr_len = sizeof(addr);
+		n = recvfrom(dev->udp_sock, buf, sizeof(buf) - 1, 0, (struct sockaddr *)&addr, &addr_len);
+		if (n <= 0)
+			continue;
+		buf[n] = 0;
+		reply_len = udp_handle_command(dev, buf, reply, sizeof(reply));
+		if (reply_len > 0)
+			sendto(dev->udp_sock, reply, reply_len, 0, (struct sockaddr *)&addr, addr_len);
+	}
+	return NULL;
+}
+
+static void udp_server_start(rtlsdr_dev_t *dev)
+{
+	struct sockaddr_in addr;
+	socklen_t addr_len = sizeof(addr);
+	struct timeval tv = {0, 50000};
+	int rcvbuf = 1 << 20;
+	long port = env_long("RTLSDR_SIM_UDP_PORT", DEFAULT_UDP_PORT);
+
+	dev->udp_port = -1;
+	dev->udp_sock = socket(AF_INET, SOCK_DGRAM, 0);
+	if (dev->udp_sock < 0)
+		return;
+	/* The timeout lets the thread notice udp_stop */
+	setsockopt(dev->udp_sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+	setsockopt(dev->udp_sock, SOL_SOCKET, SO_RCVBUF, &rcvbuf, sizeof(rcvbuf));
+	memset(&addr, 0, sizeof(addr));
+	addr.sin_family = AF_INET;
+	addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+	addr.sin_port = htons(port ? (uint16_t)(port + dev->index) : 0);
+	if (bind(dev->udp_sock, (struct sockaddr *)&addr, sizeof(addr)) < 0
+	    || getsockname(dev->udp_sock, (struct sockaddr *)&addr, &addr_len) < 0) {
+		close(dev->udp_sock);
+		return;
+	}
+	dev->udp_stop = 0;
+	if (pthread_create(&dev->udp_thread, NULL, udp_server_thread, dev) != 0) {
+		close(dev->udp_sock);
+		return;
+	}
+	dev->udp_port = ntohs(addr.sin_port);
+}
+
+static void udp_server_stop(rtlsdr_dev_t *dev)
+{
+	if (dev->udp_port < 0)
+		return;
+	dev->udp_stop = 1;
+	pthread_join(dev->udp_thread, NULL);
+	close(dev->udp_sock);
+	dev->udp_port = -1;
+}
+
+#else
+
+static void udp_server_start(rtlsdr_dev_t *dev)
+{
+	dev->udp_port = -1;
+}
+
+static void udp_server_stop(rtlsdr_dev_t *dev)
+{
+	(void)dev;
+}
+
+#endif
+
+RTLSDR_API int rtlsdr_open(rtlsdr_dev_t **out_dev, uint32_t index)
+{
+	rtlsdr_dev_t *dev;
+	if (index >= rtlsdr_get_device_count())
+		return -1;
+	sleep_seconds(env_long("RTLSDR_SIM_OPEN_DELAY_MS", 0) / 1000.0);
+	dev = calloc(1, sizeof(rtlsdr_dev_t));
+	if (!dev)
+		return -ENOMEM;
+	dev->index = index;
+	dev->rtl_xtal = 28800000;
+	dev->tun_xtal = 28800000;
+	dev->sample_rate = DEFAULT_SAMPLE_RATE;
+	dev->center_freq = 100000000;
+	dev->gain_mode = 0;
+	udp_server_start(dev);
+	*out_dev = dev;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_close(rtlsdr_dev_t *dev)
+{
+	if (!dev)
+		return -1;
+	while (dev->async_status != ASYNC_INACTIVE)
+		sleep_seconds(.001);
+	udp_server_stop(dev);
+	free(dev);
+	return 0;
+}
+
+/* Configuration */
+
+RTLSDR_API int rtlsdr_set_xtal_freq(rtlsdr_dev_t *dev, uint32_t rtl_freq, uint32_t tuner_freq)
+{
+	if (!dev)
+		return -1;
+	dev->rtl_xtal = rtl_freq;
+	dev->tun_xtal = tuner_freq;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_xtal_freq(rtlsdr_dev_t *dev, uint32_t *rtl_freq, uint32_t *tuner_freq)
+{
+	if (!dev)
+		return -1;
+	if (rtl_freq)
+		*rtl_freq = dev->rtl_xtal;
+	if (tuner_freq)
+		*tuner_freq = dev->tun_xtal;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_usb_strings(rtlsdr_dev_t *dev, char *manufact, char *product, char *serial)
+{
+	if (!dev)
+		return -1;
+	return rtlsdr_get_device_usb_strings(dev->index, manufact, product, serial);
+}
+
+RTLSDR_API int rtlsdr_write_eeprom(rtlsdr_dev_t *dev, uint8_t *data, uint8_t offset, uint16_t len)
+{
+	if (!dev || offset + len > (int)sizeof(dev->eeprom))
+		return -1;
+	memcpy(dev->eeprom + offset, data, len);
+	return len;
+}
+
+RTLSDR_API int rtlsdr_read_eeprom(rtlsdr_dev_t *dev, uint8_t *data, uint8_t offset, uint16_t len)
+{
+	if (!dev || offset + len > (int)sizeof(dev->eeprom))
+		return -1;
+	memcpy(data, dev->eeprom + offset, len);
+	return len;
+}
+
+RTLSDR_API int rtlsdr_set_center_freq(rtlsdr_dev_t *dev, uint32_t freq)
+{
+	if (!dev)
+		return -1;
+	dev->center_freq = freq;
+	return 0;
+}
+
+RTLSDR_API uint32_t rtlsdr_get_center_freq(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->center_freq : 0;
+}
+
+RTLSDR_API int rtlsdr_set_freq_correction(rtlsdr_dev_t *dev, int ppm)
+{
+	if (!dev)
+		return -1;
+	if (dev->freq_correction == ppm)
+		return -2;
+	dev->freq_correction = ppm;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_freq_correction(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->freq_correction : 0;
+}
+
+RTLSDR_API enum rtlsdr_tuner rtlsdr_get_tuner_type(rtlsdr_dev_t *dev)
+{
+	return dev ? RTLSDR_TUNER_R820T : RTLSDR_TUNER_UNKNOWN;
+}
+
+RTLSDR_API int rtlsdr_get_tuner_gains(rtlsdr_dev_t *dev, int *gains)
+{
+	int n = sizeof(r820t_gains) / sizeof(r820t_gains[0]);
+	if (!dev)
+		return -1;
+	if (gains)
+		memcpy(gains, r820t_gains, sizeof(r820t_gains));
+	return n;
+}
+
+RTLSDR_API int rtlsdr_set_tuner_gain(rtlsdr_dev_t *dev, int gain)
+{
+	if (!dev)
+		return -1;
+	dev->gain = gain;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_tuner_gain(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->gain : 0;
+}
+
+RTLSDR_API int rtlsdr_set_tuner_bandwidth(rtlsdr_dev_t *dev, uint32_t bw)
+{
+	if (!dev)
+		return -1;
+	dev->bandwidth = bw;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_tuner_if_gain(rtlsdr_dev_t *dev, int stage, int gain)
+{
+	if (!dev)
+		return -1;
+	dev->if_gain = gain;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_tuner_gain_mode(rtlsdr_dev_t *dev, int manual)
+{
+	if (!dev)
+		return -1;
+	dev->gain_mode = manual;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_sample_rate(rtlsdr_dev_t *dev, uint32_t rate)
+{
+	if (!dev)
+		return -1;
+	if (rate <= 225000 || rate > 3200000 || (rate > 300000 && rate <= 900000))
+		return -EINVAL;
+	dev->sample_rate = rate;
+	return 0;
+}
+
+RTLSDR_API uint32_t rtlsdr_get_sample_rate(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->sample_rate : 0;
+}
+
+RTLSDR_API int rtlsdr_set_testmode(rtlsdr_dev_t *dev, int on)
+{
+	if (!dev)
+		return -1;
+	dev->test_mode = on;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_agc_mode(rtlsdr_dev_t *dev, int on)
+{
+	if (!dev)
+		return -1;
+	dev->agc_mode = on;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_direct_sampling(rtlsdr_dev_t *dev, int on)
+{
+	if (!dev)
+		return -1;
+	dev->direct_sampling = on;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_direct_sampling(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->direct_sampling : -1;
+}
+
+RTLSDR_API int rtlsdr_set_offset_tuning(rtlsdr_dev_t *dev, int on)
+{
+	if (!dev)
+		return -1;
+	dev->offset_tuning = on;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_get_offset_tuning(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->offset_tuning : -1;
+}
+
+RTLSDR_API int rtlsdr_set_bias_tee(rtlsdr_dev_t *dev, int on)
+{
+	if (!dev)
+		return -1;
+	dev->bias_tee = on;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_set_bias_tee_gpio(rtlsdr_dev_t *dev, int gpio, int on)
+{
+	return rtlsdr_set_bias_tee(dev, on);
+}
+
+/* Streaming */
+
+RTLSDR_API int rtlsdr_reset_buffer(rtlsdr_dev_t *dev)
+{
+	return dev ? 0 : -1;
+}
+
+RTLSDR_API int rtlsdr_read_sync(rtlsdr_dev_t *dev, void *buf, int len, int *n_read)
+{
+	double rate;
+	if (!dev || !buf || len < 0)
+		return -1;
+	rate = get_rate(dev);
+	if (rate > 0)
+		sleep_seconds(len / (2 * rate));
+	fill_tone(buf, (uint32_t)len);
+	if (n_read)
+		*n_read = len;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_read_async(rtlsdr_dev_t *dev, rtlsdr_read_async_cb_t cb, void *ctx,
+				 uint32_t buf_num, uint32_t buf_len)
+{
+	unsigned char **bufs;
+	uint32_t i;
+	uint64_t n = 0;
+	double rate, buf_duration, start;
+
+	if (!dev || !cb)
+		return -1;
+	if (dev->async_status != ASYNC_INACTIVE)
+		return -2;
+	if (!buf_num)
+		buf_num = DEFAULT_BUF_NUMBER;
+	if (!buf_len || buf_len % 512)
+		buf_len = DEFAULT_BUF_LENGTH;
+
+	bufs = calloc(buf_num, sizeof(unsigned char *));
+	if (!bufs)
+		return -ENOMEM;
+	for (i = 0; i < buf_num; i++) {
+		bufs[i] = malloc(buf_len);
+		if (!bufs[i]) {
+			while (i--)
+				free(bufs[i]);
+			free(bufs);
+			return -ENOMEM;
+		}
+		fill_tone(bufs[i], buf_len);
+	}
+
+	dev->async_cancel = 0;
+	dev->async_status = ASYNC_RUNNING;
+	rate = get_rate(dev);
+	buf_duration = rate > 0 ? buf_len / (2 * rate) : 0;
+	start = now_seconds();
+
+	while (!dev->async_cancel) {
+		if (rate > 0) {
+			double due = start + n * buf_duration;
+			double late = now_seconds() - due;
+			if (late < 0) {
+				sleep_seconds(-late);
+			} else if (late > buf_num * buf_duration) {
+				/* The driver's buffers would have overflowed */
+				uint64_t skipped = (uint64_t)(late / buf_duration) - buf_num;
+				if (skipped) {
+					dev->dropped += skipped;
+					n += skipped;
+				}
+			}
+			if (dev->async_cancel)
+				break;
+		}
+		cb(bufs[n % buf_num], buf_len, ctx);
+		n++;
+	}
+
+	for (i = 0; i < buf_num; i++)
+		free(bufs[i]);
+	free(bufs);
+	dev->async_status = ASYNC_INACTIVE;
+	return 0;
+}
+
+RTLSDR_API int rtlsdr_wait_async(rtlsdr_dev_t *dev, rtlsdr_read_async_cb_t cb, void *ctx)
+{
+	return rtlsdr_read_async(dev, cb, ctx, 0, 0);
+}
+
+RTLSDR_API int rtlsdr_cancel_async(rtlsdr_dev_t *dev)
+{
+	if (!dev)
+		return -1;
+	if (dev->async_status == ASYNC_RUNNING) {
+		dev->async_status = ASYNC_CANCELING;
+		dev->async_cancel = 1;
+		return 0;
+	}
+	return -2;
+}
+
+/* Simulator extensions */
+
+RTLSDR_API uint64_t rtlsdr_sim_get_dropped(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->dropped : 0;
+}
+
+RTLSDR_API int rtlsdr_sim_get_udp_port(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->udp_port : -1;
+}
+
+RTLSDR_API uint32_t rtlsdr_sim_get_if_freq(rtlsdr_dev_t *dev)
+{
+	return dev ? dev->if_freq : 0;
+}